@@ -1,5 +1,5 @@
-import json, pdg, sys
-from typing import Dict
+import sys
+from typing import Dict, Optional
 from particle import Particle as Particle_external
 
 from pathlib import Path
@@ -12,23 +12,55 @@ except ImportError:
     from ParSV import __version__
 
 try:
-    from ParSV.worker._response_value_object import convert_branching_fractions_list, convert_generator_to_list
+    from ParSV.worker._response_value_object import convert_branching_fractions_list
 except ImportError:
     sys.path.append(str(here.parent))
-    from ParSV.worker._response_value_object import convert_branching_fractions_list, convert_generator_to_list
+    from ParSV.worker._response_value_object import convert_branching_fractions_list
+
+from ParSV.Usage.spelling_index import get_spelling_index
+from ParSV.Usage import pdg_editions, pdg_guard
+
+# 从 PDG 读取的标量属性：(字段, pdg 粒子属性)
+PDG_PROPERTY_ATTRS = (
+    ('charge', 'charge'),
+    ('has_lifetime_entry', 'has_lifetime_entry'),
+    ('has_mass_entry', 'has_mass_entry'),
+    ('has_width_entry', 'has_width_entry'),
+    ('is_baryon', 'is_baryon'),
+    ('is_boson', 'is_boson'),
+    ('is_lepton', 'is_lepton'),
+    ('is_meson', 'is_meson'),
+    ('is_quark', 'is_quark'),
+    ('lifetime', 'lifetime'),
+    ('lifetime_err', 'lifetime_error'),
+    ('mass', 'mass'),
+    ('mass_err', 'mass_error'),
+    ('quantum_C', 'quantum_C'),
+    ('quantum_G', 'quantum_G'),
+    ('quantum_I', 'quantum_I'),
+    ('quantum_J', 'quantum_J'),
+    ('quantum_P', 'quantum_P'),
+    ('width', 'width'),
+    ('width_err', 'width_error'),
+)
+PDG_BF_FIELDS = ('branching_fractions', 'exclusive_branching_fractions', 'inclusive_branching_fractions')
 
 
 class Particle:
-    _file_cache = None
-
-    def __init__(self, name: str, mother=None, children=None, id: int=0):
+    def __init__(self, name: str, mother=None, children=None, id: int=0, edition: str=None,
+                 record: Optional[Dict]=None):
         self.name = name
         self.mother = mother
         self.children = children if children is not None else []
         self.id = id
-
-        # 从本地数据库获取基本信息
-        item = self.match_particle_name(name)
+        self.edition = edition  # PDG 版本，None 为默认版本
+        self.partial = False  # PDG 超时或熔断时为 True，只含本地数据
+        self.missing_fields = []
+        if edition is not None:
+            pdg_editions.get_pdg_editions().resolve(edition)  # 未配置的版本直接抛出 ValueError
+
+        # 从本地数据库获取基本信息；已解析出本地记录时直接使用（同名的不同 mcid 不会被名称查找混淆）
+        item = record if record is not None else self.match_particle_name(name)
         if not item:
             raise ValueError(f"Particle {name} not found in database")
     
@@ -86,94 +118,36 @@ class Particle:
         
 
     def _initialize_from_external_api(self):
-        """从外部API获取更多属性"""
-        api = pdg.connect()
-        particle = api.get_particle_by_mcid(self.mcid)
-
-        # 逐个属性判断并获取
-        if self.branching_fractions is None:
-            # bf_raw = particle.branching_fractions()
-            # self.branching_fractions = convert_branching_fractions_list(bf_raw)
-            bf_raw = particle.branching_fractions()
-            bf_list = convert_generator_to_list(bf_raw)
-            self.branching_fractions = bf_list
-            
-
-        if self.charge is None:
-            self.charge = particle.charge
-
-        if self.exclusive_branching_fractions is None:
-            # ebf_raw = particle.exclusive_branching_fractions()
-            # self.exclusive_branching_fractions = convert_branching_fractions_list(ebf_raw)
-            # self.exclusive_branching_fractions = particle.exclusive_branching_fractions()
-            ebf_raw = particle.exclusive_branching_fractions()
-            ebf_list = convert_generator_to_list(ebf_raw)
-            self.exclusive_branching_fractions = ebf_list
-            
-        if self.has_lifetime_entry is None:
-            self.has_lifetime_entry = particle.has_lifetime_entry
-
-        if self.has_mass_entry is None:
-            self.has_mass_entry = particle.has_mass_entry
-
-        if self.has_width_entry is None:
-            self.has_width_entry = particle.has_width_entry
-
-        if self.inclusive_branching_fractions is None:
-            # ibf_raw = particle.inclusive_branching_fractions()
-            # self.inclusive_branching_fractions = convert_branching_fractions_list(ibf_raw)
-            # self.inclusive_branching_fractions = particle.inclusive_branching_fractions()
-            ibf_raw = particle.inclusive_branching_fractions()
-            ibf_list = convert_generator_to_list(ibf_raw)
-            self.inclusive_branching_fractions = ibf_list
-            
-        if self.is_baryon is None:
-            self.is_baryon = particle.is_baryon
-
-        if self.is_boson is None:
-            self.is_boson = particle.is_boson
-
-        if self.is_lepton is None:
-            self.is_lepton = particle.is_lepton
-
-        if self.is_meson is None:
-            self.is_meson = particle.is_meson
-
-        if self.is_quark is None:
-            self.is_quark = particle.is_quark
-
-        if self.lifetime is None:
-            self.lifetime = particle.lifetime
-
-        if self.lifetime_err is None:
-            self.lifetime_err = particle.lifetime_error
-
-        if self.mass is None:
-            self.mass = particle.mass
-
-        if self.mass_err is None:
-            self.mass_err = particle.mass_error
-
-        if self.quantum_C is None:
-            self.quantum_C = particle.quantum_C
-
-        if self.quantum_G is None:
-            self.quantum_G = particle.quantum_G
-
-        if self.quantum_I is None:
-            self.quantum_I = particle.quantum_I
-
-        if self.quantum_J is None:
-            self.quantum_J = particle.quantum_J
-
-        if self.quantum_P is None:
-            self.quantum_P = particle.quantum_P
-
-        if self.width is None:
-            self.width = particle.width
-
-        if self.width_err is None:
-            self.width_err = particle.width_error
+        """
+        从外部API获取更多属性（按版本复用进程内的 PDG 连接）。
+        各 PDG 阶段限时并共享一个延迟预算，PDG 不可用时跳过的字段记入 missing_fields
+        """
+        guard = pdg_guard.get_pdg_guard()
+        budget = guard.budget()
+
+        particle, error = None, None
+        try:
+            particle, values, error = guard.call("properties", self._fetch_pdg_properties, budget)
+            for field, value in values.items():
+                setattr(self, field, value)
+        except pdg_guard.PdgUnavailable:
+            self._mark_missing([field for field, _ in PDG_PROPERTY_ATTRS])
+
+        # 分支比逐类获取并在限时阶段内转换为字典（PDG 查询发生在转换时），超时或熔断时保留本地值（通常为 None）
+        for field in PDG_BF_FIELDS:
+            if getattr(self, field) is not None:
+                continue
+            if particle is None:
+                self._mark_missing([field])
+                continue
+            try:
+                bf_list = guard.call(field, lambda f=field: convert_branching_fractions_list(getattr(particle, f)(), self.edition),
+                                     budget)
+                setattr(self, field, bf_list)
+            except pdg_guard.PdgUnavailable:
+                self._mark_missing([field])
+        if error is not None:
+            raise error
 
         # 使用 Particle 包获取额外信息
         particle_ex = Particle_external.findall(lambda p: p.pdgid == self.mcid)
@@ -189,26 +163,35 @@ class Particle:
             if self.unicode_name is None:
                 self.unicode_name = particle_ex[0].unicode_name
   
+    def _fetch_pdg_properties(self):
+        """
+        在 PDG 中查找粒子并按顺序读取本地缺失的标量属性，返回 (pdg 粒子, 字段 -> 值, 异常)；
+        某个属性出错时保留已读取的值并返回该异常
+        """
+        api = pdg_editions.connect(self.edition)
+        particle = api.get_particle_by_mcid(self.mcid)
+        values = {}
+        for field, attr in PDG_PROPERTY_ATTRS:
+            if getattr(self, field) is None:
+                try:
+                    values[field] = getattr(particle, attr)
+                except Exception as e:
+                    return particle, values, e
+        return particle, values, None
+
+    def _mark_missing(self, fields):
+        """记录因 PDG 不可用而未获取的字段（本地已有值的字段不计）"""
+        for field in fields:
+            if getattr(self, field, None) is None and field not in self.missing_fields:
+                self.missing_fields.append(field)
+        self.partial = bool(self.missing_fields)
+
     @staticmethod
     def match_particle_name(name: str) -> Dict:
-        """模拟从本地数据库匹配粒子名称"""
-        if Particle._file_cache is None:
-            with open(f"{here.parent}/data/particle_variants.json", "r") as f:
-                Particle._file_cache = json.load(f)
-      
-        for item in Particle._file_cache:
-            fields = {
-                item["name"],
-                item["programmatic_name"],
-                item["latex_name"],
-                item["evtgen_name"],
-                item["html_name"],
-                item["unicode_name"],
-            }
-            fields.update(item["aliases"])
-            if name is not None and name in fields:
-                return item
-        return {}
+        """从本地拼写索引匹配粒子名称"""
+        if name is None:
+            return {}
+        return get_spelling_index().find_record(name)
 
 if __name__ == "__main__":
     particle = Particle("pi+")
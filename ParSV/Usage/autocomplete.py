@@ -0,0 +1,159 @@
+"""
+粒子名称前缀补全
+将 particle_variants.json 中的全部拼写归一化（希腊字母转拉丁名、去掉 HTML/LaTeX 标记与上下标、大小写折叠、
+只保留字母数字与电荷符号）后存为有序数组，前缀查询用二分定位区间再按匹配质量排序：
+"lamb" 可以补全 Λ，"Λc" 可以补全 Lambda_c+。区间过大的短前缀在构建时预先排好。
+"""
+
+import re
+import sys
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.Usage.spelling_index import SpellingIndex, get_spelling_index, iter_spellings, KIND_TYPO
+from ParSV.Usage.mention_extractor import KIND_LABELS
+from ParSV.data.variant_rules import strip_html, strip_unicode
+
+MAX_LIMIT = 50
+# 前缀区间超过该条目数时使用构建时预排好的结果，保证单次查询远低于 1 ms
+SCAN_LIMIT = 256
+
+_LATEX_CMD_RE = re.compile(r'\\([A-Za-z]+)')
+_KEY_DROP_RE = re.compile(r"[^0-9a-z+\-*'~]")
+
+
+def normalize_key(text: str) -> str:
+    """补全用的归一化键：Λ_c^+ / \\Lambda_c^{+} / Lambda_c+ 都得到 "lambdac+" """
+    text = _LATEX_CMD_RE.sub(lambda m: m.group(1), strip_unicode(strip_html(text)))
+    return _KEY_DROP_RE.sub('', text.casefold())
+
+
+class ParticleSuggester:
+    """基于拼写索引的有序前缀数组"""
+
+    def __init__(self, index: Optional[SpellingIndex] = None, include_typos: bool = True):
+        self.index = index if index is not None else get_spelling_index()
+
+        entries = []  # (key, kind, record 序号, 原始拼写)
+        for idx, item in enumerate(self.index.iter_records()):
+            best: Dict[str, tuple] = {}
+            for spelling, kind in iter_spellings(item):
+                if kind == KIND_TYPO and not include_typos:
+                    continue
+                key = normalize_key(spelling)
+                if key and (key not in best or kind < best[key][0]):
+                    best[key] = (kind, spelling)
+            entries.extend((key, kind, idx, spelling) for key, (kind, spelling) in best.items())
+        entries.sort()
+
+        self.keys: List[str] = [e[0] for e in entries]
+        self.kinds: List[int] = [e[1] for e in entries]
+        self.rows: List[int] = [e[2] for e in entries]
+        self.spellings: List[str] = [e[3] for e in entries]
+        self._records: Dict[int, Dict] = {}
+
+        # 预排大区间：只有很短的前缀会超过 SCAN_LIMIT
+        self._ranked: Dict[str, List[int]] = {}
+        prefixes = {key[:n] for key in self.keys for n in range(1, 4)}
+        for prefix in prefixes:
+            lo, hi = self._range(prefix)
+            if hi - lo > SCAN_LIMIT:
+                self._ranked[prefix] = self._rank(prefix, lo, hi, MAX_LIMIT)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _range(self, prefix: str) -> tuple:
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + '\uffff', lo)
+        return lo, hi
+
+    def _rank(self, prefix: str, lo: int, hi: int, limit: int) -> List[int]:
+        """区间内每条记录取最佳条目，按 (拼写类型, 是否完全匹配, 键长) 排序，返回条目位置"""
+        best: Dict[int, tuple] = {}
+        for pos in range(lo, hi):
+            key = self.keys[pos]
+            rank = (self.kinds[pos], key != prefix, len(key), pos)
+            row = self.rows[pos]
+            if row not in best or rank < best[row]:
+                best[row] = rank
+        return [rank[3] for rank in sorted(best.values())[:limit]]
+
+    def _record(self, idx: int) -> Dict:
+        record = self._records.get(idx)
+        if record is None:
+            record = self.index.get_record(idx)
+            self._records[idx] = record
+        return record
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """返回以 prefix 开头的粒子，每个粒子一条：mcid、名称、命中的拼写及其类型"""
+        key = normalize_key(prefix or '')
+        limit = max(0, min(int(limit), MAX_LIMIT))
+        if not key or not limit:
+            return []
+        positions = self._ranked.get(key)
+        if positions is None:
+            lo, hi = self._range(key)
+            positions = self._rank(key, lo, hi, limit)
+        suggestions = []
+        for pos in positions[:limit]:
+            record = self._record(self.rows[pos])
+            suggestions.append({
+                "mcid": record.get("mcid"),
+                "name": record.get("name"),
+                "match": self.spellings[pos],
+                "kind": KIND_LABELS[self.kinds[pos]],
+            })
+        return suggestions
+
+
+_suggester_lock = threading.Lock()
+_default_suggesters: Dict[bool, ParticleSuggester] = {}
+
+
+def get_suggester(include_typos: bool = True) -> ParticleSuggester:
+    """获取进程内默认补全器（惰性构建）"""
+    suggester = _default_suggesters.get(include_typos)
+    if suggester is None:
+        with _suggester_lock:
+            suggester = _default_suggesters.get(include_typos)
+            if suggester is None:
+                suggester = ParticleSuggester(include_typos=include_typos)
+                _default_suggesters[include_typos] = suggester
+    return suggester
+
+
+def reload_suggesters(index: SpellingIndex):
+    """数据集热更新时基于新索引重建已加载的补全器并原子替换"""
+    rebuilt = {include_typos: ParticleSuggester(index=index, include_typos=include_typos)
+               for include_typos in list(_default_suggesters)}
+    with _suggester_lock:
+        _default_suggesters.clear()
+        _default_suggesters.update(rebuilt)
+
+
+if __name__ == "__main__":
+    import time
+
+    t0 = time.perf_counter()
+    suggester = get_suggester()
+    t1 = time.perf_counter()
+    print(f"Indexed {len(suggester)} spellings in {(t1 - t0) * 1e3:.1f} ms")
+
+    for prefix in sys.argv[1:] or ["lamb", "Λc", "J/", "pi", "B_s", "p"]:
+        t0 = time.perf_counter()
+        suggestions = suggester.suggest(prefix, limit=5)
+        t1 = time.perf_counter()
+        names = ", ".join(f"{s['name']} ({s['match']})" for s in suggestions)
+        print(f"{prefix!r:>8} ({(t1 - t0) * 1e6:.0f} us): {names}")
@@ -0,0 +1,303 @@
+"""
+批量名称查询
+从文本/CSV/JSONL 文件或标准输入读取粒子名称，先用拼写索引把去重后的名称解析为 mcid，
+再由进程池对去重后的 mcid 各构建一次粒子记录，最后按输入顺序流式写出 JSONL 或 CSV（可选字段投影）。
+只需要 name/mcid 时完全不访问 PDG。
+"""
+
+import contextlib
+import csv
+import multiprocessing as mp
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.utils import json_codec
+from ParSV.Usage.spelling_index import DEFAULT_DATA_FILE, SpellingIndex, get_spelling_index
+from ParSV.data.categories import parse_categories
+from ParSV.Usage.particle_record import RECORD_FIELDS, get_particle_registry
+
+FORMATS = ('text', 'csv', 'jsonl')
+QUERY_FIELD = 'query'
+ERROR_FIELD = 'error'
+# 无需构建粒子记录、直接由拼写索引给出的字段
+LOCAL_FIELDS = ('name', 'mcid')
+# CSV 默认只输出标量字段，分支比等列表字段需显式投影（以 JSON 字符串写入单元格）
+LIST_FIELDS = ('branching_fractions', 'exclusive_branching_fractions', 'inclusive_branching_fractions')
+CSV_DEFAULT_FIELDS = tuple(f for f in RECORD_FIELDS if f not in LIST_FIELDS)
+
+
+def detect_format(path: Optional[str], default: str = 'text') -> str:
+    """按扩展名推断输入/输出格式"""
+    suffix = Path(path).suffix.lower() if path and path != '-' else ''
+    if suffix == '.csv':
+        return 'csv'
+    if suffix in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if suffix in ('.txt', '.list'):
+        return 'text'
+    return default
+
+
+def validate_fields(fields: Optional[Sequence[str]]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    unknown = [f for f in fields if f not in RECORD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields {unknown}, available: {list(RECORD_FIELDS)}")
+    return list(fields)
+
+
+# ---------------------------------------------------------------------- #
+# 读取名称
+# ---------------------------------------------------------------------- #
+def iter_names(stream: TextIO, fmt: str = 'text', column: Optional[str] = None) -> Iterator[str]:
+    """
+    逐条产出名称。text: 每行一个名称（跳过空行与 # 注释）；
+    csv: 取 column 列（默认 name 列，没有时取第一列）；jsonl: 每行一个字符串或对象的 column 字段（默认 name）
+    """
+    if fmt == 'text':
+        for line in stream:
+            name = line.strip()
+            if name and not name.startswith('#'):
+                yield name
+    elif fmt == 'csv':
+        reader = csv.reader(stream)
+        header = next(reader, None)
+        if header is None:
+            return
+        key = column or ('name' if 'name' in header else header[0])
+        if key not in header:
+            raise ValueError(f"Column `{key}` not found in CSV header {header}")
+        pos = header.index(key)
+        for row in reader:
+            if pos < len(row) and row[pos].strip():
+                yield row[pos].strip()
+    elif fmt == 'jsonl':
+        key = column or 'name'
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            value = json_codec.loads(line)
+            name = value.get(key) if isinstance(value, dict) else value
+            if isinstance(name, str) and name.strip():
+                yield name.strip()
+    else:
+        raise ValueError(f"Unknown input format `{fmt}`, available: {FORMATS}")
+
+
+def read_names(paths: Sequence[str], fmt: Optional[str] = None, column: Optional[str] = None) -> List[str]:
+    """读取全部输入文件（'-' 或空列表为标准输入）中的名称"""
+    names: List[str] = []
+    for path in paths or ['-']:
+        path_fmt = fmt or detect_format(path)
+        if path == '-':
+            names.extend(iter_names(sys.stdin, path_fmt, column))
+        else:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                names.extend(iter_names(f, path_fmt, column))
+    return names
+
+
+# ---------------------------------------------------------------------- #
+# 解析
+# ---------------------------------------------------------------------- #
+def resolve_names(names: Iterable[str], index=None) -> Tuple[Dict[str, Optional[int]], Dict[int, Dict]]:
+    """
+    去重后按拼写索引（默认为进程内索引）解析名称，返回 名称 -> mcid（未找到为 None）与 mcid -> 本地记录。
+    不同 mcid 可以有相同的规范名称（如 10555 与 100555 都叫 chi_b2(2P)），之后一律按 mcid 处理
+    """
+    index = index if index is not None else get_spelling_index()
+    mcids: Dict[str, Optional[int]] = {}
+    items: Dict[int, Dict] = {}
+    for name in names:
+        if name in mcids:
+            continue
+        item = index.find_record(name)
+        mcid = item.get('mcid') if item else None
+        mcids[name] = mcid
+        if mcid is not None:
+            items.setdefault(mcid, item)
+    return mcids, items
+
+
+def _project(values: Dict, fields: Optional[Sequence[str]]) -> Dict:
+    if fields is None:
+        return {f: values.get(f) for f in RECORD_FIELDS}
+    return {f: values.get(f) for f in fields}
+
+
+def _build_properties(task: Tuple[List[Dict], Optional[List[str]], Optional[str]]) -> List[Tuple[int, Dict]]:
+    """进程池任务：为一组本地记录各构建一次粒子记录（按 mcid）并投影字段"""
+    items, fields, edition = task
+    registry = get_particle_registry()
+    results = []
+    # 构建记录时的诊断打印转到 stderr，避免混入写往标准输出的结果
+    with contextlib.redirect_stdout(sys.stderr):
+        for item in items:
+            try:
+                values = registry.get_item(item, edition=edition).to_response()
+            except Exception as e:
+                values = {ERROR_FIELD: f"{type(e).__name__}: {e}"}
+            results.append((item.get('mcid'), values if ERROR_FIELD in values else _project(values, fields)))
+    return results
+
+
+def build_properties(items: Dict[int, Dict],
+                     fields: Optional[Sequence[str]] = None,
+                     edition: Optional[str] = None,
+                     processes: int = 1,
+                     chunk_size: int = 4) -> Dict[int, Dict]:
+    """为去重后的 mcid 构建属性；processes > 1 时使用 fork 进程池，子进程继承已加载的拼写索引"""
+    if fields is not None and all(f in LOCAL_FIELDS for f in fields):
+        return {mcid: _project({'name': item.get('name'), 'mcid': mcid}, fields) for mcid, item in items.items()}
+
+    records = list(items.values())
+    tasks = [(records[i:i + chunk_size], list(fields) if fields else None, edition)
+             for i in range(0, len(records), chunk_size)]
+    properties: Dict[int, Dict] = {}
+    if processes <= 1 or len(tasks) < 2:
+        chunks = map(_build_properties, tasks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=processes, mp_context=mp.get_context("fork"))
+        chunks = pool.map(_build_properties, tasks)
+    try:
+        for chunk in chunks:
+            properties.update(chunk)
+    finally:
+        if processes > 1 and len(tasks) >= 2:
+            pool.shutdown()
+    return properties
+
+
+# ---------------------------------------------------------------------- #
+# 输出
+# ---------------------------------------------------------------------- #
+def iter_rows(names: Iterable[str], mcids: Dict[str, Optional[int]], properties: Dict[int, Dict],
+              unique: bool = False) -> Iterator[Dict]:
+    """按输入顺序产出 {"query": 名称, ...属性}；未找到的名称带 error 字段"""
+    seen = set()
+    for name in names:
+        if unique:
+            if name in seen:
+                continue
+            seen.add(name)
+        mcid = mcids.get(name)
+        if mcid is None:
+            yield {QUERY_FIELD: name, ERROR_FIELD: "not found"}
+        else:
+            yield {QUERY_FIELD: name, **properties[mcid]}
+
+
+def write_jsonl(names: Iterable[str], mcids: Dict[str, Optional[int]], properties: Dict[int, Dict],
+                unique: bool = False, out=None) -> int:
+    """
+    按输入顺序逐行写出 JSONL（out 为二进制流），返回行数。
+    每个 mcid 的属性只编码一次，各行只拼接编码后的查询名称
+    """
+    encoded: Dict[int, bytes] = {}
+    not_found = b',"' + ERROR_FIELD.encode() + b'":"not found"}\n'
+    prefix = b'{"' + QUERY_FIELD.encode() + b'":'
+    seen = set()
+    count = 0
+    for name in names:
+        if unique:
+            if name in seen:
+                continue
+            seen.add(name)
+        mcid = mcids.get(name)
+        if mcid is None:
+            tail = not_found
+        else:
+            tail = encoded.get(mcid)
+            if tail is None:
+                body = json_codec.dumpb(properties[mcid])
+                tail = (b',' + body[1:] if len(body) > 2 else b'}') + b'\n'
+                encoded[mcid] = tail
+        out.write(prefix + json_codec.dumpb(name) + tail)
+        count += 1
+    return count
+
+
+def write_csv(rows: Iterable[Dict], out: TextIO, fields: Sequence[str]) -> int:
+    """逐行写出 CSV，列表/字典值以 JSON 字符串写入单元格，返回行数"""
+    columns = [QUERY_FIELD, *fields, ERROR_FIELD]
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        cells = []
+        for column in columns:
+            value = row.get(column)
+            if isinstance(value, (list, dict)):
+                value = json_codec.dumps(value)
+            cells.append('' if value is None else value)
+        writer.writerow(cells)
+        count += 1
+    return count
+
+
+def run_lookup(inputs: Sequence[str],
+               output: Optional[str] = None,
+               input_format: Optional[str] = None,
+               output_format: Optional[str] = None,
+               column: Optional[str] = None,
+               fields: Optional[Sequence[str]] = None,
+               edition: Optional[str] = None,
+               processes: int = 1,
+               unique: bool = False,
+               categories: Optional[Sequence[str]] = None) -> Dict:
+    """
+    完整的批量查询流程，返回统计（输出写到 output，None 或 '-' 为标准输出）；
+    给定 categories 时只加载这些类别并只解析其中的名称
+    """
+    fields = validate_fields(fields)
+    output_format = output_format or detect_format(output, default='jsonl')
+    if output_format not in ('csv', 'jsonl'):
+        raise ValueError(f"Unknown output format `{output_format}`, available: csv, jsonl")
+
+    t0 = time.perf_counter()
+    names = read_names(inputs, input_format, column)
+    index = SpellingIndex.from_json_file(DEFAULT_DATA_FILE, parse_categories(categories)) if categories else None
+    mcids, items = resolve_names(names, index)
+    t1 = time.perf_counter()
+    properties = build_properties(items, fields, edition=edition, processes=processes)
+    t2 = time.perf_counter()
+
+    to_stdout = output is None or output == '-'
+    if output_format == 'jsonl':
+        out = sys.stdout.buffer if to_stdout else open(output, 'wb')
+        try:
+            count = write_jsonl(names, mcids, properties, unique=unique, out=out)
+        finally:
+            out.flush() if to_stdout else out.close()
+    else:
+        out = sys.stdout if to_stdout else open(output, 'w', encoding='utf-8', newline='')
+        try:
+            count = write_csv(iter_rows(names, mcids, properties, unique=unique), out,
+                              fields or CSV_DEFAULT_FIELDS)
+        finally:
+            out.flush() if to_stdout else out.close()
+    t3 = time.perf_counter()
+
+    return {
+        "names": len(names),
+        "unique_names": len(mcids),
+        "unresolved": sum(1 for mcid in mcids.values() if mcid is None),
+        "particles": len(items),
+        "rows": count,
+        "resolve_s": round(t1 - t0, 3),
+        "properties_s": round(t2 - t1, 3),
+        "write_s": round(t3 - t2, 3),
+    }
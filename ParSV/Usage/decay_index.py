@@ -0,0 +1,339 @@
+"""
+衰变产物倒排索引
+由全部粒子的衰变道（产物已解析为 mcid）构建 产物 -> 衰变道 的倒排表与 末态多重集 -> 衰变道 的哈希表，
+用于回答 "哪些粒子衰变到 J/psi K+"、"哪些衰变道含 tau" 等反向查询；
+可保存为 JSON 并在 worker 进程间共享，数据集热更新时只重建变化 mcid 的衰变道。
+完整构建需要逐个访问 PDG（约一分钟），worker 中在后台线程（或由 supervisor 在独立进程）构建，
+构建期间查询得到 "building" 状态；PDG 不可用而缺失的母粒子同样在后台补齐。
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.utils import json_codec
+from ParSV.utils.file_utils import atomic_write_bytes
+from ParSV.Usage.spelling_index import SpellingIndex, get_spelling_index
+from ParSV.Usage.decay_tree import DecayTreeExpander, ProductKey, get_decay_tree_expander
+from ParSV.Usage.pdg_guard import get_pdg_guard
+
+DECAY_INDEX_ENV = "PARSV_DECAY_INDEX"
+# 为 1 时 PARSV_DECAY_INDEX 由 supervisor 的构建进程写入，worker 等待该文件出现而不自行构建
+DECAY_INDEX_SHARED_ENV = "PARSV_DECAY_INDEX_SHARED"
+RETRY_INTERVAL = 30.0  # 补齐缺失母粒子的最小间隔（秒）
+_FORMAT_VERSION = 3  # 2: 反粒子的衰变道对未解析产物名也取共轭；3: K0S、中性 X/T 态与 K^* 等泛称视为自共轭
+
+# (母粒子 mcid, 分支比, 是否为上限, 描述, 产物)
+Entry = Tuple[int, float, bool, str, Tuple[ProductKey, ...]]
+
+
+def final_state_key(products: Iterable[ProductKey]) -> Tuple[ProductKey, ...]:
+    """末态多重集的规范键：与产物顺序无关，mcid 排在未解析的名称之前"""
+    return tuple(sorted(products, key=lambda p: (isinstance(p, str), str(p))))
+
+
+class DecayIndex:
+    """衰变道表 + 按产物的倒排表 + 按末态的哈希表"""
+
+    def __init__(self, entries: Sequence[Entry], names: Dict[int, str], incomplete: Iterable[int] = ()):
+        self.entries: List[Entry] = list(entries)
+        self.names = names
+        # PDG 超时或熔断而未能解析衰变道的母粒子，PDG 恢复后补齐
+        self.incomplete: Set[int] = set(incomplete)
+        self._by_product: Dict[ProductKey, List[int]] = {}
+        self._by_final_state: Dict[Tuple[ProductKey, ...], List[int]] = {}
+        for i, entry in enumerate(self.entries):
+            for product in set(entry[4]):
+                self._by_product.setdefault(product, []).append(i)
+            self._by_final_state.setdefault(final_state_key(entry[4]), []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    # ------------------------------------------------------------------ #
+    # 构建与持久化
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _parent_entries(expander: DecayTreeExpander, item: Dict, incomplete: Set[int]) -> List[Entry]:
+        try:
+            record = expander.record(item['name'])
+        except ValueError:
+            return []
+        if record.partial:
+            incomplete.add(record.mcid)
+        return [(record.mcid, mode.bf, mode.is_limit, mode.description, mode.products)
+                for mode in expander.modes(record)]
+
+    @classmethod
+    def build(cls, index: Optional[SpellingIndex] = None,
+              expander: Optional[DecayTreeExpander] = None) -> "DecayIndex":
+        """解析全部记录的衰变道（经共享的粒子记录表，已构建的记录不再访问 PDG）"""
+        index = index if index is not None else get_spelling_index()
+        expander = expander if expander is not None else get_decay_tree_expander()
+        entries, names, incomplete = [], {}, set()
+        for item in index.iter_records():
+            names[item.get('mcid', 0)] = item.get('name')
+            entries.extend(cls._parent_entries(expander, item, incomplete))
+        return cls(entries, names, incomplete)
+
+    def rebuild(self, index: SpellingIndex, changed_mcids: Set[int],
+                expander: Optional[DecayTreeExpander] = None) -> "DecayIndex":
+        """
+        为新索引构建倒排索引：未变化 mcid 的衰变道直接复用，
+        仅对新增、变化或上次未能完整解析的记录重新解析
+        """
+        expander = expander if expander is not None else get_decay_tree_expander()
+        changed_mcids = set(changed_mcids) | self.incomplete
+        names = {item.get('mcid', 0): item.get('name') for item in index.iter_records()}
+        entries = [entry for entry in self.entries if entry[0] in names and entry[0] not in changed_mcids]
+        incomplete = set()
+        for item in index.iter_records():
+            mcid = item.get('mcid', 0)
+            if mcid in changed_mcids or mcid not in self.names:
+                entries.extend(self._parent_entries(expander, item, incomplete))
+        return DecayIndex(entries, names, incomplete)
+
+    @classmethod
+    def load(cls, index_path: str) -> "DecayIndex":
+        data = json_codec.load_file(index_path)
+        if data.get('version') != _FORMAT_VERSION:
+            raise ValueError(f"Unsupported decay index version in {index_path}: {data.get('version')}")
+        entries = [(parent, bf, is_limit, description, tuple(products))
+                   for parent, bf, is_limit, description, products in data['entries']]
+        return cls(entries, {int(mcid): name for mcid, name in data['names'].items()},
+                   data.get('incomplete', ()))
+
+    def save(self, index_path: str, allow_incomplete: bool = False):
+        """保存为 JSON；allow_incomplete=True 时连同缺失的母粒子一起保存，由读取方在后台补齐"""
+        if self.incomplete and not allow_incomplete:
+            raise ValueError(f"Decay index is incomplete ({len(self.incomplete)} parents without PDG data), not saved")
+        data = {"version": _FORMAT_VERSION,
+                "names": {str(mcid): name for mcid, name in self.names.items()},
+                "entries": [list(entry) for entry in self.entries],
+                "incomplete": sorted(self.incomplete)}
+        atomic_write_bytes(index_path, json_codec.dumpb(data))
+
+    # ------------------------------------------------------------------ #
+    # 查询
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def resolve_products(products: Sequence[Union[str, int]]) -> List[ProductKey]:
+        """将查询中的粒子拼写解析为 mcid；整数视为 mcid，无法解析的拼写按 PDG 产物名原样匹配"""
+        index = get_spelling_index()
+        resolved = []
+        for product in products:
+            if isinstance(product, int) and not isinstance(product, bool):
+                resolved.append(product)
+                continue
+            item = index.find_record(str(product))
+            resolved.append(item['mcid'] if item else str(product))
+        return resolved
+
+    def _candidates(self, query: Sequence[ProductKey], exact: bool) -> List[int]:
+        if exact:
+            return self._by_final_state.get(final_state_key(query), [])
+        postings = sorted((self._by_product.get(p, []) for p in set(query)), key=len)
+        if not postings or not postings[0]:
+            return []
+        ids = set(postings[0])
+        for other in postings[1:]:
+            ids.intersection_update(other)
+            if not ids:
+                return []
+        # 查询中重复的产物（如 pi0 pi0）要求衰变道中至少出现同样多次
+        need = Counter(query)
+        if max(need.values()) > 1:
+            ids = {i for i in ids if not need - Counter(self.entries[i][4])}
+        return list(ids)
+
+    def _name(self, product: ProductKey) -> str:
+        return self.names.get(product, str(product)) if isinstance(product, int) else product
+
+    def find(self,
+             products: Sequence[Union[str, int]],
+             exact: bool = False,
+             min_bf: float = 0.0,
+             include_limits: bool = True,
+             limit: Optional[int] = 50) -> Dict:
+        """
+        查找含给定产物的衰变道（exact=True 时末态须完全一致），按分支比降序返回。
+        """
+        query = self.resolve_products(products)
+        if not query:
+            raise ValueError("products should be a non-empty list")
+        matches = [self.entries[i] for i in self._candidates(query, exact)]
+        matches = [e for e in matches if e[1] >= min_bf and (include_limits or not e[2])]
+        matches.sort(key=lambda e: (-e[1], e[0]))
+        total = len(matches)
+        if limit is not None:
+            matches = matches[:max(0, int(limit))]
+        return {
+            "query": [self._name(p) for p in query],
+            "query_mcids": [p if isinstance(p, int) else None for p in query],
+            "exact": exact,
+            "total": total,
+            "partial": bool(self.incomplete),
+            "modes": [{"parent": self._name(parent), "parent_mcid": parent, "bf": bf, "is_limit": is_limit,
+                       "description": description, "products": [self._name(p) for p in products]}
+                      for parent, bf, is_limit, description, products in matches],
+        }
+
+
+_index_lock = threading.Lock()
+_default_index: Optional[DecayIndex] = None
+_builder: Optional[threading.Thread] = None
+_build_error: Optional[str] = None
+_last_retry = 0.0
+
+
+def _build_default():
+    """后台构建默认倒排索引（设置了 PARSV_DECAY_INDEX 时保存到该路径供之后的进程复用）"""
+    global _default_index, _build_error
+    try:
+        spelling_index = get_spelling_index()
+        decay_index = DecayIndex.build(spelling_index)
+        current = get_spelling_index()
+        if current is not spelling_index:
+            # 构建期间数据集被热更新，补上变化的记录
+            decay_index = decay_index.rebuild(current, _changed_mcids(spelling_index, current))
+        index_path = os.environ.get(DECAY_INDEX_ENV)
+        if index_path:
+            decay_index.save(index_path, allow_incomplete=True)
+        with _index_lock:
+            if _default_index is None:
+                _default_index = decay_index
+        _build_error = None
+    except Exception as e:
+        _build_error = f"{type(e).__name__}: {e}"
+        print(f"[DecayIndex] build failed: {_build_error}", flush=True)
+
+
+def _changed_mcids(old: SpellingIndex, new: SpellingIndex) -> Set[int]:
+    old_records = {item.get('mcid'): item for item in old.iter_records()}
+    new_records = {item.get('mcid'): item for item in new.iter_records()}
+    changed = {mcid for mcid, item in new_records.items() if old_records.get(mcid) != item}
+    return changed | (set(old_records) - set(new_records))
+
+
+def _retry_incomplete():
+    """PDG 恢复后在后台补齐缺失的母粒子并原子替换"""
+    global _default_index
+    current = _default_index
+    try:
+        decay_index = current.rebuild(get_spelling_index(), set())
+    except Exception as e:
+        print(f"[DecayIndex] retry of incomplete parents failed: {e}", flush=True)
+        return
+    with _index_lock:
+        if _default_index is current:
+            _default_index = decay_index
+
+
+def _start(target) -> threading.Thread:
+    """在持有 _index_lock 时调用：启动后台构建或补齐线程"""
+    global _builder
+    _builder = threading.Thread(target=target, name="psv-decay-index", daemon=True)
+    _builder.start()
+    return _builder
+
+
+def get_decay_index(wait: bool = True) -> Optional[DecayIndex]:
+    """
+    获取进程内默认倒排索引；PARSV_DECAY_INDEX 指向的文件存在时直接加载，否则在后台线程构建
+    （PARSV_DECAY_INDEX_SHARED=1 时由 supervisor 构建，只等待文件出现）。
+    wait=False 时不阻塞，尚未就绪返回 None；有缺失的母粒子时在后台补齐，不阻塞查询
+    """
+    global _default_index, _last_retry
+    builder = None
+    if _default_index is None:
+        with _index_lock:
+            if _default_index is None:
+                index_path = os.environ.get(DECAY_INDEX_ENV)
+                if index_path and os.path.exists(index_path):
+                    _default_index = DecayIndex.load(index_path)
+                elif os.environ.get(DECAY_INDEX_SHARED_ENV) == "1" and index_path:
+                    if not wait:
+                        return None
+                elif _builder is None or not _builder.is_alive():
+                    builder = _start(_build_default)
+                else:
+                    builder = _builder
+        if _default_index is None:
+            if not wait:
+                return None
+            if builder is None:
+                # supervisor 构建中：等待文件出现
+                while not os.path.exists(os.environ[DECAY_INDEX_ENV]):
+                    time.sleep(1.0)
+                return get_decay_index(wait)
+            builder.join()
+            if _default_index is None:
+                raise RuntimeError(f"Decay index build failed: {_build_error}")
+    decay_index = _default_index
+    if decay_index.incomplete and get_pdg_guard().available and time.monotonic() - _last_retry >= RETRY_INTERVAL:
+        with _index_lock:
+            if (_builder is None or not _builder.is_alive()) and time.monotonic() - _last_retry >= RETRY_INTERVAL:
+                _last_retry = time.monotonic()
+                _start(_retry_incomplete)
+    return decay_index
+
+
+def decay_index_status() -> Dict:
+    """倒排索引的构建状态：ready / building / failed"""
+    decay_index = _default_index
+    if decay_index is not None:
+        return {"status": "ready", "modes": len(decay_index), "incomplete_parents": len(decay_index.incomplete)}
+    if _build_error is not None and (_builder is None or not _builder.is_alive()):
+        return {"status": "failed", "error": _build_error}
+    return {"status": "building"}
+
+
+def build_index_file(index_path: str):
+    """构建并保存倒排索引（supervisor 在独立进程中调用，缺失的母粒子一并保存由 worker 补齐）"""
+    DecayIndex.build().save(index_path, allow_incomplete=True)
+
+
+def reload_decay_index(index: SpellingIndex, changed_mcids: Set[int]) -> Optional[DecayIndex]:
+    """数据集热更新时增量重建已加载的默认倒排索引并原子替换；尚未加载时保持惰性，返回新索引或 None"""
+    global _default_index
+    current = _default_index
+    if current is None:
+        return None
+    decay_index = current.rebuild(index, changed_mcids)
+    with _index_lock:
+        _default_index = decay_index
+    return decay_index
+
+
+if __name__ == "__main__":
+    index_path = sys.argv[1] if len(sys.argv) > 1 else None
+    t0 = time.perf_counter()
+    if index_path and os.path.exists(index_path):
+        decay_index = DecayIndex.load(index_path)
+    else:
+        decay_index = DecayIndex.build()
+        if index_path:
+            decay_index.save(index_path)
+            print(f"Saved to {index_path}")
+    t1 = time.perf_counter()
+    print(f"Decay index: {len(decay_index)} modes of {len(decay_index.names)} particles in {(t1 - t0) * 1e3:.1f} ms")
+
+    for products, exact in ((["J/psi", "K+"], True), (["tau-"], False), (["pi0", "pi0"], False)):
+        t0 = time.perf_counter()
+        result = decay_index.find(products, exact=exact, limit=5)
+        t1 = time.perf_counter()
+        print(f"{' '.join(products)} (exact={exact}): {result['total']} modes ({(t1 - t0) * 1e3:.2f} ms)")
+        for mode in result['modes']:
+            print(f"  {mode['description']:<40} bf={mode['bf']:.3g}")
@@ -0,0 +1,320 @@
+"""
+衰变链展开
+沿分支比的 decay_products 递归展开衰变树，按深度与分支比阈值截断；
+每个 mcid 的衰变道（产物已解析为 mcid 并按分支比排序）只解析一次并在请求之间共享，
+pi+、K-、gamma 等公共子粒子在同一棵树中也只出现一个节点，结果为紧凑的节点/边图。
+"""
+
+import re
+import sys
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.Usage.particle_record import ParticleRecord, ParticleRecordRegistry, get_particle_registry
+from ParSV.Usage.spelling_index import get_spelling_index
+
+MAX_DEPTH = 6
+MAX_NODES = 2000
+
+# 默认视为末态、不再展开的长寿命粒子（按 |mcid|）：e, mu, 中微子, gamma, pi+-, K+-, K_L, p, n
+STABLE_MCIDS = frozenset({11, 12, 13, 14, 16, 22, 130, 211, 321, 2112, 2212})
+
+# 节点停止展开的原因
+STOP_DEPTH = "depth"
+STOP_STABLE = "stable"
+STOP_NO_MODES = "no_modes"
+STOP_UNKNOWN = "unknown"     # 产物不在本地数据集中（如 "anything"、"e+ semileptonic"）
+STOP_LIMIT = "max_nodes"
+STOP_PARTIAL = "partial"     # PDG 超时或熔断，记录缺少分支比
+
+ProductKey = Union[int, str]
+
+# 未解析产物名的电荷共轭（按空白分词逐个处理），无法确定的名称不猜测
+_CHARGE_SWAP = {"+": "-", "-": "+", "+-": "-+", "-+": "+-", "++": "--", "--": "++"}
+_CHARGED = re.compile(r"^(?P<body>.*?[A-Za-z)'*].*?)(?P<charge>\+-|-\+|\+\+|--|\+|-)$")
+_BAR = re.compile(r"^(?P<root>[A-Za-z]+)bar(?P<rest>.*)$")
+# 名称中不带 bar 时无法判断正反粒子的重子
+_BARYON = re.compile(r"^(Lambda|Sigma|Xi|Omega|Delta|Theta|P_|N\(|N$|p$|n$)")
+# 中性 K/D/B 介子的反粒子在根名后加 bar：K0 -> Kbar0、D^*()0 -> Dbar^*()0；K(S)0、K(L)0 自共轭
+_FLAVOURED_NEUTRAL = re.compile(r"^(?P<root>[KDB])(?P<rest>(?![(][SL][)])[_^(].*0|0)$")
+# 自共轭的中性名称（味中性介子族、K_S/K_L、中性的 X/T 奇特态与泛称）
+_SELF_CONJUGATE = re.compile(r"^(pi|eta|rho|omega|phi|f_|a_|a\(|b_|h_|chi_|psi|J/psi|Upsilon|gamma"
+                             r"|K[(_][SL]|K0[SL]|K[SL]0?$|[XT].*0$|X$)")
+# 不带电荷的 K/D/B 泛称（K、K^*、K_1(1650)、D^*(2010) 等，两种电荷态之和）即自身的共轭
+_GENERIC = re.compile(r"^(K|D|D_s|D_sJ|B)(_\d)?(\^\*)?(\([^)]*\))?$")
+_SELF_CONJUGATE_WORDS = frozenset({"anything", "hadrons", "invisible", "invisibles", "nonresonant", "non-resonant",
+                                   "semileptonic", "total", "c.c."})
+# 整体加括号的注释，如 (non-res)、(Familon)、(CP-averaged)、(SD)
+_ANNOTATION = re.compile(r"^\([^()]*\)$")
+
+
+def conjugate_token(token: str) -> Optional[str]:
+    """单个 PDG 名称的电荷共轭，无法可靠确定时返回 None"""
+    if token in _SELF_CONJUGATE_WORDS or _ANNOTATION.match(token) or not re.search(r"[A-Za-z]", token):
+        return token
+    charged = _CHARGED.match(token)
+    body, charge = (charged.group('body'), charged.group('charge')) if charged else (token, "")
+    bar = _BAR.match(body)
+    if bar:
+        body = bar.group('root') + bar.group('rest')
+    elif _BARYON.match(body):
+        return None
+    elif charge:
+        pass  # 带电介子、轻子与 h+- 等泛称：只交换电荷
+    elif body.startswith("nu"):
+        body = "nubar" + body[2:]
+    elif _SELF_CONJUGATE.match(body) or _GENERIC.match(body):
+        pass
+    elif _FLAVOURED_NEUTRAL.match(body):
+        match = _FLAVOURED_NEUTRAL.match(body)
+        body = match.group('root') + "bar" + match.group('rest')
+    else:
+        return None
+    return body + _CHARGE_SWAP.get(charge, charge)
+
+
+def conjugate_name(name: str) -> Optional[str]:
+    """未解析产物名（可含多个粒子，如 "e+ semileptonic"）的电荷共轭，任一部分无法确定时返回 None"""
+    tokens = [conjugate_token(token) for token in name.split()]
+    if not tokens or None in tokens:
+        return None
+    return " ".join(tokens)
+
+
+class DecayMode(tuple):
+    """(分支比, 是否为上限, 描述, 产物) 的只读元组；产物为 mcid，无法解析时保留 PDG 名称"""
+
+    __slots__ = ()
+
+    def __new__(cls, bf: float, is_limit: bool, description: str, products: Tuple[ProductKey, ...]):
+        return super().__new__(cls, (bf, is_limit, description, products))
+
+    bf = property(lambda self: self[0])
+    is_limit = property(lambda self: self[1])
+    description = property(lambda self: self[2])
+    products = property(lambda self: self[3])
+
+
+class DecayTreeExpander:
+    """按 mcid 记忆衰变道的衰变树展开器"""
+
+    def __init__(self, registry: Optional[ParticleRecordRegistry] = None):
+        self.registry = registry if registry is not None else get_particle_registry()
+        # mcid -> (record, modes, 无法共轭而略去的衰变道数)；记录在热更新后被替换时重新解析
+        self._modes: Dict[int, Tuple[ParticleRecord, Tuple[DecayMode, ...], int]] = {}
+        # PDG 产物名 -> mcid（无法解析为 None）及 mcid -> 名称，随拼写索引替换而失效
+        self._names: Dict[str, Optional[int]] = {}
+        self._spellings: Dict[int, str] = {}
+        self._names_index = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.unconjugated = 0
+
+    def _sync_index(self):
+        """拼写索引被替换（热更新）时重置名称解析缓存"""
+        index = get_spelling_index()
+        if index is not self._names_index:
+            with self._lock:
+                if index is not self._names_index:
+                    self._names = {}
+                    self._spellings = {item.get('mcid', 0): item.get('name') for item in index.iter_records()}
+                    self._names_index = index
+        return index
+
+    def _resolve_name(self, name: str) -> Optional[int]:
+        """将 PDG 产物名解析为数据集中的 mcid"""
+        index = self._sync_index()
+        if name not in self._names:
+            item = index.find_record(name)
+            self._names[name] = item.get('mcid') if item else None
+        return self._names[name]
+
+    def _conjugate(self, product: ProductKey) -> Optional[ProductKey]:
+        """
+        产物的电荷共轭；数据集中没有反粒子的 mcid 视为自共轭。
+        未解析的名称按 PDG 命名规则共轭并重新解析，无法确定时返回 None
+        """
+        if isinstance(product, int):
+            return -product if -product in self._spellings else product
+        name = conjugate_name(product)
+        if name is None:
+            return None
+        mcid = self._resolve_name(name)
+        return mcid if mcid is not None else name
+
+    @staticmethod
+    def _fractions(record: ParticleRecord) -> Iterable[Dict]:
+        """优先使用排他衰变道，没有时退回全部分支比"""
+        return record.exclusive_branching_fractions or record.branching_fractions or ()
+
+    def _parse_modes(self, record: ParticleRecord) -> Tuple[Tuple[DecayMode, ...], int]:
+        """
+        解析衰变道，返回 (衰变道, 略去的衰变道数)。PDG 对反粒子返回的是粒子本身的衰变道（B- 得到 "B+ --> ..."），
+        此时对产物取电荷共轭，并按反粒子重写描述；有产物无法共轭的衰变道被略去（计入 unconjugated），
+        不给出错误的末态。
+        """
+        self._sync_index()
+        modes = []
+        dropped = 0
+        for bf in self._fractions(record):
+            names = bf.get('decay_products') or []
+            if not names:
+                continue
+            # 优先使用转换分支比时已解析的产物 mcid，缺失或不在数据集中时再按名称查拼写索引
+            mcids = bf.get('decay_product_mcids') or [None] * len(names)
+            products = []
+            for name, mcid in zip(names, mcids):
+                if mcid is None or mcid not in self._spellings:
+                    mcid = self._resolve_name(name)
+                products.append(mcid if mcid is not None else name)
+            description = bf.get('description') or ''
+            parent = description.split('-->')[0].strip()
+            if record.mcid < 0 and self._resolve_name(parent) == -record.mcid:
+                products = [self._conjugate(p) for p in products]
+                if None in products:
+                    dropped += 1
+                    continue
+                description = f"{record.name} --> " + " ".join(
+                    self._spellings[p] if isinstance(p, int) else p for p in products)
+            modes.append(DecayMode(float(bf.get('value') or 0.0), bool(bf.get('is_limit')),
+                                   description, tuple(products)))
+        modes.sort(key=lambda mode: mode.bf, reverse=True)
+        self.unconjugated += dropped
+        return tuple(modes), dropped
+
+    def record(self, key: Union[int, str]) -> ParticleRecord:
+        """按任意拼写或 mcid 获取粒子记录，未找到时抛出 ValueError"""
+        if isinstance(key, int):
+            self._sync_index()
+            if key not in self._spellings:
+                raise ValueError(f"Particle mcid={key} not found in database")
+            key = self._spellings[key]
+        return self.registry.get(key)
+
+    def _cached(self, record: ParticleRecord) -> Tuple[ParticleRecord, Tuple[DecayMode, ...], int]:
+        cached = self._modes.get(record.mcid)
+        if cached is not None and cached[0] is record:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        cached = (record, *self._parse_modes(record))
+        self._modes[record.mcid] = cached
+        return cached
+
+    def modes(self, record: ParticleRecord) -> Tuple[DecayMode, ...]:
+        """返回记录的全部衰变道（按分支比降序），每个记录只解析一次"""
+        return self._cached(record)[1]
+
+    def dropped_modes(self, record: ParticleRecord) -> int:
+        """反粒子因产物无法电荷共轭而略去的衰变道数，非 0 时其衰变道不完整"""
+        return self._cached(record)[2]
+
+    def expand(self,
+               name: str,
+               max_depth: int = 2,
+               min_bf: float = 0.01,
+               max_modes: Optional[int] = None,
+               include_limits: bool = False,
+               expand_stable: bool = False,
+               max_nodes: int = MAX_NODES) -> Dict:
+        """
+        广度优先展开衰变树，每个粒子只展开一次（取离根最近的深度）。
+        返回 {"root", "nodes", "edges", "dropped_modes"}：节点以序号引用，边为 (母粒子, 分支比, 产物节点序号) 的衰变道，
+        dropped_modes 为已展开节点中因无法电荷共轭而略去的衰变道总数（非 0 时反粒子的树不完整）。
+        """
+        max_depth = max(0, min(int(max_depth), MAX_DEPTH))
+        root = self.record(name)
+
+        nodes: List[Dict] = []
+        node_ids: Dict[ProductKey, int] = {}
+        edges: List[Dict] = []
+
+        def node_id(key: ProductKey, record: Optional[ParticleRecord], depth: int) -> int:
+            if key in node_ids:
+                return node_ids[key]
+            node = {"name": record.name if record is not None else key,
+                    "mcid": record.mcid if record is not None else None,
+                    "depth": depth, "stop": None}
+            node_ids[key] = len(nodes)
+            nodes.append(node)
+            queue.append((node_ids[key], record))
+            return node_ids[key]
+
+        queue = deque()
+        dropped = 0
+        node_id(root.mcid, root, 0)
+        while queue:
+            nid, record = queue.popleft()
+            node = nodes[nid]
+            if record is None:
+                node["stop"] = STOP_UNKNOWN
+                continue
+            if node["depth"] >= max_depth:
+                node["stop"] = STOP_DEPTH
+                continue
+            if nid > 0 and not expand_stable and abs(record.mcid) in STABLE_MCIDS:
+                node["stop"] = STOP_STABLE
+                continue
+
+            _, modes, n_dropped = self._cached(record)
+            dropped += n_dropped
+            selected = [mode for mode in modes
+                        if mode.bf >= min_bf and (include_limits or not mode.is_limit)]
+            if max_modes is not None:
+                selected = selected[:max(0, int(max_modes))]
+            if not selected:
+                node["stop"] = STOP_PARTIAL if record.partial else STOP_NO_MODES
+                continue
+
+            for mode in selected:
+                if len(nodes) + len(mode.products) > max_nodes:
+                    node["stop"] = STOP_LIMIT
+                    break
+                product_ids = []
+                for key in mode.products:
+                    child = None
+                    if isinstance(key, int) and key not in node_ids:
+                        try:
+                            child = self.record(key)
+                        except ValueError:
+                            key = str(key)
+                    product_ids.append(node_id(key, child, node["depth"] + 1))
+                edges.append({"parent": nid, "bf": mode.bf, "is_limit": mode.is_limit,
+                              "description": mode.description, "products": product_ids})
+
+        return {"root": 0, "nodes": nodes, "edges": edges, "dropped_modes": dropped}
+
+    def stats(self) -> Dict:
+        return {"particles": len(self._modes), "product_names": len(self._names),
+                "hits": self.hits, "misses": self.misses, "unconjugated": self.unconjugated}
+
+
+_expander_lock = threading.Lock()
+_default_expander: Optional[DecayTreeExpander] = None
+
+
+def get_decay_tree_expander() -> DecayTreeExpander:
+    """获取进程内默认展开器（共享默认粒子记录表）"""
+    global _default_expander
+    if _default_expander is None:
+        with _expander_lock:
+            if _default_expander is None:
+                _default_expander = DecayTreeExpander()
+    return _default_expander
+
+
+if __name__ == "__main__":
+    import json
+    tree = get_decay_tree_expander().expand(sys.argv[1] if len(sys.argv) > 1 else "D+", max_depth=2, min_bf=0.05)
+    print(json.dumps(tree, indent=2, ensure_ascii=False))
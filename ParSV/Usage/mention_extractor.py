@@ -0,0 +1,270 @@
+"""
+自由文本粒子提及抽取
+将 particle_variants.json 中的全部拼写（名称、LaTeX、Unicode、别名、拼写错误）编译为
+Aho-Corasick 自动机，单次线性扫描文本，按词边界规则返回最长且不重叠的粒子提及及其 mcid。
+安装 pyahocorasick 时自动使用其 C 实现，否则使用纯 Python 自动机。
+"""
+
+import multiprocessing as mp
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.Usage.spelling_index import (
+    SpellingIndex, get_spelling_index, iter_spellings, KIND_NAME, KIND_ALIAS, KIND_TYPO)
+
+try:
+    import ahocorasick  # pyahocorasick, 可选依赖
+except ImportError:
+    ahocorasick = None
+
+KIND_LABELS = {KIND_NAME: "name", KIND_ALIAS: "alias", KIND_TYPO: "typo"}
+
+
+class _PyAutomaton:
+    """纯 Python 的 Aho-Corasick 自动机"""
+
+    def __init__(self, patterns: Sequence[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.out: List[int] = [-1]      # 以该节点结尾的模式编号
+        for pid, pattern in enumerate(patterns):
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.out.append(-1)
+                node = nxt
+            self.out[node] = pid
+
+        # 广度优先计算失败指针与输出链接（最近的可输出后缀节点）
+        n = len(self.goto)
+        self.fail = [0] * n
+        self.link = [-1] * n
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                fc = self.goto[f].get(ch, 0)
+                self.fail[child] = fc
+                self.link[child] = fc if self.out[fc] >= 0 else self.link[fc]
+                queue.append(child)
+
+    def iter_matches(self, text: str):
+        """逐个结束位置产出 (end, [pid, ...])，pid 由长到短排列"""
+        goto, fail, out, link = self.goto, self.fail, self.out, self.link
+        node = 0
+        for pos, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not node:
+                continue
+            hit = node if out[node] >= 0 else link[node]
+            if hit <= 0:
+                continue
+            pids = []
+            while hit > 0:
+                pids.append(out[hit])
+                hit = link[hit]
+            yield pos + 1, pids
+
+
+class ParticleMentionExtractor:
+    """基于拼写索引构建的粒子提及抽取器"""
+
+    def __init__(self,
+                 index: Optional[SpellingIndex] = None,
+                 include_typos: bool = True,
+                 min_length: int = 2):
+        """
+        Args:
+            include_typos: 是否匹配数据集中的拼写错误
+            min_length: ASCII 拼写的最短长度，避免单字母（如 d、u、e）在普通文本中误报；
+                非 ASCII 的单字符拼写（如 π、γ）始终保留
+        """
+        self.index = index if index is not None else get_spelling_index()
+        kinds = (KIND_NAME, KIND_ALIAS, KIND_TYPO) if include_typos else (KIND_NAME, KIND_ALIAS)
+
+        self.patterns: List[str] = []
+        self.targets: List[tuple] = []  # (记录序号, kind)
+        seen = set()
+        for item in self.index.iter_records():
+            for spelling, _ in iter_spellings(item):
+                if spelling in seen:
+                    continue
+                seen.add(spelling)
+                if len(spelling) < min_length and spelling.isascii():
+                    continue
+                if spelling.strip() != spelling or not spelling.strip():
+                    continue
+                # 同一拼写对应多条记录时，与 Particle.match_particle_name 的解析结果保持一致
+                for idx, kind in self.index.lookup_all(spelling):
+                    if kind in kinds:
+                        self.patterns.append(spelling)
+                        self.targets.append((idx, kind))
+                        break
+
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for pid, pattern in enumerate(self.patterns):
+                self._automaton.add_word(pattern, pid)
+            self._automaton.make_automaton()
+        else:
+            self._automaton = _PyAutomaton(self.patterns)
+        self._records: Dict[int, Dict] = {}
+
+    def _iter_candidates(self, text: str):
+        """产出 (end, [pid, ...])，pid 由长到短排列"""
+        if ahocorasick is None:
+            yield from self._automaton.iter_matches(text)
+            return
+        patterns = self.patterns
+        last_end, pids = None, []
+        for end_idx, pid in self._automaton.iter(text):
+            if end_idx + 1 != last_end and pids:
+                yield last_end, sorted(pids, key=lambda p: -len(patterns[p]))
+                pids = []
+            last_end = end_idx + 1
+            pids.append(pid)
+        if pids:
+            yield last_end, sorted(pids, key=lambda p: -len(patterns[p]))
+
+    @staticmethod
+    def _on_boundary(text: str, start: int, end: int) -> bool:
+        """词边界规则：匹配首/尾为字母数字时，其外侧不能紧邻字母数字"""
+        if start > 0 and text[start].isalnum() and text[start - 1].isalnum():
+            return False
+        if end < len(text) and text[end - 1].isalnum() and text[end].isalnum():
+            return False
+        return True
+
+    def _record(self, idx: int) -> Dict:
+        record = self._records.get(idx)
+        if record is None:
+            record = self.index.get_record(idx)
+            self._records[idx] = record
+        return record
+
+    def extract(self, text: str) -> List[Dict]:
+        """抽取文本中的粒子提及，返回按位置排序、互不重叠的最长匹配"""
+        if not text:
+            return []
+        patterns = self.patterns
+        # 每个结束位置保留满足词边界的最长匹配
+        candidates = []
+        for end, pids in self._iter_candidates(text):
+            for pid in pids:
+                start = end - len(patterns[pid])
+                if self._on_boundary(text, start, end):
+                    candidates.append((start, end, pid))
+                    break
+
+        # 左起最长、互不重叠
+        candidates.sort(key=lambda c: (c[0], c[0] - c[1]))
+        mentions = []
+        last_end = 0
+        for start, end, pid in candidates:
+            if start < last_end:
+                continue
+            idx, kind = self.targets[pid]
+            record = self._record(idx)
+            mentions.append({
+                "text": text[start:end],
+                "start": start,
+                "end": end,
+                "mcid": record.get("mcid"),
+                "name": record.get("name"),
+                "kind": KIND_LABELS[kind],
+            })
+            last_end = end
+        return mentions
+
+    def extract_batch(self, texts: Sequence[str], processes: int = 1) -> List[List[Dict]]:
+        """批量抽取；processes > 1 时使用 fork 进程池并行处理，子进程直接继承已编译的自动机"""
+        if processes <= 1 or len(texts) < 2:
+            return [self.extract(text) for text in texts]
+        global _pool_extractor
+        _pool_extractor = self
+        with ProcessPoolExecutor(max_workers=processes, mp_context=mp.get_context("fork")) as pool:
+            chunksize = max(1, len(texts) // (processes * 4))
+            return list(pool.map(_pool_extract, texts, chunksize=chunksize))
+
+
+_pool_extractor: Optional[ParticleMentionExtractor] = None
+
+
+def _pool_extract(text: str) -> List[Dict]:
+    return _pool_extractor.extract(text)
+
+
+_extractor_lock = threading.Lock()
+_default_extractors: Dict[bool, ParticleMentionExtractor] = {}
+
+
+def get_mention_extractor(include_typos: bool = True) -> ParticleMentionExtractor:
+    """获取进程内默认抽取器（惰性构建）"""
+    extractor = _default_extractors.get(include_typos)
+    if extractor is None:
+        with _extractor_lock:
+            extractor = _default_extractors.get(include_typos)
+            if extractor is None:
+                extractor = ParticleMentionExtractor(include_typos=include_typos)
+                _default_extractors[include_typos] = extractor
+    return extractor
+
+
+def reload_mention_extractors(index: SpellingIndex):
+    """数据集热更新时基于新索引重建已加载的抽取器并原子替换"""
+    rebuilt = {include_typos: ParticleMentionExtractor(index=index, include_typos=include_typos)
+               for include_typos in list(_default_extractors)}
+    with _extractor_lock:
+        _default_extractors.clear()
+        _default_extractors.update(rebuilt)
+
+
+def extract_particle_mentions(text: str, include_typos: bool = True) -> List[Dict]:
+    """抽取单个文本中的粒子提及"""
+    return get_mention_extractor(include_typos).extract(text)
+
+
+def extract_particle_mentions_batch(texts: Sequence[str], include_typos: bool = True,
+                                    processes: int = 1) -> List[List[Dict]]:
+    """批量抽取多个文本中的粒子提及"""
+    return get_mention_extractor(include_typos).extract_batch(texts, processes=processes)
+
+
+if __name__ == "__main__":
+    import time
+
+    t0 = time.perf_counter()
+    extractor = get_mention_extractor()
+    t1 = time.perf_counter()
+    print(f"Compiled {len(extractor.patterns)} spellings in {(t1 - t0) * 1e3:.1f} ms")
+
+    text = ("We study B+ -> J/psi K+ decays with J/ψ → μ+μ−, and measure the Λc+ and "
+            "$\\Lambda_b^0$ lifetimes using pi+pi- pairs and photons (γ).")
+    for m in extractor.extract(text):
+        print(f"  [{m['start']:>3}:{m['end']:<3}] {m['text']!r:<18} -> {m['name']} (mcid={m['mcid']}, {m['kind']})")
+
+    doc = text * 5000
+    t0 = time.perf_counter()
+    mentions = extractor.extract(doc)
+    t1 = time.perf_counter()
+    print(f"{len(doc) / 1e6:.2f} MB document: {len(mentions)} mentions in {(t1 - t0):.2f} s")
@@ -0,0 +1,167 @@
+"""
+不可变粒子记录
+每个 (PDG 版本, mcid) 只构建一次 __slots__ 记录并在请求之间共享，响应时再附加 mother/children 等请求相关字段，
+避免每个请求都创建带 40 多个实例属性的 Particle 对象并立即丢弃。
+"""
+
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.Usage.Particle import Particle
+from ParSV.Usage.spelling_index import get_spelling_index
+from ParSV.Usage.pdg_editions import PdgEditions, get_pdg_editions
+from ParSV.Usage.pdg_guard import get_pdg_guard
+from ParSV.worker._response_value_object import ParticleVO
+
+REQUEST_FIELDS = ('mother', 'children')
+# 与 ParticleVO 字段顺序一致，保证响应的键顺序不变
+RESPONSE_FIELDS = tuple(ParticleVO.model_fields)
+RECORD_FIELDS = tuple(f for f in RESPONSE_FIELDS if f not in REQUEST_FIELDS)
+
+
+class ParticleRecord:
+    """按 mcid 驻留的只读粒子记录"""
+
+    __slots__ = RECORD_FIELDS + ('_response',)
+
+    def __init__(self, **values: Any):
+        for field in RECORD_FIELDS:
+            value = values.get(field)
+            object.__setattr__(self, field, tuple(value) if isinstance(value, list) else value)
+        # 响应模板（列表字段只转换一次），请求相关字段在 to_response 中填充
+        response = {}
+        for field in RESPONSE_FIELDS:
+            value = None if field in REQUEST_FIELDS else getattr(self, field)
+            response[field] = list(value) if isinstance(value, tuple) else value
+        object.__setattr__(self, '_response', response)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self) -> str:
+        return f"ParticleRecord(name={self.name!r}, mcid={self.mcid})"
+
+    @classmethod
+    def from_particle(cls, particle: Particle) -> "ParticleRecord":
+        """由 Particle 构建记录，分支比等字段经 ParticleVO 转换为可序列化的形式"""
+        values = {field: getattr(particle, field, None) for field in RECORD_FIELDS}
+        return cls(**ParticleVO(**values).model_dump())
+
+    def to_response(self, mother: Optional[str] = None, children: Optional[List[str]] = None) -> Dict:
+        """生成响应字典，与 ParticleVO(...).model_dump() 结构一致；嵌套的分支比列表在请求之间共享"""
+        if mother is not None and not isinstance(mother, str):
+            raise ValueError(f"mother should be a string, got {type(mother).__name__}")
+        if children is not None and (isinstance(children, str) or not all(isinstance(c, str) for c in children)):
+            raise ValueError("children should be a list of strings")
+        response = dict(self._response)
+        response['mother'] = mother
+        response['children'] = list(children) if children is not None else []
+        return response
+
+
+class ParticleRecordRegistry:
+    """(PDG 版本, mcid) -> ParticleRecord 的驻留表，同一键的并发首次请求只构建一次；partial 记录不驻留"""
+
+    def __init__(self, editions: Optional[PdgEditions] = None):
+        self.editions = editions if editions is not None else get_pdg_editions()
+        self.editions.add_evict_listener(self.drop_edition)
+        self._records: Dict[Tuple[str, int], ParticleRecord] = {}
+        self._building: Dict[Tuple[str, int], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.partials = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, name: str, edition: Optional[str] = None) -> ParticleRecord:
+        """按任意拼写获取记录，未找到粒子或版本未配置时抛出 ValueError"""
+        item = get_spelling_index().find_record(name)
+        if not item:
+            raise ValueError(f"Particle {name} not found in database")
+        return self.get_item(item, edition=edition)
+
+    def get_item(self, item: Dict, edition: Optional[str] = None) -> ParticleRecord:
+        """按已解析的本地记录获取粒子记录（以其 mcid 为键），版本未配置时抛出 ValueError"""
+        name = item.get('name') or str(item.get('mcid', 0))
+        edition = self.editions.resolve(edition)
+        key = (edition, item.get('mcid', 0))
+        record = self._records.get(key)
+        if record is not None:
+            self.hits += 1
+            return record
+
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        with build_lock:
+            record = self._records.get(key)
+            if record is None:
+                self.misses += 1
+                record = ParticleRecord.from_particle(Particle(name, edition=edition, record=item))
+                if record.partial:
+                    # 只含本地数据的记录不驻留，PDG 恢复后的请求重新构建完整记录
+                    self.partials += 1
+                else:
+                    self._records[key] = record
+            else:
+                self.hits += 1
+        with self._lock:
+            self._building.pop(key, None)
+        return record
+
+    def invalidate(self, mcids: Iterable[int]) -> int:
+        """删除给定 mcid 在各版本下的记录（数据集热更新时调用），返回删除的条数"""
+        mcids = set(mcids)
+        with self._lock:
+            keys = [key for key in self._records if key[1] in mcids]
+            for key in keys:
+                del self._records[key]
+        return len(keys)
+
+    def drop_edition(self, edition: str) -> int:
+        """删除某个 PDG 版本的全部记录（版本被 LRU 淘汰时调用）"""
+        with self._lock:
+            keys = [key for key in self._records if key[0] == edition]
+            for key in keys:
+                del self._records[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def stats(self) -> Dict:
+        editions: Dict[str, int] = {}
+        for edition, _ in list(self._records):
+            editions[edition] = editions.get(edition, 0) + 1
+        return {"records": len(self._records), "hits": self.hits, "misses": self.misses,
+                "partials": self.partials, "editions": editions, "pdg": self.editions.stats(),
+                "pdg_guard": get_pdg_guard().stats()}
+
+
+_registry_lock = threading.Lock()
+_default_registry: Optional[ParticleRecordRegistry] = None
+
+
+def get_particle_registry() -> ParticleRecordRegistry:
+    """获取进程内默认记录表"""
+    global _default_registry
+    if _default_registry is None:
+        with _registry_lock:
+            if _default_registry is None:
+                _default_registry = ParticleRecordRegistry()
+    return _default_registry
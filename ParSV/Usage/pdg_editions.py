@@ -0,0 +1,172 @@
+"""
+PDG 多版本连接
+pdg 包按数据库文件区分版本（pdg.connect() 打开安装包自带的默认版本），本模块维护 版本 -> 数据库 URL 的映射，
+每个版本在首次使用时才打开连接并在进程内复用；常驻版本数超过上限时按 LRU 关闭最久未用的版本，
+并通知按 (edition, mcid) 缓存的记录表一起淘汰。
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import pdg
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+EDITIONS_ENV = "PARSV_PDG_EDITIONS"
+MAX_EDITIONS_ENV = "PARSV_MAX_PDG_EDITIONS"
+DEFAULT_MAX_EDITIONS = 3
+
+
+def parse_editions(spec: Optional[str]) -> Dict[str, str]:
+    """
+    解析 '2024=/data/pdg-2024.sqlite, 2022=sqlite:////data/pdg-2022.sqlite'，
+    文件路径转换为 sqlite URL
+    """
+    editions = {}
+    for part in (spec or "").replace(";", ",").split(","):
+        if not part.strip():
+            continue
+        edition, sep, url = part.partition("=")
+        if not sep or not edition.strip() or not url.strip():
+            raise ValueError(f"Invalid PDG edition `{part.strip()}`, expected <edition>=<database path or url>")
+        url = url.strip()
+        if "://" not in url:
+            url = f"sqlite:///{os.path.abspath(url)}"
+        editions[edition.strip()] = url
+    return editions
+
+
+def _dispose(api):
+    """释放连接的数据库引擎"""
+    engine = getattr(api, "engine", None)
+    if engine is not None:
+        try:
+            engine.dispose()
+        except Exception:
+            pass
+
+
+class PdgEditions:
+    """按版本惰性打开并 LRU 淘汰的 PDG 连接池"""
+
+    def __init__(self, editions: Optional[Dict[str, str]] = None, max_editions: int = DEFAULT_MAX_EDITIONS):
+        """
+        Args:
+            editions: 额外版本 -> 数据库 URL；默认版本（安装包自带的数据库）始终可用且不会被淘汰
+            max_editions: 同时常驻的版本数上限（含默认版本）
+        """
+        self.editions = dict(editions or {})
+        self.max_editions = max(1, int(max_editions))
+        self._apis: "OrderedDict[Optional[str], object]" = OrderedDict()
+        self._default_edition: Optional[str] = None
+        self._lock = threading.Lock()
+        self._evict_listeners: List[Callable[[str], None]] = []
+        self.opens = 0
+        self.evictions = 0
+
+    def add_evict_listener(self, listener: Callable[[str], None]):
+        """注册版本被淘汰时的回调（参数为版本名），用于清理按版本缓存的数据"""
+        self._evict_listeners.append(listener)
+
+    @property
+    def default_edition(self) -> str:
+        if self._default_edition is None:
+            self.connect()
+        return self._default_edition
+
+    def available(self) -> List[str]:
+        return sorted(set(self.editions) | {self.default_edition})
+
+    def resolve(self, edition: Optional[str]) -> str:
+        """规范化版本名：None 指向默认版本，未配置的版本抛出 ValueError"""
+        key = self._key(edition)
+        return self.default_edition if key is None else key
+
+    def _key(self, edition: Optional[str]) -> Optional[str]:
+        """连接表的键：默认数据库为 None"""
+        if edition is None:
+            return None
+        edition = str(edition).strip()
+        if edition in self.editions:
+            return edition
+        if edition == self.default_edition:
+            return None
+        raise ValueError(f"PDG edition `{edition}` is not configured, available: {self.available()}")
+
+    def connect(self, edition: Optional[str] = None):
+        """返回该版本的 PdgApi，首次使用时打开连接"""
+        key = self._key(edition)
+        with self._lock:
+            api = self._apis.get(key)
+            if api is not None:
+                self._apis.move_to_end(key)
+                return api
+        # 打开连接不持锁，避免冷启动的版本阻塞其他版本的查询
+        api = pdg.connect() if key is None else pdg.connect(database_url=self.editions[key])
+        evicted = []
+        with self._lock:
+            if key is None and self._default_edition is None:
+                self._default_edition = str(getattr(api, "default_edition", None) or getattr(api, "edition", "default"))
+            api = self._apis.setdefault(key, api)
+            self._apis.move_to_end(key)
+            self.opens += 1
+            while len(self._apis) > self.max_editions:
+                victim = next((k for k in self._apis if k is not None and k != key), None)
+                if victim is None:
+                    break
+                evicted.append((victim, self._apis.pop(victim)))
+                self.evictions += 1
+        for victim, victim_api in evicted:
+            _dispose(victim_api)
+            for listener in self._evict_listeners:
+                listener(victim)
+        return api
+
+    def clear(self):
+        """关闭全部连接（下次使用时重新打开）"""
+        with self._lock:
+            apis = list(self._apis.values())
+            self._apis.clear()
+        for api in apis:
+            _dispose(api)
+
+    def stats(self) -> Dict:
+        return {
+            "default_edition": self._default_edition,
+            "configured": sorted(self.editions),
+            "resident": [self._default_edition if k is None else k for k in self._apis],
+            "max_editions": self.max_editions,
+            "opens": self.opens,
+            "evictions": self.evictions,
+        }
+
+
+_editions_lock = threading.Lock()
+_default_editions: Optional[PdgEditions] = None
+
+
+def get_pdg_editions() -> PdgEditions:
+    """获取进程内默认连接池；额外版本与常驻上限来自 PARSV_PDG_EDITIONS / PARSV_MAX_PDG_EDITIONS"""
+    global _default_editions
+    if _default_editions is None:
+        with _editions_lock:
+            if _default_editions is None:
+                _default_editions = PdgEditions(
+                    parse_editions(os.environ.get(EDITIONS_ENV)),
+                    max_editions=int(os.environ.get(MAX_EDITIONS_ENV) or DEFAULT_MAX_EDITIONS))
+    return _default_editions
+
+
+def connect(edition: Optional[str] = None):
+    """按版本获取共享的 PdgApi，edition 为 None 时使用默认版本"""
+    return get_pdg_editions().connect(edition)
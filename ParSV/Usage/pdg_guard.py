@@ -0,0 +1,234 @@
+"""
+PDG 访问的延迟预算与熔断
+构建粒子记录时，每个 PDG 阶段（基本属性、三类分支比）在守护线程中限时执行，同一次构建的各阶段共享一个总延迟预算。
+同时执行的阶段数由信号量限制，阶段超时从开始执行时计时，排队时间只计入总预算，进程内的并发负载因此不会触发熔断。
+超时或数据库故障连续达到阈值后熔断器打开，冷却期内不再访问 PDG，记录只含本地数据并带 partial 标记；
+冷却结束后放行一次探测调用，成功则恢复。超时的调用无法强行中止，但熔断保证卡住的线程数有上限。
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+try:
+    from sqlalchemy.exc import DBAPIError
+except ImportError:
+    DBAPIError = sqlite3.Error
+
+STAGE_TIMEOUT_ENV = "PARSV_PDG_STAGE_TIMEOUT"
+BUDGET_ENV = "PARSV_PDG_BUDGET"
+BREAKER_FAILURES_ENV = "PARSV_PDG_BREAKER_FAILURES"
+BREAKER_RESET_ENV = "PARSV_PDG_BREAKER_RESET"
+BREAKER_SLOW_CALL_ENV = "PARSV_PDG_BREAKER_SLOW_CALL"
+CONCURRENCY_ENV = "PARSV_PDG_CONCURRENCY"
+DEFAULT_STAGE_TIMEOUT = 2.0
+DEFAULT_BUDGET = 5.0
+DEFAULT_BREAKER_FAILURES = 5
+DEFAULT_BREAKER_RESET = 30.0
+DEFAULT_BREAKER_SLOW_CALL = 0.0  # 不把慢调用计为失败
+DEFAULT_CONCURRENCY = 1  # PDG 查询大多持有 GIL，串行执行几乎不损失吞吐，且阶段耗时只反映 PDG 本身
+
+# 视为 PDG 不可用（而不是该粒子数据有问题）的异常，计入熔断
+OUTAGE_ERRORS = (DBAPIError, sqlite3.Error, OSError, TimeoutError)
+
+T = TypeVar("T")
+
+
+class PdgUnavailable(RuntimeError):
+    """熔断打开、预算耗尽或数据库故障，本阶段没有拿到 PDG 数据"""
+
+
+class PdgTimeout(PdgUnavailable, TimeoutError):
+    """PDG 阶段超时"""
+
+
+class LatencyBudget:
+    """一次构建的总延迟预算"""
+
+    def __init__(self, seconds: float):
+        self.deadline = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+
+class CircuitBreaker:
+    """连续失败计数的熔断器：closed -> open -> (冷却后) half_open -> closed / open"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = DEFAULT_BREAKER_FAILURES,
+                 reset_timeout: float = DEFAULT_BREAKER_RESET,
+                 slow_call: float = DEFAULT_BREAKER_SLOW_CALL,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            failure_threshold: 连续失败多少次后打开
+            reset_timeout: 打开后的冷却时间（秒），之后放行一次探测调用
+            slow_call: 成功但执行耗时超过该值（秒）的调用也记为失败，<= 0 时不计（默认）
+        """
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.slow_call = float(slow_call)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.opens = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """是否放行本次调用；half_open 状态下同时只放行一次探测"""
+        with self._lock:
+            if self.state == self.OPEN and self._clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok: bool, elapsed: float = 0.0):
+        """记录一次调用的结果"""
+        failed = not ok or (self.slow_call > 0 and elapsed >= self.slow_call)
+        with self._lock:
+            self._probing = False
+            if not failed:
+                self.failures = 0
+                self.state = self.CLOSED
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state = self.OPEN
+                self.opened_at = self._clock()
+
+    def stats(self) -> Dict:
+        return {"state": self.state, "failures": self.failures, "opens": self.opens, "rejected": self.rejected,
+                "slow_call": self.slow_call}
+
+
+class PdgGuard:
+    """为 PDG 调用施加阶段超时、总预算与熔断"""
+
+    def __init__(self, stage_timeout: float = DEFAULT_STAGE_TIMEOUT,
+                 budget: float = DEFAULT_BUDGET,
+                 breaker: Optional[CircuitBreaker] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY):
+        self.stage_timeout = float(stage_timeout)
+        self.budget_seconds = float(budget)
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.concurrency = max(1, int(concurrency))
+        self._slots = threading.Semaphore(self.concurrency)
+        self.calls = 0
+        self.timeouts = 0
+        self.outages = 0
+        self.exhausted = 0
+
+    @property
+    def available(self) -> bool:
+        """熔断器处于关闭状态（PDG 被认为可用）"""
+        return self.breaker.state == CircuitBreaker.CLOSED
+
+    def budget(self) -> LatencyBudget:
+        return LatencyBudget(self.budget_seconds)
+
+    def call(self, stage: str, fn: Callable[[], T], budget: Optional[LatencyBudget] = None) -> T:
+        """
+        等待执行槽位（最多等到预算耗尽）后在守护线程中执行 fn，从开始执行起最多等待 min(阶段超时, 剩余预算)。
+        超时、熔断打开、预算耗尽或数据库故障时抛出 PdgUnavailable；fn 的其他异常（粒子数据问题）原样抛出。
+        只有超时与数据库故障计入熔断，排队耗尽预算不计
+        """
+        if budget is not None and budget.remaining() <= 0:
+            self.exhausted += 1
+            raise PdgUnavailable(f"Latency budget exhausted before PDG stage `{stage}`")
+        if not self._slots.acquire(timeout=None if budget is None else budget.remaining()):
+            self.exhausted += 1
+            raise PdgUnavailable(f"Latency budget exhausted while waiting for PDG stage `{stage}`")
+        try:
+            timeout = self.stage_timeout if budget is None else min(self.stage_timeout, budget.remaining())
+            if timeout <= 0:
+                self.exhausted += 1
+                raise PdgUnavailable(f"Latency budget exhausted before PDG stage `{stage}`")
+            if not self.breaker.allow():
+                raise PdgUnavailable(f"PDG circuit breaker is open, skipped stage `{stage}`")
+
+            self.calls += 1
+            result = {}
+
+            def run():
+                try:
+                    result["value"] = fn()
+                except BaseException as e:
+                    result["error"] = e
+
+            t0 = time.monotonic()
+            thread = threading.Thread(target=run, name=f"pdg-{stage}", daemon=True)
+            thread.start()
+            thread.join(timeout)
+            elapsed = time.monotonic() - t0
+        finally:
+            # 超时的线程不再占用槽位（无法中止，由熔断限制其数量）
+            self._slots.release()
+        if thread.is_alive():
+            self.timeouts += 1
+            self.breaker.record(False)
+            raise PdgTimeout(f"PDG stage `{stage}` exceeded {timeout:.3g} s")
+        error = result.get("error")
+        if isinstance(error, OUTAGE_ERRORS):
+            self.outages += 1
+            self.breaker.record(False)
+            raise PdgUnavailable(f"PDG stage `{stage}` failed: {type(error).__name__}: {error}") from error
+        # PDG 有响应（即使该粒子的数据出错）即视为可用
+        self.breaker.record(True, elapsed)
+        if error is not None:
+            raise error
+        return result["value"]
+
+    def stats(self) -> Dict:
+        return {"stage_timeout": self.stage_timeout, "budget": self.budget_seconds, "concurrency": self.concurrency,
+                "calls": self.calls,
+                "timeouts": self.timeouts, "outages": self.outages, "budget_exhausted": self.exhausted,
+                "breaker": self.breaker.stats()}
+
+
+_guard_lock = threading.Lock()
+_default_guard: Optional[PdgGuard] = None
+
+
+def get_pdg_guard() -> PdgGuard:
+    """
+    获取进程内默认守卫；超时、预算、并发与熔断参数来自
+    PARSV_PDG_STAGE_TIMEOUT / PARSV_PDG_BUDGET / PARSV_PDG_CONCURRENCY / PARSV_PDG_BREAKER_*
+    """
+    global _default_guard
+    if _default_guard is None:
+        with _guard_lock:
+            if _default_guard is None:
+                breaker = CircuitBreaker(
+                    failure_threshold=int(os.environ.get(BREAKER_FAILURES_ENV) or DEFAULT_BREAKER_FAILURES),
+                    reset_timeout=float(os.environ.get(BREAKER_RESET_ENV) or DEFAULT_BREAKER_RESET),
+                    slow_call=float(os.environ.get(BREAKER_SLOW_CALL_ENV) or DEFAULT_BREAKER_SLOW_CALL))
+                _default_guard = PdgGuard(stage_timeout=float(os.environ.get(STAGE_TIMEOUT_ENV) or DEFAULT_STAGE_TIMEOUT),
+                                          budget=float(os.environ.get(BUDGET_ENV) or DEFAULT_BUDGET),
+                                          breaker=breaker,
+                                          concurrency=int(os.environ.get(CONCURRENCY_ENV) or DEFAULT_CONCURRENCY))
+    return _default_guard
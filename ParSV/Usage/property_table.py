@@ -0,0 +1,329 @@
+"""
+粒子物理属性列式表
+将全部粒子的质量、宽度、寿命、电荷、量子数及类型标识解析为 NumPy 结构化数组，
+支持向量化的范围/谓词查询、排序与截断；可保存为 .npy 并以 mmap 方式在进程间共享。
+"""
+
+import io
+import os
+import sys
+import threading
+from fractions import Fraction
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+import pdg
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.utils.file_utils import atomic_write_bytes
+from ParSV.Usage.spelling_index import SpellingIndex, get_spelling_index
+
+TABLE_ENV = "PARSV_PROPERTY_TABLE"
+
+FLOAT_COLUMNS = ['charge', 'mass', 'mass_err', 'lifetime', 'lifetime_err', 'width', 'width_err']
+QUANTUM_COLUMNS = ['quantum_C', 'quantum_G', 'quantum_I', 'quantum_J', 'quantum_P']
+FLAG_COLUMNS = ['is_baryon', 'is_boson', 'is_lepton', 'is_meson', 'is_quark',
+                'has_lifetime_entry', 'has_mass_entry', 'has_width_entry']
+COLUMNS = ['mcid'] + FLOAT_COLUMNS + QUANTUM_COLUMNS + FLAG_COLUMNS
+
+TABLE_DTYPE = np.dtype(
+    [('mcid', '<i8')]
+    + [(c, '<f8') for c in FLOAT_COLUMNS + QUANTUM_COLUMNS]
+    + [(c, 'i1') for c in FLAG_COLUMNS]   # 1: True, 0: False, -1: 未知
+)
+
+# PDG 的源属性名与表列名不一致的部分
+_PDG_ATTRS = {'mass_err': 'mass_error', 'lifetime_err': 'lifetime_error', 'width_err': 'width_error'}
+
+
+def parse_quantum_number(value: Any) -> float:
+    """将量子数转换为数值: '+'/'-' -> ±1, '1/2' -> 0.5, 无法解析 -> NaN"""
+    if value is None:
+        return np.nan
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    if text in ('+', '-'):
+        return 1.0 if text == '+' else -1.0
+    try:
+        return float(Fraction(text))
+    except (ValueError, ZeroDivisionError):
+        return np.nan
+
+
+def _flag(value: Any) -> int:
+    return -1 if value is None else int(bool(value))
+
+
+def _float(value: Any) -> float:
+    try:
+        return np.nan if value is None else float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def resolve_properties(item: Dict, api=None) -> Dict[str, Any]:
+    """解析一条记录的属性列（数值形式，未知为 NaN / -1）：优先使用本地数据，缺失项从 PDG 获取；api 为 None 时只用本地数据"""
+    particle = None
+    if api is not None:
+        try:
+            particle = api.get_particle_by_mcid(item.get('mcid', 0))
+        except Exception:
+            particle = None
+
+    def resolve(column):
+        if item.get(column) is not None:
+            return item[column]
+        if particle is None:
+            return None
+        try:
+            return getattr(particle, _PDG_ATTRS.get(column, column))
+        except Exception:
+            return None
+
+    values: Dict[str, Any] = {'mcid': item.get('mcid', 0)}
+    for column in FLOAT_COLUMNS:
+        values[column] = _float(resolve(column))
+    for column in QUANTUM_COLUMNS:
+        values[column] = parse_quantum_number(resolve(column))
+    for column in FLAG_COLUMNS:
+        values[column] = _flag(resolve(column))
+    return values
+
+
+class PropertyTable:
+    """与拼写索引记录一一对应（第 i 行 == 第 i 条记录）的列式属性表"""
+
+    def __init__(self, data: np.ndarray, index: Optional[SpellingIndex] = None):
+        self.data = data
+        self.index = index if index is not None else get_spelling_index()
+        if len(self.data) != len(self.index):
+            raise ValueError(f"Property table has {len(self.data)} rows but index has {len(self.index)} records")
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    # ------------------------------------------------------------------ #
+    # 构建与持久化
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _fill_row(data: np.ndarray, row: int, item: Dict, api):
+        """解析一条记录的属性写入第 row 行"""
+        for column, value in resolve_properties(item, api).items():
+            data[row][column] = value
+
+    @classmethod
+    def build(cls, index: Optional[SpellingIndex] = None) -> "PropertyTable":
+        """逐条记录解析属性"""
+        index = index if index is not None else get_spelling_index()
+        data = np.zeros(len(index), dtype=TABLE_DTYPE)
+        api = pdg.connect()
+        for row, item in enumerate(index.iter_records()):
+            cls._fill_row(data, row, item, api)
+        return cls(data, index=index)
+
+    def rebuild(self, index: SpellingIndex, changed_mcids: Set[int]) -> "PropertyTable":
+        """为新索引构建属性表：未变化的 mcid 直接复用旧行，仅对新增或变化的记录重新解析"""
+        rows = {int(mcid): row for row, mcid in enumerate(self.data['mcid'])}
+        data = np.zeros(len(index), dtype=TABLE_DTYPE)
+        api = None
+        for row, item in enumerate(index.iter_records()):
+            mcid = item.get('mcid', 0)
+            old_row = rows.get(mcid)
+            if old_row is not None and mcid not in changed_mcids:
+                data[row] = self.data[old_row]
+                continue
+            if api is None:
+                api = pdg.connect()
+            self._fill_row(data, row, item, api)
+        return PropertyTable(data, index=index)
+
+    @classmethod
+    def load(cls, table_path: str, index: Optional[SpellingIndex] = None) -> "PropertyTable":
+        """以只读 mmap 方式加载 .npy 表"""
+        return cls(np.load(table_path, mmap_mode='r'), index=index)
+
+    def save(self, table_path: str):
+        """将属性表原子写入 .npy 文件"""
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(self.data))
+        atomic_write_bytes(table_path, buffer.getvalue())
+
+    # ------------------------------------------------------------------ #
+    # 查询
+    # ------------------------------------------------------------------ #
+    def _condition(self, column: str, cond: Any) -> np.ndarray:
+        """将单列条件转换为布尔掩码"""
+        if column not in TABLE_DTYPE.names:
+            raise ValueError(f"Unknown column `{column}`, available: {COLUMNS}")
+        col = self.data[column]
+        is_flag = column in FLAG_COLUMNS
+
+        def value(v):
+            if is_flag:
+                return _flag(v)
+            if column in QUANTUM_COLUMNS:
+                return parse_quantum_number(v)
+            return v
+
+        def eq(v):
+            v = value(v)
+            if col.dtype.kind == 'f':
+                return np.isclose(col, v, rtol=1e-9, atol=0.0)
+            return col == v
+
+        if is_flag:
+            known = col >= 0
+        elif col.dtype.kind == 'f':
+            known = ~np.isnan(col)
+        else:
+            known = np.ones(len(col), dtype=bool)
+
+        if isinstance(cond, dict):
+            mask = np.ones(len(col), dtype=bool)
+            for op, v in cond.items():
+                if op == 'eq':
+                    mask &= eq(v)
+                elif op == 'ne':
+                    mask &= known & ~eq(v)
+                elif op == 'gt':
+                    mask &= known & (col > value(v))
+                elif op == 'ge':
+                    mask &= known & (col >= value(v))
+                elif op == 'lt':
+                    mask &= known & (col < value(v))
+                elif op == 'le':
+                    mask &= known & (col <= value(v))
+                elif op == 'between':
+                    mask &= self._condition(column, list(v))
+                elif op == 'in':
+                    any_mask = np.zeros(len(col), dtype=bool)
+                    for item in v:
+                        any_mask |= eq(item)
+                    mask &= any_mask
+                elif op == 'is_null':
+                    mask &= ~known if v else known
+                else:
+                    raise ValueError(f"Unknown operator `{op}` for column `{column}`")
+            return mask
+        if isinstance(cond, (list, tuple)):
+            if len(cond) != 2:
+                raise ValueError(f"Range for `{column}` should be [low, high], got {cond}")
+            low, high = cond
+            mask = known.copy()
+            if low is not None:
+                mask &= col >= value(low)
+            if high is not None:
+                mask &= col <= value(high)
+            return mask
+        if cond is None:
+            return ~known
+        return eq(cond)
+
+    def mask(self, filters: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """多个列条件取交集"""
+        mask = np.ones(len(self.data), dtype=bool)
+        for column, cond in (filters or {}).items():
+            mask &= self._condition(column, cond)
+        return mask
+
+    def _row_to_dict(self, row: int, fields: List[str]) -> Dict:
+        record = self.index.get_record(row)
+        result = {'name': record.get('name'), 'mcid': int(self.data['mcid'][row])}
+        for column in fields:
+            if column in ('name', 'mcid'):
+                continue
+            v = self.data[column][row]
+            if column in FLAG_COLUMNS:
+                result[column] = None if v < 0 else bool(v)
+            else:
+                result[column] = None if np.isnan(v) else float(v)
+        return result
+
+    def query(self,
+              filters: Optional[Dict[str, Any]] = None,
+              sort_by: Optional[str] = None,
+              descending: bool = False,
+              limit: Optional[int] = 50,
+              fields: Optional[List[str]] = None) -> Dict:
+        """
+        向量化条件查询，例如:
+        {"is_meson": True, "mass": [1.8, 2.0], "width": {"lt": 0.01}}
+        {"is_baryon": True, "charge": {"ne": 0}, "quantum_J": "1/2"}
+        """
+        rows = np.flatnonzero(self.mask(filters))
+        if sort_by:
+            if sort_by not in TABLE_DTYPE.names:
+                raise ValueError(f"Unknown sort column `{sort_by}`, available: {COLUMNS}")
+            keys = self.data[sort_by][rows].astype('f8')
+            if sort_by in FLAG_COLUMNS:
+                keys[keys < 0] = np.nan
+            order = np.argsort(-keys if descending else keys, kind='stable')  # NaN 始终排在最后
+            rows = rows[order]
+        total = int(len(rows))
+        if limit is not None and limit >= 0:
+            rows = rows[:limit]
+        fields = fields or COLUMNS
+        return {
+            'total': total,
+            'particles': [self._row_to_dict(int(r), fields) for r in rows],
+        }
+
+
+_table_lock = threading.Lock()
+_default_table: Optional[PropertyTable] = None
+
+
+def get_property_table() -> PropertyTable:
+    """获取进程内默认属性表；若设置了 PARSV_PROPERTY_TABLE 则 mmap 共享表"""
+    global _default_table
+    if _default_table is None:
+        with _table_lock:
+            if _default_table is None:
+                table_path = os.environ.get(TABLE_ENV)
+                if table_path and os.path.exists(table_path):
+                    _default_table = PropertyTable.load(table_path)
+                else:
+                    _default_table = PropertyTable.build()
+    return _default_table
+
+
+def reload_property_table(index: SpellingIndex, changed_mcids: Set[int]) -> Optional[PropertyTable]:
+    """数据集热更新时增量重建已加载的默认属性表并原子替换；尚未加载时保持惰性，返回新表或 None"""
+    global _default_table
+    current = _default_table
+    if current is None:
+        return None
+    table = current.rebuild(index, changed_mcids)
+    with _table_lock:
+        _default_table = table
+    return table
+
+
+if __name__ == "__main__":
+    import time
+
+    t0 = time.perf_counter()
+    table = PropertyTable.build()
+    t1 = time.perf_counter()
+    print(f"Built property table: {len(table)} rows in {(t1 - t0) * 1e3:.1f} ms")
+    if len(sys.argv) > 1:
+        table.save(sys.argv[1])
+        print(f"Saved to {sys.argv[1]}")
+
+    t0 = time.perf_counter()
+    result = table.query({"is_meson": True, "mass": [1.8, 2.0], "width": {"lt": 0.01}}, sort_by="mass")
+    t1 = time.perf_counter()
+    print(f"Mesons 1.8-2.0 GeV, width < 10 MeV: {result['total']} ({(t1 - t0) * 1e3:.2f} ms)")
+    for p in result['particles']:
+        print(f"  {p['name']:<12} mass={p['mass']:.4f} width={p['width']}")
@@ -0,0 +1,299 @@
+"""
+粒子拼写索引
+将 particle_variants.json 编译为只读的二进制快照（有序键表 + 记录表），
+可直接从内存构建，也可通过 mmap 在多个 worker 进程之间共享同一份物理内存。
+"""
+
+import mmap
+import os
+import struct
+import sys
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.utils import json_codec
+from ParSV.utils.file_utils import atomic_write_bytes
+from ParSV.data.change_journal import dataset_signature, load_dataset
+from ParSV.data.antiparticle import expand_records
+from ParSV.data.categories import parse_categories
+
+DEFAULT_DATA_FILE = f"{here.parent}/data/particle_variants.json"
+SNAPSHOT_ENV = "PARSV_INDEX_SNAPSHOT"
+SPELLING_DB_ENV = "PARSV_SPELLING_DB"
+CATEGORIES_ENV = "PARSV_CATEGORIES"  # 逗号分隔的类别，只加载这些类别（分片数据集只读取对应分片）
+
+SPELLING_FIELDS = ['name', 'programmatic_name', 'latex_name',
+                   'evtgen_name', 'html_name', 'unicode_name']
+
+# 拼写来源类型，数值越小优先级越高
+KIND_NAME = 0
+KIND_ALIAS = 1
+KIND_TYPO = 2
+MATCH_KINDS = (KIND_NAME, KIND_ALIAS)
+
+_MAGIC = b"PSVIDX01"
+_HEAD = struct.Struct("<8sI")
+_RECORD = struct.Struct("<II")      # (offset, length)
+_ENTRY = struct.Struct("<IIII")     # (key_offset, key_length, record_index, kind)
+
+
+def iter_spellings(item: Dict) -> Iterator[tuple]:
+    """遍历一条记录中的全部拼写，返回 (spelling, kind)"""
+    for field in SPELLING_FIELDS:
+        value = item.get(field)
+        if value:
+            yield str(value), KIND_NAME
+    for value in item.get('aliases') or []:
+        if value:
+            yield str(value), KIND_ALIAS
+    for value in item.get('typo') or []:
+        if value:
+            yield str(value), KIND_TYPO
+
+
+class SpellingIndex:
+    """只读拼写索引，底层为 bytes 或 mmap 缓冲区"""
+
+    def __init__(self, buffer, path: Optional[str] = None, mm: Optional[mmap.mmap] = None):
+        self._buf = buffer
+        self._mm = mm
+        self.path = path
+
+        magic, header_len = _HEAD.unpack_from(buffer, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"Invalid spelling index snapshot: {path or '<memory>'}")
+        self.header = json_codec.loads(bytes(buffer[_HEAD.size:_HEAD.size + header_len]))
+        self.n_records = self.header["n_records"]
+        self.n_entries = self.header["n_entries"]
+        sections = self.header["sections"]
+        self._records_off = sections["records"]
+        self._record_table_off = sections["record_table"]
+        self._entries_off = sections["entries"]
+        self._keys_off = sections["keys"]
+
+    # ------------------------------------------------------------------ #
+    # 构建与持久化
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def build(cls, records: Sequence[Dict], source: Optional[str] = None,
+              signature: Optional[List] = None) -> "SpellingIndex":
+        """从记录列表构建内存索引，紧凑格式的记录在此推导出反粒子；signature 为读取前数据文件的签名"""
+        return cls(cls._encode(expand_records(records), source=source, signature=signature))
+
+    @classmethod
+    def from_json_file(cls, file_path: str = DEFAULT_DATA_FILE,
+                       categories: Optional[Sequence[str]] = None) -> "SpellingIndex":
+        """从 JSON 数据文件（及其变更日志）或分片数据集目录构建内存索引，categories 为空时包含全部类别"""
+        signature = dataset_signature(file_path)  # 读取前取签名，读取期间的修改之后仍会被发现
+        records = load_dataset(file_path, categories)
+        return cls.build(records, source=str(file_path), signature=signature)
+
+    @classmethod
+    def open(cls, snapshot_path: str) -> "SpellingIndex":
+        """以只读 mmap 方式打开快照，多进程共享同一份页缓存"""
+        with open(snapshot_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mm, path=str(snapshot_path), mm=mm)
+
+    def save(self, snapshot_path: str):
+        """将索引写入快照文件"""
+        atomic_write_bytes(snapshot_path, bytes(self._buf))
+
+    @property
+    def signature(self) -> Optional[List]:
+        """构建时数据文件的签名（dataset_signature），旧快照没有记录时为 None"""
+        return self.header.get("signature")
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    @staticmethod
+    def _encode(records: Sequence[Dict], source: Optional[str] = None, signature: Optional[List] = None) -> bytes:
+        """编码快照: 头部 | 记录表 | 拼写条目表 | 键 | 记录"""
+        record_blobs = [json_codec.dumpb(item) for item in records]
+
+        # 同一 (拼写, 记录) 只保留优先级最高的来源
+        best_kind: Dict[tuple, int] = {}
+        for idx, item in enumerate(records):
+            for spelling, kind in iter_spellings(item):
+                key = (spelling.encode("utf-8"), idx)
+                if kind < best_kind.get(key, KIND_TYPO + 1):
+                    best_kind[key] = kind
+        # 排序规则: 键 -> 是否为拼写错误 -> 记录顺序，保证与线性扫描的"先到先得"一致
+        entries = sorted(best_kind.items(),
+                         key=lambda e: (e[0][0], e[1] == KIND_TYPO, e[0][1]))
+
+        key_offsets: Dict[bytes, int] = {}
+        key_blob = bytearray()
+        for (key, _), _ in entries:
+            if key not in key_offsets:
+                key_offsets[key] = len(key_blob)
+                key_blob += key
+
+        record_table = bytearray()
+        record_blob = bytearray()
+        for blob in record_blobs:
+            record_table += _RECORD.pack(len(record_blob), len(blob))
+            record_blob += blob
+
+        entry_table = bytearray()
+        for (key, idx), kind in entries:
+            entry_table += _ENTRY.pack(key_offsets[key], len(key), idx, kind)
+
+        def make_header(base: int) -> bytes:
+            sections = {}
+            offset = base
+            for name, blob in (("record_table", record_table), ("entries", entry_table),
+                               ("keys", key_blob), ("records", record_blob)):
+                sections[name] = offset
+                offset += len(blob)
+            header = {
+                "version": 1,
+                "n_records": len(records),
+                "n_entries": len(entries),
+                "sections": sections,
+                "source": source,
+                "signature": signature,
+            }
+            return json_codec.dumpb(header)
+
+        # 头部长度依赖偏移量的位数，迭代至稳定
+        header = make_header(_HEAD.size)
+        while True:
+            candidate = make_header(_HEAD.size + len(header))
+            if len(candidate) == len(header):
+                header = candidate
+                break
+            header = candidate
+
+        return b"".join([_HEAD.pack(_MAGIC, len(header)), header,
+                         bytes(record_table), bytes(entry_table), bytes(key_blob), bytes(record_blob)])
+
+    # ------------------------------------------------------------------ #
+    # 查询
+    # ------------------------------------------------------------------ #
+    def __len__(self) -> int:
+        return self.n_records
+
+    def get_record(self, idx: int) -> Dict:
+        """按记录序号解码一条记录"""
+        if not 0 <= idx < self.n_records:
+            raise IndexError(idx)
+        off, length = _RECORD.unpack_from(self._buf, self._record_table_off + idx * _RECORD.size)
+        start = self._records_off + off
+        return json_codec.loads(self._buf[start:start + length])
+
+    def iter_records(self) -> Iterator[Dict]:
+        for idx in range(self.n_records):
+            yield self.get_record(idx)
+
+    def _entry(self, pos: int) -> tuple:
+        return _ENTRY.unpack_from(self._buf, self._entries_off + pos * _ENTRY.size)
+
+    def _key_at(self, pos: int) -> bytes:
+        key_off, key_len, _, _ = self._entry(pos)
+        start = self._keys_off + key_off
+        return bytes(self._buf[start:start + key_len])
+
+    def _lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self.n_entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup_all(self, name: str) -> List[tuple]:
+        """返回拼写对应的全部 (记录序号, kind)，按优先级排序"""
+        if not name:
+            return []
+        key = name.encode("utf-8")
+        matches = []
+        pos = self._lower_bound(key)
+        while pos < self.n_entries and self._key_at(pos) == key:
+            _, _, idx, kind = self._entry(pos)
+            matches.append((idx, kind))
+            pos += 1
+        return matches
+
+    def lookup(self, name: str, kinds: Sequence[int] = MATCH_KINDS) -> int:
+        """返回第一条匹配记录的序号，未找到返回 -1"""
+        for idx, kind in self.lookup_all(name):
+            if kind in kinds:
+                return idx
+        return -1
+
+    def find_record(self, name: str, kinds: Sequence[int] = MATCH_KINDS) -> Dict:
+        """按任意拼写查找记录，未找到返回空字典"""
+        idx = self.lookup(name, kinds)
+        return self.get_record(idx) if idx >= 0 else {}
+
+
+_index_lock = threading.Lock()
+_default_index: Optional[SpellingIndex] = None
+
+
+def get_spelling_index() -> SpellingIndex:
+    """
+    获取进程内默认索引；若设置了 PARSV_INDEX_SNAPSHOT 则 mmap 共享快照，
+    否则若设置了 PARSV_SPELLING_DB 则查询导出的 SQLite 数据库，
+    否则从数据文件构建，PARSV_CATEGORIES 限定加载的类别
+    """
+    global _default_index
+    if _default_index is None:
+        with _index_lock:
+            if _default_index is None:
+                snapshot = os.environ.get(SNAPSHOT_ENV)
+                database = os.environ.get(SPELLING_DB_ENV)
+                if snapshot and os.path.exists(snapshot):
+                    _default_index = SpellingIndex.open(snapshot)
+                elif database and os.path.exists(database):
+                    from ParSV.Usage.sqlite_export import SpellingDatabase
+                    _default_index = SpellingDatabase.open(database)
+                else:
+                    _default_index = SpellingIndex.from_json_file(
+                        DEFAULT_DATA_FILE, parse_categories(os.environ.get(CATEGORIES_ENV)))
+    return _default_index
+
+
+def set_spelling_index(index: SpellingIndex) -> Optional[SpellingIndex]:
+    """原子替换进程内默认索引，返回旧索引；正在处理的请求继续使用各自持有的旧引用"""
+    global _default_index
+    with _index_lock:
+        previous, _default_index = _default_index, index
+    return previous
+
+
+def build_snapshot(snapshot_path: str, data_file: str = DEFAULT_DATA_FILE,
+                   categories: Optional[Sequence[str]] = None) -> SpellingIndex:
+    """从数据文件（所选类别）构建索引并写入快照，返回 mmap 打开的索引"""
+    SpellingIndex.from_json_file(data_file, categories).save(snapshot_path)
+    return SpellingIndex.open(snapshot_path)
+
+
+if __name__ == "__main__":
+    import time
+
+    t0 = time.perf_counter()
+    index = SpellingIndex.from_json_file()
+    t1 = time.perf_counter()
+    print(f"Built index: {len(index)} records, {index.n_entries} spellings in {(t1 - t0) * 1e3:.1f} ms")
+
+    for name in ["pi+", "π+", "Lambda_c+", "J/psi", "unknown"]:
+        t0 = time.perf_counter()
+        record = index.find_record(name)
+        t1 = time.perf_counter()
+        print(f"{name!r:>12} -> mcid={record.get('mcid')} ({(t1 - t0) * 1e6:.1f} us)")
@@ -0,0 +1,365 @@
+"""
+SQLite 导出
+将 particle_variants.json（含推导出的反粒子）与解析后的物理属性编译为单个 SQLite 数据库，供其他语言的服务直接查询：
+- particles：每个粒子一行（原始记录 JSON + 带索引的属性列），
+- spellings：全部拼写（名称/别名/拼写错误）及其补全用归一化键，
+- spellings_fts / spellings_trigram：两张 FTS5 外部内容表（分词全文检索与 trigram 子串检索），由触发器同步。
+再次导出到同一文件时按记录摘要增量更新：只有新增或变化的记录重新解析属性并重写拼写。
+SpellingDatabase 以只读方式打开该文件，实现与 SpellingIndex 相同的查询接口，可作为 Python 端的查询后端。
+"""
+
+import hashlib
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.utils import json_codec
+from ParSV.data.categories import category_of
+from ParSV.Usage.spelling_index import (DEFAULT_DATA_FILE, KIND_TYPO, MATCH_KINDS, SpellingIndex,
+                                        iter_spellings)
+from ParSV.Usage.property_table import FLAG_COLUMNS, FLOAT_COLUMNS, QUANTUM_COLUMNS, resolve_properties
+from ParSV.Usage.autocomplete import normalize_key
+from ParSV.Usage.mention_extractor import KIND_LABELS
+
+FORMAT_VERSION = 1
+SEARCH_MODES = ("fts", "trigram", "prefix")
+MAX_LIMIT = 200
+
+PROPERTY_COLUMNS = FLOAT_COLUMNS + QUANTUM_COLUMNS + FLAG_COLUMNS
+# 建立 B-tree 索引的属性列（范围查询最常用的列）
+INDEXED_COLUMNS = ('mass', 'width', 'lifetime', 'charge')
+
+SCHEMA = f"""
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE particles (
+    mcid INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    category TEXT,
+    digest TEXT NOT NULL,
+    record TEXT NOT NULL,
+    {", ".join(f"{c} REAL" for c in FLOAT_COLUMNS + QUANTUM_COLUMNS)},
+    {", ".join(f"{c} INTEGER" for c in FLAG_COLUMNS)}
+);
+CREATE INDEX particles_position ON particles(position);
+CREATE INDEX particles_name ON particles(name);
+CREATE INDEX particles_category ON particles(category);
+{"".join(f"CREATE INDEX particles_{c} ON particles({c});" for c in INDEXED_COLUMNS)}
+CREATE TABLE spellings (
+    id INTEGER PRIMARY KEY,
+    spelling TEXT NOT NULL,
+    key TEXT NOT NULL,
+    mcid INTEGER NOT NULL,
+    kind INTEGER NOT NULL
+);
+CREATE INDEX spellings_spelling ON spellings(spelling, kind);
+CREATE INDEX spellings_key ON spellings(key);
+CREATE INDEX spellings_mcid ON spellings(mcid);
+CREATE VIRTUAL TABLE spellings_fts USING fts5(
+    spelling, key, content='spellings', content_rowid='id', tokenize='unicode61 remove_diacritics 2');
+CREATE VIRTUAL TABLE spellings_trigram USING fts5(
+    spelling, key, content='spellings', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER spellings_ai AFTER INSERT ON spellings BEGIN
+    INSERT INTO spellings_fts(rowid, spelling, key) VALUES (new.id, new.spelling, new.key);
+    INSERT INTO spellings_trigram(rowid, spelling, key) VALUES (new.id, new.spelling, new.key);
+END;
+CREATE TRIGGER spellings_ad AFTER DELETE ON spellings BEGIN
+    INSERT INTO spellings_fts(spellings_fts, rowid, spelling, key) VALUES ('delete', old.id, old.spelling, old.key);
+    INSERT INTO spellings_trigram(spellings_trigram, rowid, spelling, key) VALUES ('delete', old.id, old.spelling, old.key);
+END;
+"""
+
+_PARTICLE_COLUMNS = ('mcid', 'position', 'name', 'category', 'digest', 'record') + tuple(PROPERTY_COLUMNS)
+_INSERT_PARTICLE = (f"INSERT OR REPLACE INTO particles ({', '.join(_PARTICLE_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(_PARTICLE_COLUMNS))})")
+
+
+def record_digest(blob: bytes) -> str:
+    return hashlib.sha1(blob).hexdigest()
+
+
+def _sql_value(column: str, value: Any) -> Any:
+    """NaN 与未知标识（-1）写为 NULL"""
+    if column in FLAG_COLUMNS:
+        return None if value < 0 else int(value)
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def _spelling_rows(item: Dict) -> List[tuple]:
+    """一条记录的 (拼写, 归一化键, mcid, kind)，同一拼写只保留优先级最高的来源"""
+    best: Dict[str, int] = {}
+    for spelling, kind in iter_spellings(item):
+        if kind < best.get(spelling, KIND_TYPO + 1):
+            best[spelling] = kind
+    mcid = item.get('mcid', 0)
+    return [(spelling, normalize_key(spelling), mcid, kind) for spelling, kind in best.items()]
+
+
+def fts_query(text: str) -> str:
+    """
+    把用户输入转为安全的 FTS5 查询：每个空白分隔的词各自加引号（内部引号加倍），词之间为 AND；
+    以 * 结尾的词保留为前缀查询。pi+、K-、- 等带运算符字符的名称因此不会触发语法错误
+    """
+    terms = []
+    for token in (text or '').split():
+        prefix = token.endswith('*') and len(token) > 1
+        token = token[:-1] if prefix else token
+        terms.append('"' + token.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return " ".join(terms)
+
+
+def _read_meta(conn: sqlite3.Connection) -> Dict[str, str]:
+    try:
+        return dict(conn.execute("SELECT key, value FROM meta"))
+    except sqlite3.DatabaseError:
+        return {}
+
+
+# ---------------------------------------------------------------------- #
+# 导出
+# ---------------------------------------------------------------------- #
+def export_sqlite(db_path: str,
+                  data_file: str = DEFAULT_DATA_FILE,
+                  use_pdg: bool = True,
+                  full: bool = False) -> Dict:
+    """
+    导出（或增量更新）SQLite 数据库，返回统计。
+    文件不存在、格式版本或属性来源（是否使用 PDG）不同、或 full=True 时写入临时文件后原子替换；
+    否则在一个事务内只重写新增、变化与删除的记录
+    """
+    t0 = time.perf_counter()
+    index = SpellingIndex.from_json_file(data_file)
+    # mcid -> (position, record, blob)，重复 mcid 与拼写索引一样先到先得；position 为去重后的连续序号
+    records: Dict[int, tuple] = {}
+    for item in index.iter_records():
+        mcid = item.get('mcid', 0)
+        if mcid not in records:
+            records[mcid] = (len(records), item, json_codec.dumpb(item))
+
+    meta = {}
+    if os.path.exists(db_path) and not full:
+        conn = sqlite3.connect(db_path)
+        meta = _read_meta(conn)
+        conn.close()
+    incremental = (meta.get('format_version') == str(FORMAT_VERSION)
+                   and meta.get('pdg') == str(int(use_pdg)))
+
+    target = db_path if incremental else f"{db_path}.tmp"
+    if not incremental and os.path.exists(target):
+        os.remove(target)
+    conn = sqlite3.connect(target)
+    try:
+        if not incremental:
+            conn.executescript(SCHEMA)
+        stats = _sync(conn, records, use_pdg)
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            ('format_version', str(FORMAT_VERSION)),
+            ('source', os.path.abspath(data_file)),
+            ('pdg', str(int(use_pdg))),
+            ('records', str(len(records))),
+            ('updated_at', time.strftime("%Y-%m-%dT%H:%M:%S")),
+        ])
+        conn.commit()
+        if stats['added'] + stats['changed'] + stats['removed']:
+            conn.execute("INSERT INTO spellings_fts(spellings_fts) VALUES ('optimize')")
+            conn.execute("INSERT INTO spellings_trigram(spellings_trigram) VALUES ('optimize')")
+            conn.commit()
+    finally:
+        conn.close()
+    if not incremental:
+        os.replace(target, db_path)
+
+    stats.update({"mode": "incremental" if incremental else "full", "records": len(records),
+                  "seconds": round(time.perf_counter() - t0, 3)})
+    return stats
+
+
+def _sync(conn: sqlite3.Connection, records: Dict[int, tuple], use_pdg: bool) -> Dict:
+    """在当前事务内把数据库同步到 records"""
+    existing = {mcid: (position, digest)
+                for mcid, position, digest in conn.execute("SELECT mcid, position, digest FROM particles")}
+    removed = [mcid for mcid in existing if mcid not in records]
+    upserts, moved = [], []
+    for mcid, (position, item, blob) in records.items():
+        digest = record_digest(blob)
+        old = existing.get(mcid)
+        if old is None or old[1] != digest:
+            upserts.append((mcid, position, item, blob, digest))
+        elif old[0] != position:
+            moved.append((position, mcid))
+
+    stale = removed + [mcid for mcid, *_ in upserts if mcid in existing]
+    conn.executemany("DELETE FROM spellings WHERE mcid = ?", [(mcid,) for mcid in stale])
+    conn.executemany("DELETE FROM particles WHERE mcid = ?", [(mcid,) for mcid in removed])
+    conn.executemany("UPDATE particles SET position = ? WHERE mcid = ?", moved)
+
+    api = None
+    if use_pdg and upserts:
+        import pdg
+        api = pdg.connect()
+    particle_rows, spelling_rows = [], []
+    for mcid, position, item, blob, digest in upserts:
+        properties = resolve_properties(item, api)
+        particle_rows.append((mcid, position, item.get('name') or str(mcid), category_of(mcid), digest,
+                              blob.decode('utf-8'))
+                             + tuple(_sql_value(c, properties[c]) for c in PROPERTY_COLUMNS))
+        spelling_rows.extend(_spelling_rows(item))
+    conn.executemany(_INSERT_PARTICLE, particle_rows)
+    conn.executemany("INSERT INTO spellings (spelling, key, mcid, kind) VALUES (?, ?, ?, ?)", spelling_rows)
+
+    n_changed = sum(1 for mcid, *_ in upserts if mcid in existing)
+    return {"added": len(upserts) - n_changed, "changed": n_changed, "removed": len(removed),
+            "moved": len(moved), "unchanged": len(records) - len(upserts),
+            "spellings_written": len(spelling_rows)}
+
+
+# ---------------------------------------------------------------------- #
+# 查询
+# ---------------------------------------------------------------------- #
+class SpellingDatabase:
+    """只读打开导出的数据库；find_record / lookup_all / get_record / iter_records 与 SpellingIndex 语义一致"""
+
+    def __init__(self, db_path: str):
+        self.path = str(db_path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        meta = dict(self._query("SELECT key, value FROM meta"))
+        if meta.get('format_version') != str(FORMAT_VERSION):
+            raise ValueError(f"Unsupported spelling database version in {db_path}: {meta.get('format_version')}")
+        self.meta = meta
+        self.n_records = self._query("SELECT count(*) FROM particles")[0][0]
+        self.n_entries = self._query("SELECT count(*) FROM spellings")[0][0]
+
+    @classmethod
+    def open(cls, db_path: str) -> "SpellingDatabase":
+        return cls(db_path)
+
+    def _connection(self) -> sqlite3.Connection:
+        # 连接不跨 fork 复用：子进程首次查询时重新打开
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True,
+                                         check_same_thread=False)
+            self._pid = os.getpid()
+        return self._conn
+
+    def _query(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __len__(self) -> int:
+        return self.n_records
+
+    def get_record(self, idx: int) -> Dict:
+        rows = self._query("SELECT record FROM particles WHERE position = ?", (idx,))
+        if not rows:
+            raise IndexError(idx)
+        return json_codec.loads(rows[0][0])
+
+    def iter_records(self) -> Iterator[Dict]:
+        for (record,) in self._query("SELECT record FROM particles ORDER BY position"):
+            yield json_codec.loads(record)
+
+    def lookup_all(self, name: str) -> List[tuple]:
+        """返回拼写对应的全部 (记录序号, kind)，按优先级排序"""
+        if not name:
+            return []
+        return self._query(
+            "SELECT p.position, s.kind FROM spellings s JOIN particles p ON p.mcid = s.mcid "
+            "WHERE s.spelling = ? ORDER BY s.kind = ?, p.position", (name, KIND_TYPO))
+
+    def lookup(self, name: str, kinds: Sequence[int] = MATCH_KINDS) -> int:
+        for idx, kind in self.lookup_all(name):
+            if kind in kinds:
+                return idx
+        return -1
+
+    def find_record(self, name: str, kinds: Sequence[int] = MATCH_KINDS) -> Dict:
+        idx = self.lookup(name, kinds)
+        return self.get_record(idx) if idx >= 0 else {}
+
+    def properties(self, mcid: int) -> Dict:
+        """带索引的属性列（未知为 None）"""
+        columns = ('mcid', 'name', 'category') + tuple(PROPERTY_COLUMNS)
+        rows = self._query(f"SELECT {', '.join(columns)} FROM particles WHERE mcid = ?", (mcid,))
+        return dict(zip(columns, rows[0])) if rows else {}
+
+    def search(self, text: str, mode: str = "fts", limit: int = 10, include_typos: bool = True) -> List[Dict]:
+        """
+        检索拼写，每个粒子一条：fts 为分词全文检索（各词都需出现，词尾 * 为前缀，见 fts_query），trigram 为不区分大小写的子串匹配（至少 3 个字符），
+        prefix 为归一化键的前缀匹配（与自动补全一致）
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode `{mode}`, available: {SEARCH_MODES}")
+        limit = max(0, min(int(limit), MAX_LIMIT))
+        max_kind = KIND_TYPO if include_typos else KIND_TYPO - 1
+        if mode == "prefix":
+            key = normalize_key(text or '')
+            if not key:
+                return []
+            sql = ("SELECT s.mcid, p.name, s.spelling, s.kind FROM spellings s JOIN particles p ON p.mcid = s.mcid "
+                   "WHERE s.key >= ? AND s.key < ? AND s.kind <= ? "
+                   "ORDER BY s.kind, s.key != ?, length(s.key), p.position")
+            params = (key, key + '\U0010ffff', max_kind, key)
+        else:
+            table = "spellings_fts" if mode == "fts" else "spellings_trigram"
+            query = fts_query(text) if mode == "fts" else '"' + (text or '').replace('"', '""') + '"'
+            if not query.strip('"* '):
+                return []
+            sql = (f"SELECT s.mcid, p.name, s.spelling, s.kind FROM {table} f "
+                   f"JOIN spellings s ON s.id = f.rowid JOIN particles p ON p.mcid = s.mcid "
+                   f"WHERE {table} MATCH ? AND s.kind <= ? ORDER BY s.kind, f.rank, p.position")
+            params = (query, max_kind)
+        results, seen = [], set()
+        for mcid, name, spelling, kind in self._query(sql, params):
+            if mcid in seen:
+                continue
+            seen.add(mcid)
+            results.append({"mcid": mcid, "name": name, "match": spelling, "kind": KIND_LABELS[kind]})
+            if len(results) >= limit:
+                break
+        return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the spelling dataset to a SQLite database with FTS5 tables")
+    parser.add_argument('db_path', help='SQLite database to create or update incrementally')
+    parser.add_argument('--data-file', default=DEFAULT_DATA_FILE, help='Dataset file or sharded directory')
+    parser.add_argument('--no-pdg', action='store_true', help='Only export local properties, no PDG access')
+    parser.add_argument('--full', action='store_true', help='Rebuild the database from scratch')
+    args = parser.parse_args()
+
+    stats = export_sqlite(args.db_path, data_file=args.data_file, use_pdg=not args.no_pdg, full=args.full)
+    print(f"Exported {args.db_path} ({stats['mode']}): {stats['records']} records, {stats['added']} added, "
+          f"{stats['changed']} changed, {stats['removed']} removed, {stats['unchanged']} unchanged "
+          f"in {stats['seconds']} s")
+
+    db = SpellingDatabase(args.db_path)
+    for name, mode in (("π+", "exact"), ("lambda", "fts"), ("psi", "trigram"), ("lamb", "prefix")):
+        t0 = time.perf_counter()
+        result = db.find_record(name).get('name') if mode == "exact" else \
+            [r['name'] for r in db.search(name, mode=mode, limit=5)]
+        t1 = time.perf_counter()
+        print(f"{mode:>8} {name!r:>8} ({(t1 - t0) * 1e6:.0f} us): {result}")
@@ -0,0 +1,251 @@
+"""
+反粒子推导
+数据集中粒子与反粒子记录大多只差可预测的变换（电荷符号翻转、anti-/bar 前后缀、LaTeX \\bar{}、
+HTML/Unicode 上划线），紧凑格式只存储 mcid > 0 的一条记录，外加其共轭记录中无法推导的例外项：
+
+    {"name": "pi+", "mcid": 211, ..., "conjugate": {"style": "charge", "aliases": {"add": [...], "drop": [...]}}}
+
+构建索引时再按规则推导出共轭记录，正负 mcid 都能解析。展开后记录顺序与名称字段和原数据完全一致，
+aliases/typo 的多重集合一致（顺序为推导项在前、补充项在后）。
+"""
+
+import re
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.utils import json_codec
+
+NAME_FIELDS = ['name', 'programmatic_name', 'latex_name', 'evtgen_name', 'html_name', 'unicode_name']
+LIST_FIELDS = ['aliases', 'typo']
+CONJUGATE_KEY = "conjugate"
+
+# 共轭方式: charge 只翻转电荷（轻子、带电介子），bar 加 bar 标记（重子、中性介子），
+# anti 加 anti- 前缀（双夸克、奇异态等）
+STYLES = ("charge", "bar", "anti")
+
+_CHARGE_SWAP = str.maketrans({'+': '-', '-': '+', '⁺': '⁻', '⁻': '⁺', '−': '+'})
+_WORD_SWAP_RE = re.compile(r'(plus|minus|Plus|Minus|PLUS|MINUS)')
+_WORD_SWAP = {'plus': 'minus', 'minus': 'plus', 'Plus': 'Minus', 'Minus': 'Plus',
+              'PLUS': 'MINUS', 'MINUS': 'PLUS'}
+_LEADING_WORD_RE = re.compile(r'^[A-Za-z]+')
+_LATEX_SYMBOL_RE = re.compile(r'^(\$?)(\\[A-Za-z]+|[A-Za-z])')
+_HTML_SYMBOL_RE = re.compile(r'^(&#x?[0-9a-fA-F]+;|[A-Za-z])')
+_COMBINING_OVERLINE = '̄'
+_HTML_OVERLINE = '&#773;'
+
+
+def flip_charge(text: str) -> str:
+    """翻转电荷符号与 plus/minus 单词"""
+    text = text.translate(_CHARGE_SWAP)
+    return _WORD_SWAP_RE.sub(lambda m: _WORD_SWAP[m.group(1)], text)
+
+
+def _bar_latex(text: str) -> str:
+    return _LATEX_SYMBOL_RE.sub(lambda m: f"{m.group(1)}\\bar{{{m.group(2)}}}", text, count=1)
+
+
+def _bar_html(text: str) -> str:
+    return _HTML_SYMBOL_RE.sub(lambda m: m.group(1) + _HTML_OVERLINE, text, count=1)
+
+
+def _bar_unicode(text: str) -> str:
+    return text[:1] + _COMBINING_OVERLINE + text[1:] if text else text
+
+
+def _bar_word(text: str) -> str:
+    return _LEADING_WORD_RE.sub(lambda m: m.group(0) + 'bar', text, count=1)
+
+
+def conjugate_spelling(text: str, field: str, style: str) -> str:
+    """按字段类型推导一个拼写的共轭形式"""
+    flipped = flip_charge(text)
+    if style == "charge":
+        return flipped
+    if field == 'latex_name':
+        return _bar_latex(flipped)
+    if field == 'html_name':
+        return _bar_html(flipped)
+    if field == 'unicode_name':
+        return _bar_unicode(flipped)
+    if field == 'evtgen_name':
+        return f"anti-{flipped}"
+    if field == 'programmatic_name':
+        return f"anti_{flipped}" if style == "anti" else f"{flipped}_bar"
+    if field == 'name':
+        return f"anti-{flipped}" if style == "anti" else _bar_word(flipped)
+    if style == "anti" and flipped[:1].isascii() and '\\' not in flipped:
+        return f"anti-{flipped}"
+    # aliases / typo 按拼写本身的写法选择
+    if '\\' in flipped or '$' in flipped:
+        return _bar_latex(flipped)
+    if flipped[:1].isascii():
+        return _bar_word(flipped)
+    return _bar_unicode(flipped)
+
+
+def derive_conjugate(record: Dict, style: str) -> Dict:
+    """仅按规则推导共轭记录（不含例外项）"""
+    derived = {}
+    for key, value in record.items():
+        if key == CONJUGATE_KEY:
+            continue
+        if key == 'mcid':
+            derived[key] = -value
+        elif key in NAME_FIELDS and isinstance(value, str):
+            derived[key] = conjugate_spelling(value, key, style)
+        elif key in LIST_FIELDS and isinstance(value, list):
+            derived[key] = [conjugate_spelling(v, key, style) for v in value]
+        else:
+            derived[key] = value
+    return derived
+
+
+def _list_exception(got: List[str], want: List[str]):
+    """列表字段的例外项：按多重集合计算补充/删除项，代价不低于完整列表时直接存完整列表"""
+    missing, extra = Counter(want) - Counter(got), Counter(got) - Counter(want)
+    add, drop = [], []
+    for v in want:
+        if missing[v]:
+            missing[v] -= 1
+            add.append(v)
+    for v in got:
+        if extra[v]:
+            extra[v] -= 1
+            drop.append(v)
+    if not add and not drop:
+        return None
+    if len(add) + len(drop) >= len(want):
+        return list(want)
+    return {k: v for k, v in (("add", add), ("drop", drop)) if v}
+
+
+def _exceptions(derived: Dict, actual: Dict, style: str) -> Dict:
+    """共轭记录相对推导结果的例外项"""
+    exceptions: Dict = {"style": style}
+    for key in actual:
+        if key == 'mcid':
+            continue
+        got, want = derived.get(key), actual[key]
+        if key in LIST_FIELDS and isinstance(got, list) and isinstance(want, list):
+            value = _list_exception(got, want)
+            if value is not None:
+                exceptions[key] = value
+        elif key not in derived or got != want:
+            exceptions[key] = want
+    removed = [key for key in derived if key not in actual]
+    if removed:
+        exceptions["remove"] = removed
+    return exceptions
+
+
+def _apply_exceptions(derived: Dict, exceptions: Dict) -> Dict:
+    record = dict(derived)
+    for key in exceptions.get("remove", []):
+        record.pop(key, None)
+    for key, value in exceptions.items():
+        if key in ("style", "remove", "first"):
+            continue
+        if key in LIST_FIELDS and isinstance(value, dict):
+            drop = Counter(value.get("drop", []))
+            kept = []
+            for v in record.get(key) or []:
+                if drop[v]:
+                    drop[v] -= 1
+                else:
+                    kept.append(v)
+            record[key] = kept + list(value.get("add", []))
+        else:
+            record[key] = value
+    return record
+
+
+def _exception_size(exceptions: Dict) -> int:
+    return len(json_codec.dumpb({k: v for k, v in exceptions.items() if k not in ("style", "first")}))
+
+
+def compact_records(records: Iterable[Dict]) -> List[Dict]:
+    """将完整记录压缩为紧凑格式：成对的正负 mcid 只保留正粒子记录与共轭例外项"""
+    records = list(records)
+    by_mcid = {item.get('mcid'): item for item in records}
+    position = {item.get('mcid'): i for i, item in enumerate(records)}
+    compact = []
+    for item in records:
+        mcid = item.get('mcid')
+        if isinstance(mcid, int) and mcid < 0 and -mcid in by_mcid:
+            continue
+        conjugate = by_mcid.get(-mcid) if isinstance(mcid, int) and mcid > 0 else None
+        if conjugate is None:
+            compact.append(item)
+            continue
+        candidates = [_exceptions(derive_conjugate(item, style), conjugate, style) for style in STYLES]
+        best = min(candidates, key=_exception_size)
+        if position[-mcid] < position[mcid]:
+            best["first"] = True  # 原数据中反粒子在前，展开时保持顺序
+        compact.append({**item, CONJUGATE_KEY: best})
+    return compact
+
+
+def expand_records(records: Iterable[Dict]) -> List[Dict]:
+    """展开紧凑格式，每条带共轭例外项的记录后紧跟推导出的反粒子记录；完整格式原样返回"""
+    expanded = []
+    for item in records:
+        exceptions = item.get(CONJUGATE_KEY)
+        if exceptions is None:
+            expanded.append(item)
+            continue
+        particle = {k: v for k, v in item.items() if k != CONJUGATE_KEY}
+        conjugate = _apply_exceptions(derive_conjugate(particle, exceptions.get("style", "charge")), exceptions)
+        expanded.extend([conjugate, particle] if exceptions.get("first") else [particle, conjugate])
+    return expanded
+
+
+def derive_antiparticle(record: Dict, reference: Optional[Dict] = None) -> Dict:
+    """
+    由粒子记录推导反粒子记录。reference 为反粒子的已知名称字段（如来自 PDG/particle 包），
+    用于选择最匹配的共轭方式，并覆盖推导出的名称字段。
+    """
+    def mismatches(derived: Dict) -> int:
+        return sum(1 for key in NAME_FIELDS if reference.get(key) and derived.get(key) != reference[key])
+
+    candidates = [derive_conjugate(record, style) for style in STYLES]
+    derived = min(candidates, key=mismatches) if reference else candidates[0]
+    for key in NAME_FIELDS:
+        if reference and reference.get(key):
+            derived[key] = reference[key]
+    return derived
+
+
+def is_compact(records: Iterable[Dict]) -> bool:
+    return any(isinstance(item, dict) and CONJUGATE_KEY in item for item in records)
+
+
+if __name__ == "__main__":
+    data_file = sys.argv[1] if len(sys.argv) > 1 else f"{here}/particle_variants.json"
+    records = json_codec.load_file(data_file)
+    compact = compact_records(records)
+    expanded = expand_records(compact)
+
+    def canonical(items: List[Dict]) -> List[Dict]:
+        return [{k: sorted(v) if k in LIST_FIELDS else v for k, v in item.items()} for item in items]
+
+    full_size = len(json_codec.dumpb(records, pretty=True))
+    compact_size = len(json_codec.dumpb(compact, pretty=True))
+    n_spellings = sum(len(item.get(f) or []) for item in records for f in LIST_FIELDS)
+    n_stored = sum(len(item.get(f) or []) for item in compact for f in LIST_FIELDS) + sum(
+        sum(len(v) for e in item[CONJUGATE_KEY].values() if isinstance(e, (list, dict))
+            for v in (e.values() if isinstance(e, dict) else [e]))
+        for item in compact if CONJUGATE_KEY in item)
+    print(f"Records: {len(records)} -> {len(compact)} stored, round trip "
+          f"{'OK' if canonical(expanded) == canonical(records) else 'MISMATCH'}")
+    print(f"Pretty JSON: {full_size / 1024:.0f} KiB -> {compact_size / 1024:.0f} KiB")
+    print(f"Alias/typo spellings: {n_spellings} -> {n_stored} stored")
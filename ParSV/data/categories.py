@@ -0,0 +1,121 @@
+"""
+粒子类别
+标准粒子按类别分组（夸克、轻子、各类介子与重子等），供生成器批量打包与数据集分片使用。
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Union
+
+OTHER_CATEGORY = "other"
+
+
+def get_standard_mcid_groups() -> Dict[str, List[int]]:
+    """获取按类别分组的标准粒子MCID（仅正粒子）"""
+    # Quarks (夸克)
+    quarks = [1, 2, 3, 4, 5, 6, 7, 8]  # d, u, s, c, b, t, b', t'
+
+    # Leptons (轻子)
+    leptons = [11, 12, 13, 14, 15, 16, 17, 18]  # e-, νe, µ-, νµ, τ-, ντ, τ'-, ντ'
+    
+    # Gauge and Higgs Bosons (规范玻色子和希格斯玻色子)
+    bosons = [21, 22, 23, 24, 25, 32, 33, 34, 35, 36, 37, 38, 39, 40]  # g, γ, Z0, W+, h0/H0, Z'/Z0, Z''/Z0, W'/W+, H0/H0, A0/H0, H+, H++, G (graviton), a0/H0
+
+    # Special Particles (特殊粒子)
+    special_particles = [41, 42, 51, 52, 53, 110, 990, 9990]  # R0, LQc, DM (S=0), DM (S=1/2), DM (S=1), reggeon, pomeron, odderon
+
+    # Diquarks (双夸克)
+    diquarks = [1103, 2101, 2103, 2203, 3101, 3103, 3201, 3203, 3303, 4101, 4103, 4201, 4203, 4301, 4303, 4403, 5101, 5103, 5201, 5203, 5301, 5303, 5401, 5403, 5503]
+
+    # SUSY Particles (超对称粒子)
+    susy_particles = [1000001, 1000002, 1000003, 1000004, 1000005, 1000006, 1000011, 1000012, 1000013, 1000014, 1000015, 1000016, 2000001, 2000002, 2000003, 2000004, 2000005, 2000006, 2000011, 2000013, 2000015, 1000021, 1000022, 1000023, 1000024, 1000025, 1000035, 1000037, 1000039]
+
+    # Light I=1 Mesons (轻I=1介子)
+    light_i1_mesons = [111, 211, 9000111, 9000211, 100111, 100211, 10111, 10211, 9010111, 9010211, 113, 213, 10113, 10213, 20113, 20213, 9000113, 9000213, 100113, 100213, 9010113, 9010213, 9020113, 9020213, 30113, 30213, 9030113, 9030213, 9040113, 9040213, 115, 215, 10115, 10215, 9000115, 9000215, 9010115, 9010215, 117, 217, 9000117, 9000217, 9010117, 9010217, 119, 219]
+
+    # Light I=0 Mesons (轻I=0介子)
+    light_i0_mesons = [221, 331, 9000221, 9010221, 100221, 10221, 9020221, 100331, 9030221, 10331, 9040221, 9050221, 9060221, 9070221, 9080221, 223, 333, 10223, 20223, 10333, 20333, 1000223, 9000223, 9010223, 30223, 100333, 225, 9000225, 335, 9010225, 9020225, 10225, 9030225, 10335, 9040225, 9050225, 9060225, 9070225, 9080225, 9090225, 227, 337, 229, 9000229, 9010229]
+
+    # Strange Mesons (奇异介子)
+    strange_mesons = [130, 310, 311, 321, 9000311, 9000321, 10311, 10321, 100311, 100321, 9010311, 9010321, 9020311, 9020321, 313, 323, 10313, 10323, 20313, 20323, 100313, 100323, 9000313, 9000323, 30313, 30323, 315, 325, 9000315, 9000325, 10315, 10325, 20315, 20325, 9010315, 9010325, 9020315, 9020325, 317, 327, 9010317, 9010327, 319, 329, 9000319, 9000329]
+
+    # Charmed Mesons (粲介子)
+    charmed_mesons = [411, 421, 10411, 10421, 413, 423, 10413, 10423, 20413, 20423, 415, 425, 431, 10431, 433, 10433, 20433, 435]
+
+    # Bottom Mesons (底介子)
+    bottom_mesons = [511, 521, 10511, 10521, 513, 523, 10513, 10523, 20513, 20523, 515, 525, 531, 10531, 533, 10533, 20533, 535, 541, 10541, 543, 10543, 20543, 545]
+
+    # cc Mesons (cc介子)
+    cc_mesons = [441, 10441, 100441, 443, 10443, 20443, 100443, 30443, 9000443, 9010443, 9020443, 445, 100445]
+
+    # bb Mesons (bb介子)
+    bb_mesons = [551, 10551, 100551, 110551, 200551, 210551, 553, 10553, 20553, 30553, 100553, 110553, 120553, 130553, 200553, 210553, 220553, 300553, 9000553, 9010553, 555, 10555, 20555, 100555, 110555, 120555, 200555, 557, 100557]
+
+    # Light Baryons (轻重子)
+    light_baryons = [2212, 2112, 2224, 2214, 2114, 1114]
+
+    # Strange Baryons (奇异重子)
+    strange_baryons = [3122, 3222, 3212, 3112, 3224, 3214, 3114, 3322, 3312, 3324, 3314, 3334]
+
+    # Charmed Baryons (粲重子)
+    charmed_baryons = [4122, 4222, 4212, 4112, 4224, 4214, 4114, 4232, 4132, 4322, 4312, 4324, 4314, 4332, 4334, 4412, 4422, 4414, 4424, 4432, 4434, 4444]
+
+    # Bottom Baryons (底重子)
+    bottom_baryons = [5122, 5112, 5212, 5222, 5114, 5214, 5224, 5132, 5232, 5312, 5322, 5314, 5324, 5332, 5334, 5142, 5242, 5412, 5422, 5414, 5424, 5342, 5432, 5434, 5442, 5444, 5512, 5522, 5514, 5524, 5532, 5534, 5542, 5544, 5554]
+
+    # Pentaquarks (五夸克态)
+    pentaquarks = [9221132, 9331122]
+    
+    return {
+        "quarks": quarks,
+        "leptons": leptons,
+        "bosons": bosons,
+        "special_particles": special_particles,
+        "diquarks": diquarks,
+        "susy_particles": susy_particles,
+        "light_i1_mesons": light_i1_mesons,
+        "light_i0_mesons": light_i0_mesons,
+        "strange_mesons": strange_mesons,
+        "charmed_mesons": charmed_mesons,
+        "bottom_mesons": bottom_mesons,
+        "cc_mesons": cc_mesons,
+        "bb_mesons": bb_mesons,
+        "light_baryons": light_baryons,
+        "strange_baryons": strange_baryons,
+        "charmed_baryons": charmed_baryons,
+        "bottom_baryons": bottom_baryons,
+        "pentaquarks": pentaquarks,
+    }
+
+
+@lru_cache(maxsize=1)
+def _category_map() -> Dict[int, str]:
+    mapping = {}
+    for category, pids in get_standard_mcid_groups().items():
+        for pid in pids:
+            mapping.setdefault(pid, category)
+    return mapping
+
+
+def category_of(mcid: int) -> str:
+    """粒子所属类别，反粒子与粒子同类，不在标准列表中的归入 other"""
+    try:
+        return _category_map().get(abs(int(mcid)), OTHER_CATEGORY)
+    except (TypeError, ValueError):
+        return OTHER_CATEGORY
+
+
+def get_categories() -> List[str]:
+    """全部类别名，按标准顺序，other 在最后"""
+    return list(get_standard_mcid_groups()) + [OTHER_CATEGORY]
+
+
+def parse_categories(spec: Union[str, Sequence[str], None]) -> Optional[List[str]]:
+    """解析类别选择（逗号分隔的字符串或列表），为空时返回 None 表示全部类别，未知类别抛出 ValueError"""
+    if not spec:
+        return None
+    names = [c.strip() for c in spec.split(',')] if isinstance(spec, str) else [str(c).strip() for c in spec]
+    names = [c for c in names if c]
+    unknown = [c for c in names if c not in get_categories()]
+    if unknown:
+        raise ValueError(f"Unknown categories {unknown}, available: {get_categories()}")
+    return names or None
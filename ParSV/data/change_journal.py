@@ -0,0 +1,198 @@
+"""
+数据集追加式变更日志
+小规模编辑按 mcid 追加到 <数据文件>.journal.jsonl（每行一条 put/delete 并 fsync），
+读取时在基础数据上按顺序重放；compact() 将日志合并回数据文件并清空日志。
+日志首行记录其基础数据文件的 sha1，数据文件被整体重写后旧日志即失效、不再重放，
+因此写入全量文件与清空日志之间崩溃不会用旧条目覆盖新数据；末尾写了一半的行会被忽略。
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.utils import json_codec
+from ParSV.data.antiparticle import compact_records, expand_records, is_compact
+from ParSV.data.categories import category_of
+from ParSV.utils.file_utils import atomic_write_json, atomic_write_text, fsync_dir
+
+JOURNAL_SUFFIX = ".journal.jsonl"
+
+
+def journal_path(data_file: str) -> str:
+    return f"{os.fspath(data_file)}{JOURNAL_SUFFIX}"
+
+
+def file_digest(file_path: str) -> Optional[str]:
+    """文件内容的 sha1，文件不存在时为 None"""
+    try:
+        with open(file_path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def dataset_signature(data_file: str) -> List:
+    """
+    数据文件与变更日志的 [mtime_ns, size]（不存在为 None），分片数据集以最后写入的 manifest 为准；
+    快照记录构建时的签名，用于判断数据文件此后是否被修改
+    """
+    from ParSV.data.shards import is_sharded, manifest_path
+    data_file = os.fspath(data_file)
+    paths = [manifest_path(data_file)] if is_sharded(data_file) else [data_file, journal_path(data_file)]
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append([st.st_mtime_ns, st.st_size])
+        except OSError:
+            signature.append(None)
+    return signature
+
+
+class ChangeJournal:
+    """单个数据文件的按 mcid 变更日志"""
+
+    def __init__(self, data_file: str, journal_file: Optional[str] = None):
+        self.data_file = os.fspath(data_file)
+        self.journal_file = journal_file or journal_path(self.data_file)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.journal_file) and os.path.getsize(self.journal_file) > 0
+
+    def _read_base(self) -> Optional[Dict]:
+        """日志首行的 base 条目，没有时（旧格式日志）为 None"""
+        with open(self.journal_file, "r", encoding="utf-8") as f:
+            try:
+                entry = json_codec.loads(f.readline())
+            except json.JSONDecodeError:
+                return None
+        return entry if isinstance(entry, dict) and entry.get("op") == "base" else None
+
+    def is_stale(self) -> bool:
+        """日志记录的基础文件已被整体重写（sha1 不一致），其条目不再适用"""
+        if not self.exists():
+            return False
+        base = self._read_base()
+        return base is not None and base.get("sha1") != file_digest(self.data_file)
+
+    # ------------------------------------------------------------------ #
+    # 写入
+    # ------------------------------------------------------------------ #
+    def _append(self, entries: Iterable[Dict]) -> int:
+        lines = [json_codec.dumps(entry) + "\n" for entry in entries]
+        if not lines:
+            return 0
+        n_lines = len(lines)
+        created = not os.path.exists(self.journal_file)
+        if not self.exists() or self.is_stale():
+            # 新日志（或已失效的旧日志）从 base 条目开始，记录当前数据文件的 sha1
+            base = {"op": "base", "sha1": file_digest(self.data_file), "ts": time.time()}
+            atomic_write_text(self.journal_file, json_codec.dumps(base) + "\n")
+        elif os.path.getsize(self.journal_file) > 0:
+            # 上次追加中途崩溃时末尾没有换行，新条目从新行开始，避免与残行粘连
+            with open(self.journal_file, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    lines.insert(0, "\n")
+        with open(self.journal_file, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        if created:
+            fsync_dir(os.path.dirname(os.path.abspath(self.journal_file)))
+        return n_lines
+
+    def put(self, records: Iterable[Dict]) -> int:
+        """追加新增或修改的记录（整条记录），返回写入条数"""
+        ts = time.time()
+        return self._append({"op": "put", "mcid": item["mcid"], "ts": ts, "record": item} for item in records)
+
+    def delete(self, mcids: Iterable[int]) -> int:
+        """追加删除操作，返回写入条数"""
+        ts = time.time()
+        return self._append({"op": "delete", "mcid": mcid, "ts": ts} for mcid in mcids)
+
+    def record_diff(self, old_data: List[Dict], new_data: List[Dict]) -> int:
+        """对比新旧数据集，仅把变化的 mcid 写入日志"""
+        old_map = {item.get("mcid"): item for item in old_data}
+        new_map = {item.get("mcid"): item for item in new_data}
+        changed = [item for mcid, item in new_map.items() if old_map.get(mcid) != item]
+        removed = [mcid for mcid in old_map if mcid not in new_map]
+        return self.put(changed) + self.delete(removed)
+
+    # ------------------------------------------------------------------ #
+    # 读取与合并
+    # ------------------------------------------------------------------ #
+    def iter_entries(self) -> Iterator[Dict]:
+        """按顺序读取日志条目，跳过崩溃时写了一半的行；日志已失效时没有条目"""
+        if not os.path.exists(self.journal_file) or self.is_stale():
+            return
+        with open(self.journal_file, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json_codec.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Skipping corrupt journal line {line_no} in {self.journal_file}")
+                    continue
+                if entry.get("op") in ("put", "delete") and "mcid" in entry:
+                    yield entry
+
+    def replay(self, records: List[Dict]) -> List[Dict]:
+        """在基础数据上重放日志，保持原有顺序，新增记录追加在末尾"""
+        merged = {item.get("mcid"): item for item in records}
+        for entry in self.iter_entries():
+            if entry["op"] == "put":
+                merged[entry["mcid"]] = entry["record"]
+            else:
+                merged.pop(entry["mcid"], None)
+        return list(merged.values())
+
+    def load(self) -> List[Dict]:
+        """读取基础数据文件（紧凑格式时展开反粒子）并重放日志"""
+        records = expand_records(json_codec.load_file(self.data_file))
+        return self.replay(records) if self.exists() else records
+
+    def compact(self, sort: bool = True) -> int:
+        """
+        将日志合并进数据文件（原子替换，保持原有的完整/紧凑格式）并清空日志，返回合并的条目数；
+        数据文件替换后日志即失效，清空前崩溃也不会再次重放
+        """
+        n_entries = sum(1 for _ in self.iter_entries())
+        if n_entries == 0:
+            return 0
+        compact = is_compact(json_codec.load_file(self.data_file))
+        records = self.load()
+        if sort:
+            records = sorted(records, key=lambda x: abs(x.get("mcid", 0)))
+        atomic_write_json(self.data_file, compact_records(records) if compact else records)
+        atomic_write_text(self.journal_file, "")
+        return n_entries
+
+
+def load_dataset(data_file: str, categories: Optional[List[str]] = None) -> List[Dict]:
+    """
+    读取数据文件，存在变更日志时一并重放；给定 categories 时只返回这些类别的记录（默认全部）。
+    data_file 为分片数据集目录时只加载所选类别的分片，单文件数据集读取后按类别过滤
+    """
+    from ParSV.data.shards import is_sharded, load_sharded_dataset
+    if is_sharded(data_file):
+        return load_sharded_dataset(data_file, categories)
+    records = ChangeJournal(data_file).load()
+    if categories is not None:
+        records = [item for item in records if category_of(item.get('mcid', 0)) in categories]
+    return records
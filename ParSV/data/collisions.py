@@ -0,0 +1,306 @@
+"""
+拼写冲突分析
+在展开反粒子后的记录上单遍建立 拼写 -> mcid 的哈希索引，找出：
+- 跨记录冲突：同一拼写属于多个粒子（名称/别名冲突时精确查找静默返回先出现的记录），
+- 近似冲突：拼写错误与另一粒子的名称/别名编辑距离不超过 max_distance（删除邻域哈希，不做两两比较），
+- 电荷符号不一致：同一记录的名称字段符号互相矛盾、别名/拼写错误带相反符号、或共轭记录的符号未翻转。
+总耗时与拼写条数成线性关系（每条拼写的删除邻域大小只取决于其长度与 max_distance）。
+报告可作为合并门禁：check_gate 只拒绝相对基线新增的错误，历史遗留问题不阻塞合并。
+"""
+
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.data.antiparticle import NAME_FIELDS, expand_records
+from ParSV.Usage.spelling_index import KIND_ALIAS, KIND_NAME, KIND_TYPO, MATCH_KINDS, iter_spellings
+
+KIND_LABELS = {KIND_NAME: "name", KIND_ALIAS: "alias", KIND_TYPO: "typo"}
+ERROR, WARNING = "error", "warning"
+
+DEFAULT_MAX_DISTANCE = 1
+# 更短的拼写（e、mu、K0 ...）之间编辑距离 1 几乎处处成立，不做近似冲突检查
+DEFAULT_MIN_LENGTH = 4
+
+_PLUS, _MINUS = frozenset('+⁺'), frozenset('-−⁻')
+_SIGN_WORDS = (("plus", 1), ("minus", -1))
+
+
+# ---------------------------------------------------------------------- #
+# 电荷符号
+# ---------------------------------------------------------------------- #
+def charge_sign(spelling: str) -> Optional[int]:
+    """
+    拼写中标注的电荷符号：+1 / -1，没有符号为 0，正负符号同时出现为 None。
+    后面紧跟字母或数字的 '-' 是连字符（anti-Xi、d-bar），不计为符号
+    """
+    signs = set()
+    for pos, char in enumerate(spelling):
+        if char in _PLUS or char in _MINUS:
+            following = spelling[pos + 1:pos + 2]
+            if char == '-' and following.isalnum():
+                continue
+            signs.add(1 if char in _PLUS else -1)
+    lower = spelling.lower()
+    for word, sign in _SIGN_WORDS:
+        if word in lower:
+            signs.add(sign)
+    if len(signs) > 1:
+        return None
+    return signs.pop() if signs else 0
+
+
+def _record_sign(item: Dict) -> Optional[int]:
+    """记录名称字段的一致符号；字段之间矛盾时为 None"""
+    signs = {charge_sign(item[f]) for f in NAME_FIELDS if isinstance(item.get(f), str) and item.get(f)}
+    signs.discard(0)
+    if len(signs) > 1 or None in signs:
+        return None
+    return signs.pop() if signs else 0
+
+
+def find_sign_inconsistencies(records: Sequence[Dict]) -> List[Dict]:
+    """名称字段符号矛盾、别名/拼写错误带相反符号、共轭记录符号未翻转"""
+    issues = []
+    signs: Dict[int, Optional[int]] = {}
+    for item in records:
+        mcid = item.get('mcid')
+        sign = _record_sign(item)
+        signs.setdefault(mcid, sign)
+        if sign is None:
+            issues.append({"type": "mixed_signs", "severity": ERROR, "mcid": mcid,
+                           "fields": {f: item[f] for f in NAME_FIELDS if item.get(f)}})
+            continue
+        if sign == 0:
+            continue
+        for field, kind in (('aliases', KIND_ALIAS), ('typo', KIND_TYPO)):
+            for spelling in item.get(field) or []:
+                if charge_sign(spelling) == -sign:
+                    issues.append({"type": "opposite_sign", "severity": ERROR if kind == KIND_ALIAS else WARNING,
+                                   "mcid": mcid, "field": field, "spelling": spelling})
+    for mcid, sign in signs.items():
+        if not isinstance(mcid, int) or mcid <= 0 or -mcid not in signs:
+            continue
+        conjugate = signs[-mcid]
+        if sign is not None and conjugate is not None and conjugate != -sign:
+            issues.append({"type": "conjugate_sign", "severity": ERROR, "mcid": mcid,
+                           "sign": sign, "conjugate_sign": conjugate})
+    return issues
+
+
+# ---------------------------------------------------------------------- #
+# 精确冲突
+# ---------------------------------------------------------------------- #
+def build_spelling_map(records: Sequence[Dict]) -> Dict[str, Dict[int, int]]:
+    """拼写 -> {mcid: 该记录中优先级最高的 kind}"""
+    spellings: Dict[str, Dict[int, int]] = defaultdict(dict)
+    for item in records:
+        mcid = item.get('mcid')
+        for spelling, kind in iter_spellings(item):
+            owners = spellings[spelling]
+            if kind < owners.get(mcid, KIND_TYPO + 1):
+                owners[mcid] = kind
+    return spellings
+
+
+def find_collisions(spellings: Dict[str, Dict[int, int]]) -> List[Dict]:
+    """
+    同一拼写属于多个粒子。两个以上名称/别名来源为 ambiguous（错误，精确查找只会返回其中之一）；
+    拼写错误与另一粒子的名称/别名相同为 typo_shadows_name（错误，该拼写错误永远无法解析到本粒子）；
+    多个粒子共享同一拼写错误为 shared_typo（警告）
+    """
+    collisions = []
+    for spelling, owners in spellings.items():
+        if len(owners) < 2:
+            continue
+        matching = [mcid for mcid, kind in owners.items() if kind in MATCH_KINDS]
+        if len(matching) > 1:
+            kind, severity = "ambiguous", ERROR
+        elif matching:
+            kind, severity = "typo_shadows_name", ERROR
+        else:
+            kind, severity = "shared_typo", WARNING
+        collisions.append({"type": kind, "severity": severity, "spelling": spelling,
+                           "owners": {mcid: KIND_LABELS[k] for mcid, k in owners.items()}})
+    return collisions
+
+
+# ---------------------------------------------------------------------- #
+# 近似冲突
+# ---------------------------------------------------------------------- #
+def _deletions(text: str, depth: int) -> set:
+    """删除至多 depth 个字符得到的全部字符串（含原串）"""
+    keys = {text}
+    frontier = {text}
+    for _ in range(depth):
+        frontier = {s[:i] + s[i + 1:] for s in frontier for i in range(len(s))}
+        keys |= frontier
+    return keys
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """限制长度差的 OSA 编辑距离（相邻换位计 1），超过 limit 时返回 limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+
+def find_near_collisions(spellings: Dict[str, Dict[int, int]],
+                         max_distance: int = DEFAULT_MAX_DISTANCE,
+                         min_length: int = DEFAULT_MIN_LENGTH,
+                         include_conjugates: bool = False) -> List[Dict]:
+    """
+    拼写错误与另一粒子的名称/别名只差 max_distance 次编辑（警告：用户的笔误可能本意是另一粒子）。
+    两者共享一个删除邻域键才比较，默认跳过粒子与其反粒子之间仅差电荷符号的成对拼写
+    """
+    if max_distance <= 0:
+        return []
+    # 删除邻域键 -> 拥有该键的名称/别名拼写
+    neighbourhood: Dict[str, List[str]] = defaultdict(list)
+    for spelling, owners in spellings.items():
+        if len(spelling) >= min_length and any(k in MATCH_KINDS for k in owners.values()):
+            for key in _deletions(spelling, max_distance):
+                neighbourhood[key].append(spelling)
+
+    found = {}
+    for typo, owners in spellings.items():
+        typo_owners = [mcid for mcid, kind in owners.items() if kind == KIND_TYPO]
+        if len(typo) < min_length or not typo_owners:
+            continue
+        candidates = set()
+        for key in _deletions(typo, max_distance):
+            candidates.update(neighbourhood.get(key, ()))
+        candidates.discard(typo)
+        for name in candidates:
+            distance = edit_distance(typo, name, max_distance)
+            if distance > max_distance:
+                continue
+            for typo_mcid in typo_owners:
+                for name_mcid, kind in spellings[name].items():
+                    if kind not in MATCH_KINDS or name_mcid in owners:
+                        continue
+                    if not include_conjugates and name_mcid == -typo_mcid:
+                        continue
+                    found[(typo, typo_mcid, name, name_mcid)] = {
+                        "type": "near_collision", "severity": WARNING, "typo": typo, "mcid": typo_mcid,
+                        "near": name, "near_mcid": name_mcid, "near_kind": KIND_LABELS[kind], "distance": distance}
+    return list(found.values())
+
+
+# ---------------------------------------------------------------------- #
+# 报告与门禁
+# ---------------------------------------------------------------------- #
+def analyze(records: Iterable[Dict],
+            max_distance: int = DEFAULT_MAX_DISTANCE,
+            min_length: int = DEFAULT_MIN_LENGTH,
+            include_conjugates: bool = False) -> Dict:
+    """对数据集（紧凑格式在此展开反粒子）做冲突分析，返回报告"""
+    records = expand_records(records)
+    spellings = build_spelling_map(records)
+    collisions = find_collisions(spellings)
+    near = find_near_collisions(spellings, max_distance, min_length, include_conjugates)
+    signs = find_sign_inconsistencies(records)
+    issues = collisions + near + signs
+    counts: Dict[str, int] = defaultdict(int)
+    for issue in issues:
+        counts[issue["type"]] += 1
+    return {
+        "spellings": len(spellings),
+        "collisions": collisions,
+        "near_collisions": near,
+        "sign_inconsistencies": signs,
+        "counts": dict(counts),
+        "errors": sum(1 for issue in issues if issue["severity"] == ERROR),
+        "warnings": sum(1 for issue in issues if issue["severity"] == WARNING),
+    }
+
+
+def issue_key(issue: Dict) -> tuple:
+    """问题的稳定标识，用于与基线报告对比"""
+    if issue["type"] in ("ambiguous", "typo_shadows_name", "shared_typo"):
+        return issue["type"], issue["spelling"], tuple(sorted(issue["owners"]))
+    if issue["type"] == "near_collision":
+        return issue["type"], issue["typo"], issue["mcid"], issue["near"], issue["near_mcid"]
+    return issue["type"], issue["mcid"], issue.get("spelling")
+
+
+def check_gate(report: Dict, baseline: Optional[Dict] = None, fail_on_warnings: bool = False) -> Dict:
+    """
+    合并门禁：报告中不在基线报告里的错误（fail_on_warnings 时含警告）视为新增问题，存在则不通过。
+    没有基线时所有错误都算新增
+    """
+    known = set()
+    if baseline is not None:
+        for section in ("collisions", "near_collisions", "sign_inconsistencies"):
+            known.update(issue_key(issue) for issue in baseline[section])
+    severities = (ERROR, WARNING) if fail_on_warnings else (ERROR,)
+    new = [issue for section in ("collisions", "near_collisions", "sign_inconsistencies")
+           for issue in report[section]
+           if issue["severity"] in severities and issue_key(issue) not in known]
+    return {"passed": not new, "new_issues": new}
+
+
+def format_issue(issue: Dict) -> str:
+    kind = issue["type"]
+    if "owners" in issue:
+        owners = ", ".join(f"{mcid} ({label})" for mcid, label in issue["owners"].items())
+        return f"[{issue['severity']}] {kind}: {issue['spelling']!r} -> {owners}"
+    if kind == "near_collision":
+        return (f"[{issue['severity']}] {kind}: typo {issue['typo']!r} of {issue['mcid']} is {issue['distance']} "
+                f"edit(s) from {issue['near_kind']} {issue['near']!r} of {issue['near_mcid']}")
+    if kind == "opposite_sign":
+        return f"[{issue['severity']}] {kind}: {issue['field']} {issue['spelling']!r} of {issue['mcid']}"
+    if kind == "conjugate_sign":
+        return (f"[{issue['severity']}] {kind}: {issue['mcid']} has sign {issue['sign']}, "
+                f"{-issue['mcid']} has sign {issue['conjugate_sign']}")
+    return f"[{issue['severity']}] {kind}: {issue['mcid']} {issue.get('fields')}"
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from ParSV.data.change_journal import load_dataset
+
+    parser = argparse.ArgumentParser(description="Spelling collision and ambiguity analysis")
+    parser.add_argument('data_file', nargs='?', default=f"{here}/particle_variants.json",
+                        help='Dataset file or sharded directory')
+    parser.add_argument('--baseline', help='Only report issues not present in this dataset (merge gate)')
+    parser.add_argument('--max-distance', type=int, default=DEFAULT_MAX_DISTANCE,
+                        help='Edit distance of near-collisions, 0 disables them')
+    parser.add_argument('--fail-on-warnings', action='store_true', help='New warnings also fail the gate')
+    parser.add_argument('--limit', type=int, default=20, help='Issues printed per section')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    report = analyze(load_dataset(args.data_file), max_distance=args.max_distance)
+    t1 = time.perf_counter()
+    print(f"{report['spellings']} spellings analysed in {(t1 - t0) * 1e3:.0f} ms: "
+          f"{report['errors']} errors, {report['warnings']} warnings {report['counts']}")
+    for section in ("collisions", "near_collisions", "sign_inconsistencies"):
+        for issue in report[section][:args.limit]:
+            print("  " + format_issue(issue))
+
+    baseline = analyze(load_dataset(args.baseline), max_distance=args.max_distance) if args.baseline else None
+    gate = check_gate(report, baseline, fail_on_warnings=args.fail_on_warnings)
+    print(f"Gate {'passed' if gate['passed'] else 'failed'}: {len(gate['new_issues'])} new issues")
+    sys.exit(0 if gate["passed"] else 1)
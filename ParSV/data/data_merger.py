@@ -3,7 +3,7 @@
 合并新旧拼写变体数据并按mcid绝对值排序
 """
 
-import json, sys
+import json, os, sys
 from typing import Dict, List, Any
 from pathlib import Path
 here = Path(__file__).parent.resolve()
@@ -14,32 +14,57 @@ except ImportError:
     sys.path.append(str(here.parent.parent))
     from ParSV import __version__
 
+from ParSV.utils.file_utils import atomic_write_json, atomic_write_text
+from ParSV.data.change_journal import ChangeJournal, load_dataset
+from ParSV.data.shards import ShardedDataset, is_sharded, split_records
+from ParSV.data.antiparticle import compact_records
+from ParSV.data.collisions import analyze, check_gate, format_issue
+
 class ParticleDataMerger:
     def __init__(self):
         pass
     
     def load_json(self, file_path: str) -> List[Dict]:
-        """加载JSON文件"""
+        """加载JSON文件（或分片数据集目录），存在变更日志时一并重放；文件不存在时返回空列表，解析失败时抛出异常"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return load_dataset(file_path)
         except FileNotFoundError:
             print(f"文件未找到: {file_path}")
             return []
         except json.JSONDecodeError as e:
+            # 损坏的文件不能当作空数据，否则合并结果会覆盖原有数据
             print(f"JSON解析错误 {file_path}: {e}")
-            return []
+            raise
     
-    def save_json(self, file_path: str, data: List[Dict]) -> bool:
-        """保存JSON文件"""
+    def save_json(self, file_path: str, data: List[Dict], compact: bool = False) -> bool:
+        """
+        原子保存JSON文件（临时文件 + fsync + rename），并清空已合并进全量文件的变更日志
+        （文件替换后旧日志即已失效，清空前崩溃不会重放旧条目）。
+        compact=True 时反粒子只保存相对推导结果的例外项
+        """
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            atomic_write_json(file_path, compact_records(data) if compact else data)
+            journal = ChangeJournal(file_path)
+            if journal.exists():
+                atomic_write_text(journal.journal_file, "")
             return True
         except Exception as e:
             print(f"保存失败 {file_path}: {e}")
             return False
     
+    def save_changes(self, file_path: str, data: List[Dict]) -> bool:
+        """仅将与现有文件相比变化的记录追加到变更日志；文件不存在时写入全量文件"""
+        if not os.path.exists(file_path):
+            return self.save_json(file_path, data)
+        try:
+            journal = ChangeJournal(file_path)
+            n = journal.record_diff(journal.load(), data)
+            print(f"追加 {n} 条变更到 {journal.journal_file}")
+            return True
+        except Exception as e:
+            print(f"写入变更日志失败 {file_path}: {e}")
+            return False
+    
     def _is_duplicate_value(self, value: str, item_data: Dict) -> bool:
         """检查值是否在其他字段中已存在"""
         main_fields = ['name', 'programmatic_name', 'latex_name', 
@@ -122,8 +147,61 @@ class ParticleDataMerger:
         result = list(merged_map.values())
         return sorted(result, key=lambda x: abs(x.get('mcid', 0)))
     
-    def merge_files(self, old_file: str, new_file: str, output_file: str) -> bool:
-        """Merge two JSON files"""
+    def _shard_source(self, path: str):
+        """返回 (类别列表, 按类别读取记录的函数, 释放分片的函数)，单文件数据集整体读取后拆分"""
+        if is_sharded(path):
+            dataset = ShardedDataset(path)
+            categories = dataset.categories
+            return categories, lambda category: dataset.load_shard(category) if category in categories else [], dataset.release
+        shards = split_records(self.load_json(path))
+        return list(shards), lambda category: shards.get(category, []), lambda category: shards.pop(category, None)
+    
+    def merge_shards(self, old_file: str, new_file: str, output_dir: str, journal: bool = False,
+                     compact: bool = False) -> bool:
+        """逐个类别分片合并，输入可以是单文件或分片目录，同一时刻只持有一个类别的旧数据"""
+        old_categories, load_old, release_old = self._shard_source(old_file)
+        new_categories, load_new, release_new = self._shard_source(new_file)
+        try:
+            if is_sharded(output_dir):
+                output = ShardedDataset(output_dir)
+                output.manifest["compact"] = compact or output.manifest.get("compact", False)
+            else:
+                output = ShardedDataset.create(output_dir, [], compact=compact)
+            
+            total = 0
+            for category in dict.fromkeys(old_categories + new_categories):
+                old_data, new_data = load_old(category), load_new(category)
+                merged_data = self.merge_datasets(old_data, new_data)
+                if category in new_categories or os.path.abspath(output_dir) != os.path.abspath(old_file):
+                    output.save_shard(category, merged_data, journal=journal)
+                print(f"  {category}: {len(old_data)} + {len(new_data)} -> {len(merged_data)} records")
+                total += len(merged_data)
+                release_old(category)
+                release_new(category)
+            print(f"Merge completed! Total {total} records in {len(output.categories)} shards")
+            return True
+        except Exception as e:
+            print(f"分片合并失败 {output_dir}: {e}")
+            return False
+    
+    def merge_files(self, old_file: str, new_file: str, output_file: str, journal: bool = False,
+                    compact: bool = False, sharded: bool = False, gate: bool = False) -> bool:
+        """
+        Merge two JSON files, with journal=True only changed records are appended to the output's journal.
+        The output is written as a category-sharded directory when `sharded` is set, or when the old
+        data or the output is already sharded, and the merge then runs shard by shard.
+        With gate=True the merged data is not saved if it introduces spelling collisions or sign
+        errors absent from the old data. Shard merges hold one category at a time and cannot check
+        cross-category collisions, so gate=True refuses them
+        """
+        if sharded or is_sharded(old_file) or is_sharded(output_file):
+            if gate:
+                print("Merge gate is not supported for shard by shard merges, nothing written; "
+                      "merge into a single file or run `python -m ParSV.data.collisions` on the output")
+                return False
+            print(f"Merging shard by shard: {old_file} + {new_file} -> {output_file}")
+            return self.merge_shards(old_file, new_file, output_file, journal=journal, compact=compact)
+        
         print(f"Loading old data: {old_file}")
         old_data = self.load_json(old_file)
       
@@ -132,9 +210,20 @@ class ParticleDataMerger:
       
         print(f"Merging data...")
         merged_data = self.merge_datasets(old_data, new_data)
+        
+        if gate:
+            result = check_gate(analyze(merged_data), baseline=analyze(old_data))
+            if not result["passed"]:
+                print(f"Merge gate failed: {len(result['new_issues'])} new issues, {output_file} not written")
+                for issue in result["new_issues"]:
+                    print("  " + format_issue(issue))
+                return False
       
         print(f"Saving merged result: {output_file}")
-        success = self.save_json(output_file, merged_data)
+        if journal:
+            success = self.save_changes(output_file, merged_data)
+        else:
+            success = self.save_json(output_file, merged_data, compact=compact)
       
         if success:
             print(f"Merge completed! Total {len(merged_data)} records")
@@ -142,8 +231,9 @@ class ParticleDataMerger:
       
         return success
     
-    def validate_data(self, data: List[Dict]) -> Dict[str, Any]:
-        """验证数据质量"""
+    def validate_data(self, data: List[Dict], collisions: bool = True,
+                      max_distance: int = 1) -> Dict[str, Any]:
+        """验证数据质量；collisions=True 时附带跨记录拼写冲突、近似冲突与电荷符号分析（见 collisions.analyze）"""
         stats = {
             'total_count': len(data),
             'valid_mcid_count': 0,
@@ -171,6 +261,9 @@ class ParticleDataMerger:
             if not item.get('typo'):
                 stats['empty_typo_count'] += 1
         
+        if collisions:
+            stats['collisions'] = analyze(data, max_distance=max_distance)
+        
         return stats
 
 
@@ -188,5 +281,7 @@ if __name__ == "__main__":
         stats = merger.validate_data(merged_data)
         
         print("\n数据质量统计:")
+        report = stats.pop('collisions')
         for key, value in stats.items():
-            print(f"  {key}: {value}")
\ No newline at end of file
+            print(f"  {key}: {value}")
+        print(f"  collisions: {report['errors']} errors, {report['warnings']} warnings {report['counts']}")
\ No newline at end of file
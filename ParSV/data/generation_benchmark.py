@@ -0,0 +1,126 @@
+"""
+生成吞吐基准
+对本地 LLM 替身服务运行 ParticleVariantGenerator，按批大小、并发数、流水线 LLM 线程数与重试次数的组合
+统计每秒生成的粒子数、LLM 调用/失败/回退次数，以及替身服务返回的 429、500 与格式错误数，
+用于在消耗真实额度之前离线调优批量与并发。
+
+    python -m ParSV.data.generation_benchmark --count 64 --batch-sizes 1 8 --concurrency 1 4 \\
+        --latency lognormal:-1,0.3 --rate-limit 8 --max-retries 0 3
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.utils import atomic_write_json
+from ParSV.data.generator import ParticleVariantGenerator, get_standard_mcids, make_mcid_batches
+from ParSV.data.llm_stand_in import StandInServer, add_config_arguments, config_from_args, StandInConfig
+
+STAT_KEYS = ("llm_calls", "llm_errors", "fallbacks", "derived", "prompt_chars")
+
+
+def _partition(mcid_list: List[int], concurrency: int, batch_size: int) -> List[List[int]]:
+    """按批次轮流分配给各个并发生成器，同一批次（粒子与反粒子）不拆开"""
+    parts: List[List[int]] = [[] for _ in range(max(1, concurrency))]
+    for i, batch in enumerate(make_mcid_batches(mcid_list, max(1, batch_size))):
+        parts[i % len(parts)].extend(batch)
+    return [part for part in parts if part]
+
+
+def run_case(mcid_list: List[int], stand_in: StandInConfig, batch_size: int, concurrency: int,
+             max_retries: int, stream: bool = False, derive_antiparticles: bool = False,
+             verbose: bool = False, llm_workers: int = 1) -> Dict:
+    """启动一个新的替身服务并完成一轮生成，返回统计"""
+    with StandInServer(stand_in) as server:
+        generators = [ParticleVariantGenerator(use_llm=True, stream=stream,
+                                               derive_antiparticles=derive_antiparticles,
+                                               api_url=server.api_url, api_key="stand-in",
+                                               max_retries=max_retries, llm_workers=llm_workers)
+                      for _ in range(concurrency)]
+        parts = _partition(mcid_list, concurrency, batch_size)
+        out = sys.stdout if verbose else io.StringIO()
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(out), ThreadPoolExecutor(max_workers=len(parts)) as pool:
+            futures = [pool.submit(gen.batch_generate, part, batch_size) for gen, part in zip(generators, parts)]
+            results = [record for future in futures for record in future.result()]
+        elapsed = time.perf_counter() - t0
+        server_stats = server.stats.to_dict()
+
+    stats = {key: sum(gen.stats.get(key, 0) for gen in generators) for key in STAT_KEYS}
+    repaired = sum(len(gen.repairs) for gen in generators)
+    # 替身服务给出的别名都以 "_alt" 结尾，据此判断 LLM 结果是否进入了最终记录
+    with_llm = sum(1 for r in results if any(str(a).endswith("_alt") for a in r.get("aliases") or []))
+    return {
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "llm_workers": llm_workers,
+        "max_retries": max_retries,
+        "particles": len(results),
+        "elapsed_s": elapsed,
+        "particles_per_s": len(results) / elapsed if elapsed > 0 else 0.0,
+        "llm_coverage": with_llm / len(results) if results else 0.0,
+        "repaired": repaired,
+        "errors": sum(1 for r in results if "error" in r),
+        **stats,
+        "server": server_stats,
+        "pipeline": generators[0].pipeline_stats,
+    }
+
+
+def print_report(rows: List[Dict]):
+    print(f"{'batch':>5} {'conc':>4} {'llm':>4} {'retry':>5} {'particles/s':>11} {'coverage':>8} {'calls':>6} "
+          f"{'failed':>6} {'fallback':>8} {'repaired':>8} {'429':>5} {'500':>5} {'bad':>5}")
+    for r in rows:
+        s = r["server"]
+        print(f"{r['batch_size']:>5} {r['concurrency']:>4} {r['llm_workers']:>4} {r['max_retries']:>5} "
+              f"{r['particles_per_s']:>11.2f} {r['llm_coverage']:>8.1%} {r['llm_calls']:>6} {r['llm_errors']:>6} {r['fallbacks']:>8} "
+              f"{r['repaired']:>8} {s['rate_limited']:>5} {s['errors']:>5} {s['malformed']:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generation throughput benchmark against a stand-in LLM")
+    parser.add_argument('--mcids', nargs='+', type=int, help='Particles to generate (standard list by default)')
+    parser.add_argument('--count', type=int, default=64, help='Use the first N standard mcids')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8], help='Batch sizes to compare')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1], help='Concurrent generators to compare')
+    parser.add_argument('--llm-workers', nargs='+', type=int, default=[1],
+                        help='Concurrent LLM calls within each generator pipeline to compare')
+    parser.add_argument('--max-retries', nargs='+', type=int, default=[0],
+                        help='Client retries on 429/5xx to compare')
+    parser.add_argument('--stream', action='store_true', help='Stream LLM responses')
+    parser.add_argument('--derive-antiparticles', action='store_true', help='Derive antiparticles by rule')
+    parser.add_argument('--verbose', action='store_true', help='Show the generator output')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    mcid_list = args.mcids or get_standard_mcids()[:args.count]
+    stand_in = config_from_args(args)
+    rows = []
+    for batch_size, concurrency, llm_workers, max_retries in itertools.product(
+            args.batch_sizes, args.concurrency, args.llm_workers, args.max_retries):
+        rows.append(run_case(mcid_list, stand_in, batch_size, concurrency, max_retries, stream=args.stream,
+                             derive_antiparticles=args.derive_antiparticles, verbose=args.verbose,
+                             llm_workers=llm_workers))
+    print_report(rows)
+    if args.output:
+        atomic_write_json(args.output, {"stand_in": stand_in.__dict__, "results": rows})
+        print(f"Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
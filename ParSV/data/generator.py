@@ -6,6 +6,8 @@
 import json
 import os
 import sys
+import threading
+from dataclasses import dataclass, field
 from typing import Dict, List, Optional
 
 import pdg
@@ -21,58 +23,186 @@ except ImportError:
     sys.path.append(str(here.parent.parent))
     from ParSV import __version__
     
-from ParSV.utils import safe_json_loads, normalize_particle_name
+from ParSV.utils import normalize_particle_name, IncrementalJSONParser, atomic_write_json
+from ParSV.data.variant_rules import RuleBasedVariantEngine, NAME_FIELDS, build_catalogue, owned_by_other
+from ParSV.data.antiparticle import derive_antiparticle
+from ParSV.data.change_journal import load_dataset
+from ParSV.data.categories import get_standard_mcid_groups, get_categories, category_of
+from ParSV.data.shards import ShardedDataset, is_sharded
+from ParSV.data.pipeline import DEFAULT_QUEUE_SIZE, Pipeline, StageSpec, format_report
+
+DEFAULT_LLM_URL = "https://aiapi.ihep.ac.cn/apiv2"
+DEFAULT_LLM_MODEL = "openai/gpt-4o-mini"
+LLM_URL_ENV = "PARSV_LLM_API_URL"
+
+# 所有LLM调用共用的系统指令，单粒子与批量模式仅在用户消息中携带粒子数据
+LLM_INSTRUCTIONS = """你是粒子物理命名专家，基于给定粒子信息补充拼写变体：
+1. aliases: 仅补充规则无法生成的别名，如俗称、英文全称、其他符号体系
+2. typo: 仅补充规则无法生成的常见拼写错误，如符号位置错误、漏写下标
+3. 补全空字段的合适值
+4. 每个列表0-4个新条目，避免重复
+5. 只输出可解析的JSON，不要输出其他内容"""
+
+LLM_ITEM_FORMAT = (
+    '{"programmatic_name": "值或null", "latex_name": "值或null", "evtgen_name": "值或null", '
+    '"html_name": "值或null", "unicode_name": "值或null", '
+    '"aliases": ["新变体1", "新变体2"], "typo": ["新错误1", "新错误2"]}'
+)
+
+
+@dataclass
+class _Batch:
+    """流水线中传递的一个批次：同一提示词中的粒子，以及由其推导的反粒子"""
+    mcids: List[int]
+    derived: List[int] = field(default_factory=list)
+    infos: Dict[int, Dict] = field(default_factory=dict)
+    templates: List[Dict] = field(default_factory=list)
+    records: List[Dict] = field(default_factory=list)
+    error: Optional[Exception] = None
 
 
 class ParticleVariantGenerator:
-    def __init__(self, data_file: str = "particle_variants.json"):
+    def __init__(self, data_file: str = "particle_variants.json", use_llm: bool = True,
+                 stream: bool = False, derive_antiparticles: bool = False,
+                 api_url: Optional[str] = None, api_key: Optional[str] = None,
+                 model_name: str = DEFAULT_LLM_MODEL, max_retries: int = 0,
+                 metadata_workers: int = 2, rules_workers: int = 1, llm_workers: int = 1,
+                 post_workers: int = 1, queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Args:
+            api_url: OpenAI 兼容接口地址，默认读取环境变量 PARSV_LLM_API_URL，否则使用 aiapi.ihep.ac.cn
+            max_retries: 429/5xx 等可重试错误的重试次数（指数退避，遵循 Retry-After）
+            metadata_workers: batch_generate 流水线中获取 PDG/Particle 元数据的线程数
+            rules_workers: 规则变体阶段的线程数
+            llm_workers: 同时进行的 LLM 调用数
+            post_workers: 后处理（去重、反粒子推导）阶段的线程数
+            queue_size: 流水线各阶段输入队列的容量（批次数）
+        """
         self.data_file = data_file
+        self.api_url = api_url or os.environ.get(LLM_URL_ENV) or DEFAULT_LLM_URL
+        self.api_key = api_key
+        self.model_name = model_name
+        self.max_retries = max_retries
+        self._client = None
         self._file_cache = None
+        self.use_llm = use_llm
+        self.stream = stream
+        self.derive_antiparticles = derive_antiparticles
+        self.rule_engine = RuleBasedVariantEngine()
+        self.stats = {"llm_calls": 0, "llm_errors": 0, "prompt_chars": 0, "fallbacks": 0}
+        self.repairs: Dict[int, List[str]] = {}  # mcid -> 解析LLM响应时用到的修复项
+        self.metadata_workers = metadata_workers
+        self.rules_workers = rules_workers
+        self.llm_workers = llm_workers
+        self.post_workers = post_workers
+        self.queue_size = queue_size
+        self.pipeline_stats: Dict = {}
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self._catalogue = None
+        self._catalogue_lock = threading.Lock()
         
     def _load_cache(self):
         """加载本地数据缓存"""
         if self._file_cache is None:
             try:
-                with open(self.data_file, "r", encoding="utf-8") as f:
-                    self._file_cache = json.load(f)
+                self._file_cache = load_dataset(self.data_file)
             except FileNotFoundError:
                 self._file_cache = []
         return self._file_cache
     
+    def _get_client(self, api_key: Optional[str] = None, api_url: Optional[str] = None) -> HepAI:
+        """默认配置的客户端复用连接池，显式传入的地址或密钥单独创建"""
+        if api_key is None and api_url is None:
+            if self._client is None:
+                self._client = HepAI(api_key=self.api_key or os.environ.get("HEPAI_API_KEY"),
+                                     base_url=self.api_url, max_retries=self.max_retries)
+            return self._client
+        return HepAI(api_key=api_key or self.api_key or os.environ.get("HEPAI_API_KEY"),
+                     base_url=api_url or self.api_url, max_retries=self.max_retries)
+    
     def _call_llm_api(self, system_message: str, prompt: str, 
-                     model_name: str = "openai/gpt-4o-mini",
+                     model_name: Optional[str] = None,
                      api_key: Optional[str] = None,
-                     api_url: str = "https://aiapi.ihep.ac.cn/apiv2") -> str:
-        """调用LLM API生成拼写变体"""
-        client = HepAI(
-            api_key=api_key or os.environ.get("HEPAI_API_KEY"),
-            base_url=api_url
-        )
+                     api_url: Optional[str] = None,
+                     stream: bool = False,
+                     parser: Optional[IncrementalJSONParser] = None) -> str:
+        """调用LLM API生成拼写变体；stream=True 时边接收边解析，必需键完成后提前结束"""
+        client = self._get_client(api_key, api_url)
         
         response = client.chat.completions.create(
-            model=model_name,
+            model=model_name or self.model_name,
             messages=[
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": prompt}
             ],
-            stream=False
+            stream=stream
         )
         
-        content = response.choices[0].message.content
-        
-        # 清理JSON格式
-        if content.startswith("```json\n"):
-            content = content[len("```json\n"):]
-        if content.endswith("\n```"):
-            content = content[:-len("\n```")]
+        if not stream:
+            content = response.choices[0].message.content
             
-        return content
+            # 清理JSON格式
+            if content.startswith("```json\n"):
+                content = content[len("```json\n"):]
+            if content.endswith("\n```"):
+                content = content[:-len("\n```")]
+                
+            return content
+        
+        chunks = []
+        try:
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                chunks.append(delta)
+                if parser is not None and parser.feed(delta):
+                    break
+        finally:
+            close = getattr(response, "close", None)
+            if callable(close):
+                close()
+        return "".join(chunks)
+    
+    def _count(self, key: str, n: int = 1):
+        """流水线各线程共用的统计计数"""
+        with self._stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+    
+    def _get_catalogue(self) -> Dict:
+        """全目录的 拼写 -> mcid 集合：Particle 包中全部粒子的名称字段加上本地数据集的名称与别名，只构建一次"""
+        if self._catalogue is None:
+            with self._catalogue_lock:
+                if self._catalogue is None:
+                    records = [self._external_names(p) for p in ExternalParticle.all()]
+                    self._catalogue = build_catalogue(records + list(self._load_cache()))
+        return self._catalogue
+    
+    @staticmethod
+    def _external_names(particle_ex) -> Dict:
+        names = {"mcid": int(particle_ex.pdgid), "name": normalize_particle_name(particle_ex.name)}
+        for key in NAME_FIELDS[1:]:
+            try:
+                names[key] = getattr(particle_ex, key)
+            except Exception:
+                names[key] = None
+        return names
+    
+    def _pdg_api(self):
+        """每个线程复用一个 PDG 连接，避免每个粒子重新 connect"""
+        api = getattr(self._local, "pdg_api", None)
+        if api is None:
+            api = self._local.pdg_api = pdg.connect()
+        return api
     
     def _get_particle_info(self, mcid: int) -> Dict:
         """获取粒子基本信息"""
         # 从PDG API获取信息
         try:
-            api = pdg.connect()
+            api = self._pdg_api()
             particle = api.get_particle_by_mcid(mcid)
             
             # 从Particle包获取额外信息
@@ -92,36 +222,13 @@ class ParticleVariantGenerator:
     
     def _generate_basic_variants(self, name: str) -> List[str]:
         """生成基础拼写变体"""
-        if not name:
-            return []
-            
-        variants = set()
-        
-        # 符号转换
-        symbol_map = {
-            'Λ': 'Lambda', 'Δ': 'Delta', 
-            'Σ': 'Sigma', 'Ξ': 'Xi'
-        }
-        for greek, latin in symbol_map.items():
-            if greek in name:
-                variants.add(name.replace(greek, latin))
-            if latin in name:
-                variants.add(name.replace(latin, greek))
-        
-        # 分隔符处理
-        for sep in ['-', '_', '']:
-            variants.add(name.replace('_', sep))
-        
-        # LaTeX清理
-        if '$' in name:
-            variants.add(name.replace('$', ''))
-            
-        return list(variants)
+        return self.rule_engine.alias_variants(name)
     
-    def generate_variants(self, mcid: int) -> Dict:
-        """为指定mcid生成完整的拼写变体数据"""
+    def _build_template(self, mcid: int, particle_info: Optional[Dict] = None) -> Dict:
+        """获取粒子基本信息（已预取时直接使用）并用规则引擎生成本地变体"""
         # 获取粒子基本信息
-        particle_info = self._get_particle_info(mcid)
+        if particle_info is None:
+            particle_info = self._get_particle_info(mcid)
         
         # 构建数据模板
         data_template = {
@@ -136,147 +243,284 @@ class ParticleVariantGenerator:
             "typo": []
         }
         
-        # 生成基础变体
-        name_fields = ['name', 'programmatic_name', 'latex_name', 
-                      'evtgen_name', 'html_name', 'unicode_name']
-        base_variants = set()
-        for field in name_fields:
-            if data_template[field]:
-                base_variants.update(self._generate_basic_variants(data_template[field]))
+        # 基于规则生成本地变体，丢弃与其他粒子拼写相同的变体
+        rule_variants = self.rule_engine.generate(data_template, self._get_catalogue())
+        data_template["aliases"] = rule_variants["aliases"]
+        data_template["typo"] = rule_variants["typo"]
+        return data_template
+    
+    def _apply_llm_data(self, data_template: Dict, llm_data: Dict):
+        """将LLM返回的补充数据合并到模板"""
+        for field in ['programmatic_name', 'latex_name', 'evtgen_name', 
+                     'html_name', 'unicode_name']:
+            if not data_template[field] and llm_data.get(field):
+                data_template[field] = llm_data[field]
         
-        # 使用LLM增强生成
-        if data_template["name"]:
-            llm_prompt = f"""
-                基于以下粒子信息生成拼写变体：
-                {json.dumps(data_template, indent=2)}
-
-                生成要求：
-                1. aliases: 包含不同符号体系、格式变化、编码格式等变体
-                2. typo: 包含常见拼写错误、符号位置错误等
-                3. 补全空字段的合适值
-                4. 每个列表2-7个条目，避免重复
-                5. 输出可解析的JSON格式
-
-                输出格式：
-                {{
-                    "programmatic_name": "值或null",
-                    "latex_name": "值或null", 
-                    "evtgen_name": "值或null",
-                    "html_name": "值或null",
-                    "unicode_name": "值或null",
-                    "aliases": ["变体1", "变体2"],
-                    "typo": ["错误1", "错误2"]
-                }}
-            """
-            
+        data_template["aliases"] = data_template["aliases"] + list(llm_data.get("aliases") or [])
+        data_template["typo"] = data_template["typo"] + list(llm_data.get("typo") or [])
+    
+    def _finalize(self, data_template: Dict) -> Dict:
+        """去重处理，并丢弃 LLM 或反粒子推导带来的、属于其他粒子的拼写"""
+        primary_values = {str(data_template[key]) for key in NAME_FIELDS 
+                        if data_template[key] is not None}
+        mcid, catalogue = data_template.get("mcid"), self._get_catalogue()
+        
+        data_template["aliases"] = list(dict.fromkeys(
+            a for a in data_template["aliases"]
+            if a not in primary_values and not owned_by_other(a, mcid, catalogue)))
+        data_template["typo"] = list(dict.fromkeys(
+            t for t in data_template["typo"] 
+            if t not in primary_values and t not in data_template["aliases"]
+            and not owned_by_other(t, mcid, catalogue)))
+        return data_template
+    
+    def _call_llm_json(self, prompt: str, required_keys: List[str], mcids: List[int]) -> Optional[Dict]:
+        """调用LLM并容错解析JSON，记录调用次数、提示词长度以及需要修复的粒子"""
+        self._count("llm_calls")
+        self._count("prompt_chars", len(LLM_INSTRUCTIONS) + len(prompt))
+        parser = IncrementalJSONParser(required_keys)
+        response = self._call_llm_api(LLM_INSTRUCTIONS, prompt, stream=self.stream, parser=parser)
+        if not self.stream:
+            parser.feed(response)
+        llm_data, repairs = parser.result()
+        if repairs:
+            with self._stats_lock:
+                for mcid in mcids:
+                    self.repairs.setdefault(mcid, []).extend(repairs)
+        return llm_data
+    
+    def _complete_with_llm(self, data_template: Dict, finalize: bool = True) -> Dict:
+        """使用LLM补充单个粒子规则无法生成的变体；finalize=False 时留给后处理阶段去重"""
+        if self.use_llm and data_template["name"]:
+            llm_prompt = (
+                "粒子信息（aliases 和 typo 中已有的条目由规则生成，不要重复）：\n"
+                f"{json.dumps(data_template, ensure_ascii=False)}\n"
+                "输出格式：" + LLM_ITEM_FORMAT
+            )
             try:
-                response = self._call_llm_api("", llm_prompt)
-                llm_data = safe_json_loads(response)
-                
-                if llm_data:
-                    # 更新数据
-                    for field in ['programmatic_name', 'latex_name', 'evtgen_name', 
-                                 'html_name', 'unicode_name']:
-                        if not data_template[field] and llm_data.get(field):
-                            data_template[field] = llm_data[field]
-                    
-                    data_template["aliases"] = llm_data.get("aliases", [])
-                    data_template["typo"] = llm_data.get("typo", [])
-                    
-                    # 去重处理
-                    primary_values = {str(data_template[key]) for key in name_fields 
-                                    if data_template[key] is not None}
-                    
-                    data_template["aliases"] = [a for a in data_template["aliases"] 
-                                              if a not in primary_values]
-                    data_template["typo"] = [t for t in data_template["typo"] 
-                                           if t not in primary_values]
-                
+                llm_data = self._call_llm_json(llm_prompt, ["aliases", "typo"], [data_template["mcid"]])
+                if isinstance(llm_data, dict):
+                    self._apply_llm_data(data_template, llm_data)
             except Exception as e:
-                print(f"LLM生成失败: {mcid} - {e}")
+                self._count("llm_errors")
+                print(f"LLM生成失败: {data_template['mcid']} - {e}")
         
-        return data_template
+        return self._finalize(data_template) if finalize else data_template
     
-    def batch_generate(self, mcid_list: List[int]) -> List[Dict]:
-        """批量生成粒子变体数据"""
-        results = []
-        for i, mcid in enumerate(mcid_list):
-            print(f"处理 {i+1}/{len(mcid_list)}: mcid={mcid}")
+    def generate_variants(self, mcid: int) -> Dict:
+        """为指定mcid生成完整的拼写变体数据"""
+        return self._complete_with_llm(self._build_template(mcid))
+    
+    @staticmethod
+    def _is_valid_llm_item(item) -> bool:
+        """检查批量响应中单个粒子的条目是否完整"""
+        return (isinstance(item, dict)
+                and isinstance(item.get("aliases"), list)
+                and isinstance(item.get("typo"), list))
+    
+    def generate_batch(self, mcids: List[int]) -> List[Dict]:
+        """将多个粒子打包进一个提示词，响应不完整的粒子回退为单粒子调用"""
+        return self._complete_batch([self._build_template(mcid) for mcid in mcids])
+    
+    def _complete_batch(self, templates: List[Dict], finalize: bool = True) -> List[Dict]:
+        """用一次LLM调用补充一个批次的模板；finalize=False 时留给后处理阶段去重"""
+        done = self._finalize if finalize else (lambda template: template)
+        if not self.use_llm:
+            return [done(t) for t in templates]
+        if len(templates) == 1:
+            return [self._complete_with_llm(templates[0], finalize=finalize)]
+        
+        particles = {str(t["mcid"]): t for t in templates if t["name"]}
+        llm_data = None
+        if particles:
+            llm_prompt = (
+                "以下粒子按 mcid 给出（aliases 和 typo 中已有的条目由规则生成，不要重复）：\n"
+                f"{json.dumps(particles, ensure_ascii=False)}\n"
+                "输出一个以 mcid 字符串为键的JSON对象，必须包含上面全部键，每个值的格式为："
+                + LLM_ITEM_FORMAT
+            )
             try:
-                result = self.generate_variants(mcid)
-                results.append(result)
+                llm_data = self._call_llm_json(llm_prompt, list(particles), [int(k) for k in particles])
             except Exception as e:
-                print(f"生成失败 mcid={mcid}: {e}")
-                results.append({
-                    "name": str(mcid),
-                    "mcid": mcid,
-                    "error": str(e)
-                })
+                self._count("llm_errors")
+                print(f"批量LLM生成失败: {list(particles)} - {e}")
+        
+        results = []
+        for template in templates:
+            key = str(template["mcid"])
+            if key not in particles:
+                results.append(done(template))
+                continue
+            item = llm_data.get(key) if isinstance(llm_data, dict) else None
+            if self._is_valid_llm_item(item):
+                self._apply_llm_data(template, item)
+                results.append(done(template))
+            else:
+                self._count("fallbacks")
+                results.append(self._complete_with_llm(template, finalize=finalize))
         return results
-
-
-def get_standard_mcids() -> List[int]:
-    """获取标准粒子MCID列表，按绝对值排序"""
-    mcids = []
     
-    # Quarks (夸克)
-    quarks = [1, 2, 3, 4, 5, 6, 7, 8]  # d, u, s, c, b, t, b', t'
-
-    # Leptons (轻子)
-    leptons = [11, 12, 13, 14, 15, 16, 17, 18]  # e-, νe, µ-, νµ, τ-, ντ, τ'-, ντ'
+    def batch_generate(self, mcid_list: List[int], batch_size: int = 1) -> List[Dict]:
+        """
+        批量生成粒子变体数据；batch_size > 1 时按类别打包多个粒子到同一提示词。
+        以流水线执行：元数据预取 -> 规则变体 -> LLM 调用 -> 后处理去重（及反粒子推导）-> 收集，
+        各阶段有独立线程数与有界队列，等待 LLM 响应时后续批次的元数据与规则变体已在准备
+        """
+        self.stats = {"llm_calls": 0, "llm_errors": 0, "prompt_chars": 0, "fallbacks": 0, "derived": 0}
+        self.repairs = {}
+        # 同时请求粒子与反粒子时，只为正 mcid 生成，反粒子由规则推导
+        requested = set(mcid_list)
+        derived = [mcid for mcid in mcid_list if self.derive_antiparticles and mcid < 0 and -mcid in requested]
+        primary = [mcid for mcid in mcid_list if mcid not in set(derived)]
+        
+        # 反粒子随其粒子所在的批次一起预取元数据、推导
+        batches = [_Batch(mcids=[mcid]) for mcid in primary] if batch_size <= 1 \
+            else [_Batch(mcids=batch) for batch in make_mcid_batches(primary, batch_size)]
+        owner = {mcid: batch for batch in batches for mcid in batch.mcids}
+        for mcid in derived:
+            owner[-mcid].derived.append(mcid)
+        
+        # Particle 包首次查询时才加载粒子表，多个元数据线程同时触发会读到空表
+        if not ExternalParticle.table_loaded():
+            ExternalParticle.load_table()
+        
+        by_mcid = {}
+        done = [0]
+        
+        def collect(batch: _Batch):
+            for record in batch.records:
+                by_mcid[record["mcid"]] = record
+            done[0] += len(batch.mcids)
+            print(f"处理 {done[0]}/{len(primary)}: mcids={batch.mcids}")
+        
+        pipeline = Pipeline([
+            StageSpec("metadata", self._stage_metadata, self.metadata_workers),
+            StageSpec("rules", self._stage_rules, self.rules_workers),
+            StageSpec("llm", self._stage_llm, self.llm_workers),
+            StageSpec("post", self._stage_post, self.post_workers),
+            StageSpec("writer", collect, 1),
+        ], queue_size=self.queue_size, on_error=self._stage_error)
+        self.pipeline_stats = pipeline.run(batches)
+        # 保持与输入相同的顺序；流水线中丢失的粒子（不应发生）记为错误而不是中断整批
+        missing = RuntimeError("record lost in the generation pipeline")
+        results = [by_mcid.get(mcid) or self._error_record(mcid, missing) for mcid in mcid_list]
+        
+        if derived:
+            print(f"由规则推导反粒子 {self.stats['derived']} 个")
+        print(f"LLM调用 {self.stats['llm_calls']} 次（失败 {self.stats['llm_errors']} 次）, "
+              f"提示词 {self.stats['prompt_chars']} 字符, 回退单粒子调用 {self.stats['fallbacks']} 次")
+        if self.repairs:
+            print(f"{len(self.repairs)} 个粒子的LLM响应经过修复: "
+                  + ", ".join(f"{mcid}({'; '.join(r)})" for mcid, r in self.repairs.items()))
+        print(f"流水线耗时 {self.pipeline_stats['elapsed_s']}s:")
+        for line in format_report(self.pipeline_stats):
+            print("  " + line)
+        return results
     
-    # Gauge and Higgs Bosons (规范玻色子和希格斯玻色子)
-    bosons = [21, 22, 23, 24, 25, 32, 33, 34, 35, 36, 37, 38, 39, 40]  # g, γ, Z0, W+, h0/H0, Z'/Z0, Z''/Z0, W'/W+, H0/H0, A0/H0, H+, H++, G (graviton), a0/H0
-
-    # Special Particles (特殊粒子)
-    special_particles = [41, 42, 51, 52, 53, 110, 990, 9990]  # R0, LQc, DM (S=0), DM (S=1/2), DM (S=1), reggeon, pomeron, odderon
-
-    # Diquarks (双夸克)
-    diquarks = [1103, 2101, 2103, 2203, 3101, 3103, 3201, 3203, 3303, 4101, 4103, 4201, 4203, 4301, 4303, 4403, 5101, 5103, 5201, 5203, 5301, 5303, 5401, 5403, 5503]
-
-    # SUSY Particles (超对称粒子)
-    susy_particles = [1000001, 1000002, 1000003, 1000004, 1000005, 1000006, 1000011, 1000012, 1000013, 1000014, 1000015, 1000016, 2000001, 2000002, 2000003, 2000004, 2000005, 2000006, 2000011, 2000013, 2000015, 1000021, 1000022, 1000023, 1000024, 1000025, 1000035, 1000037, 1000039]
-
-    # Light I=1 Mesons (轻I=1介子)
-    light_i1_mesons = [111, 211, 9000111, 9000211, 100111, 100211, 10111, 10211, 9010111, 9010211, 113, 213, 10113, 10213, 20113, 20213, 9000113, 9000213, 100113, 100213, 9010113, 9010213, 9020113, 9020213, 30113, 30213, 9030113, 9030213, 9040113, 9040213, 115, 215, 10115, 10215, 9000115, 9000215, 9010115, 9010215, 117, 217, 9000117, 9000217, 9010117, 9010217, 119, 219]
-
-    # Light I=0 Mesons (轻I=0介子)
-    light_i0_mesons = [221, 331, 9000221, 9010221, 100221, 10221, 9020221, 100331, 9030221, 10331, 9040221, 9050221, 9060221, 9070221, 9080221, 223, 333, 10223, 20223, 10333, 20333, 1000223, 9000223, 9010223, 30223, 100333, 225, 9000225, 335, 9010225, 9020225, 10225, 9030225, 10335, 9040225, 9050225, 9060225, 9070225, 9080225, 9090225, 227, 337, 229, 9000229, 9010229]
-
-    # Strange Mesons (奇异介子)
-    strange_mesons = [130, 310, 311, 321, 9000311, 9000321, 10311, 10321, 100311, 100321, 9010311, 9010321, 9020311, 9020321, 313, 323, 10313, 10323, 20313, 20323, 100313, 100323, 9000313, 9000323, 30313, 30323, 315, 325, 9000315, 9000325, 10315, 10325, 20315, 20325, 9010315, 9010325, 9020315, 9020325, 317, 327, 9010317, 9010327, 319, 329, 9000319, 9000329]
-
-    # Charmed Mesons (粲介子)
-    charmed_mesons = [411, 421, 10411, 10421, 413, 423, 10413, 10423, 20413, 20423, 415, 425, 431, 10431, 433, 10433, 20433, 435]
-
-    # Bottom Mesons (底介子)
-    bottom_mesons = [511, 521, 10511, 10521, 513, 523, 10513, 10523, 20513, 20523, 515, 525, 531, 10531, 533, 10533, 20533, 535, 541, 10541, 543, 10543, 20543, 545]
-
-    # cc Mesons (cc介子)
-    cc_mesons = [441, 10441, 100441, 443, 10443, 20443, 100443, 30443, 9000443, 9010443, 9020443, 445, 100445]
-
-    # bb Mesons (bb介子)
-    bb_mesons = [551, 10551, 100551, 110551, 200551, 210551, 553, 10553, 20553, 30553, 100553, 110553, 120553, 130553, 200553, 210553, 220553, 300553, 9000553, 9010553, 555, 10555, 20555, 100555, 110555, 120555, 200555, 557, 100557]
-
-    # Light Baryons (轻重子)
-    light_baryons = [2212, 2112, 2224, 2214, 2114, 1114]
+    def _stage_error(self, stage: str, batch: _Batch, error: Exception) -> _Batch:
+        """阶段失败的批次带着错误继续向下游传递，由后处理阶段生成错误记录"""
+        print(f"生成失败 mcids={batch.mcids} ({stage}): {error}")
+        batch.error = error
+        return batch
+    
+    def _stage_metadata(self, batch: _Batch) -> _Batch:
+        for mcid in batch.mcids + batch.derived:
+            batch.infos[mcid] = self._get_particle_info(mcid)
+        return batch
+    
+    def _stage_rules(self, batch: _Batch) -> _Batch:
+        if batch.error is None:
+            batch.templates = [self._build_template(mcid, batch.infos[mcid]) for mcid in batch.mcids]
+        return batch
+    
+    def _stage_llm(self, batch: _Batch) -> _Batch:
+        if batch.error is None:
+            batch.records = self._complete_batch(batch.templates, finalize=False)
+        return batch
+    
+    def _stage_post(self, batch: _Batch) -> _Batch:
+        """去重；失败的批次生成错误记录；推导反粒子，粒子生成失败时反粒子单独生成"""
+        if batch.error is None:
+            batch.records = [self._finalize(record) for record in batch.records]
+        else:
+            batch.records = [self._error_record(mcid, batch.error) for mcid in batch.mcids]
+        by_mcid = {record["mcid"]: record for record in batch.records}
+        for mcid in batch.derived:
+            try:
+                if "error" in by_mcid[-mcid]:
+                    batch.records.append(self.generate_variants(mcid))
+                    continue
+                template = self._build_template(mcid, batch.infos.get(mcid))
+                batch.records.append(self.derive_antiparticle(by_mcid[-mcid], mcid, template))
+                self._count("derived")
+            except Exception as e:
+                print(f"推导失败 mcid={mcid}: {e}")
+                batch.records.append(self._error_record(mcid, e))
+        return batch
+    
+    def generate_shards(self, mcid_list: List[int], output_dir: str, batch_size: int = 1) -> Dict[str, int]:
+        """
+        按类别逐个分片生成，每个类别完成后立即写入分片数据集目录并释放，内存只随单个类别增长；
+        返回 类别 -> 记录数
+        """
+        by_category: Dict[str, List[int]] = {}
+        for mcid in mcid_list:
+            by_category.setdefault(category_of(mcid), []).append(mcid)
+        dataset = ShardedDataset(output_dir) if is_sharded(output_dir) else ShardedDataset.create(output_dir, [])
+        
+        counts = {}
+        for category in sorted(by_category, key=get_categories().index):
+            mcids = by_category[category]
+            print(f"生成分片 {category}: {len(mcids)} 个粒子")
+            results = self.batch_generate(mcids, batch_size=batch_size)
+            dataset.save_shard(category, results)
+            dataset.release(category)
+            counts[category] = len(results)
+        return counts
+    
+    def derive_antiparticle(self, record: Dict, mcid: int, template: Optional[Dict] = None) -> Dict:
+        """由已生成的粒子记录推导反粒子记录，名称字段以外部库为准，无需调用LLM"""
+        template = template if template is not None else self._build_template(mcid)
+        derived = derive_antiparticle(record, reference=template)
+        derived["aliases"] = derived.get("aliases", []) + template["aliases"]
+        derived["typo"] = derived.get("typo", []) + template["typo"]
+        return self._finalize(derived)
+    
+    @staticmethod
+    def _error_record(mcid: int, error: Exception) -> Dict:
+        return {
+            "name": str(mcid),
+            "mcid": mcid,
+            "error": str(error)
+        }
 
-    # Strange Baryons (奇异重子)
-    strange_baryons = [3122, 3222, 3212, 3112, 3224, 3214, 3114, 3322, 3312, 3324, 3314, 3334]
 
-    # Charmed Baryons (粲重子)
-    charmed_baryons = [4122, 4222, 4212, 4112, 4224, 4214, 4114, 4232, 4132, 4322, 4312, 4324, 4314, 4332, 4334, 4412, 4422, 4414, 4424, 4432, 4434, 4444]
+def make_mcid_batches(mcid_list: List[int], batch_size: int) -> List[List[int]]:
+    """按类别分组并使粒子与其反粒子相邻，切分为不超过 batch_size 的批次"""
+    # 类别 -> 绝对值 -> [mcid, -mcid]，保留首次出现的顺序
+    grouped: Dict[str, Dict[int, List[int]]] = {}
+    for mcid in dict.fromkeys(mcid_list):
+        category = category_of(mcid)
+        grouped.setdefault(category, {}).setdefault(abs(mcid), []).append(mcid)
+    
+    batches = []
+    for pairs in grouped.values():
+        current: List[int] = []
+        for pair in pairs.values():
+            pair = sorted(pair, reverse=True)
+            if current and len(current) + len(pair) > batch_size:
+                batches.append(current)
+                current = []
+            current.extend(pair)
+        if current:
+            batches.append(current)
+    return batches
 
-    # Bottom Baryons (底重子)
-    bottom_baryons = [5122, 5112, 5212, 5222, 5114, 5214, 5224, 5132, 5232, 5312, 5322, 5314, 5324, 5332, 5334, 5142, 5242, 5412, 5422, 5414, 5424, 5342, 5432, 5434, 5442, 5444, 5512, 5522, 5514, 5524, 5532, 5534, 5542, 5544, 5554]
 
-    # Pentaquarks (五夸克态)
-    pentaquarks = [9221132, 9331122]
-    
-    all_particles = quarks + leptons + bosons + special_particles + diquarks + susy_particles + \
-                   light_i1_mesons + light_i0_mesons + strange_mesons + charmed_mesons + bottom_mesons + \
-                   cc_mesons + bb_mesons + light_baryons + strange_baryons + charmed_baryons + bottom_baryons + \
-                   pentaquarks
+def get_standard_mcids() -> List[int]:
+    """获取标准粒子MCID列表，按绝对值排序"""
+    mcids = []
+    all_particles = [pid for pids in get_standard_mcid_groups().values() for pid in pids]
     
     # 包含粒子和反粒子
     for pid in all_particles:
@@ -294,7 +538,6 @@ if __name__ == "__main__":
     results = generator.batch_generate(mcid_list)
     
     # 保存结果
-    with open("particle_variants.json", "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+    atomic_write_json("particle_variants.json", results)
     
     print(f"已生成{len(results)}个粒子的变体数据")
\ No newline at end of file
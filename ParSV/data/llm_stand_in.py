@@ -0,0 +1,329 @@
+"""
+本地 LLM 替身服务
+OpenAI 兼容的 /v1/chat/completions 接口，从生成器的提示词中解析粒子模板，返回符合格式的变体 JSON，
+可配置延迟分布、错误率、限流（429）与格式错误的输出，用于离线测试与调优生成流程，不消耗真实额度。
+
+    python -m ParSV.data.llm_stand_in --port 42800 --latency lognormal:-0.7,0.4 --rate-limit 5
+    export PARSV_LLM_API_URL=http://127.0.0.1:42800/v1
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.utils import json_codec
+
+LATENCY_KINDS = ("const", "uniform", "normal", "lognormal")
+MALFORMED_KINDS = ("fenced", "chatter", "trailing_comma", "truncated", "missing_key")
+
+
+def parse_latency(spec: str) -> Tuple[str, List[float]]:
+    """解析延迟分布: const:0.5 | uniform:0.2,0.8 | normal:0.5,0.1 | lognormal:mu,sigma（秒）"""
+    kind, _, args = spec.partition(":")
+    kind = kind.strip() or "const"
+    if kind not in LATENCY_KINDS:
+        raise ValueError(f"Unknown latency distribution `{kind}`, available: {LATENCY_KINDS}")
+    values = [float(v) for v in args.split(",") if v.strip()] if args else []
+    expected = {"const": 1, "uniform": 2, "normal": 2, "lognormal": 2}[kind]
+    if len(values) != expected:
+        raise ValueError(f"Latency distribution `{kind}` expects {expected} parameters, got `{spec}`")
+    return kind, values
+
+
+@dataclass
+class StandInConfig:
+    latency: str = "const:0.0"
+    per_item_latency: float = 0.0
+    error_rate: float = 0.0
+    rate_limit: float = 0.0
+    rate_burst: int = 1
+    rate_limit_prob: float = 0.0
+    malformed_rate: float = 0.0
+    stream_chunks: int = 8
+    seed: int = 0
+
+
+@dataclass
+class StandInStats:
+    requests: int = 0
+    completed: int = 0
+    rate_limited: int = 0
+    errors: int = 0
+    malformed: int = 0
+    streamed: int = 0
+    items: int = 0
+
+    def to_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+
+class StandInLLM:
+    """生成替身响应，延迟、错误与限流的判定与 HTTP 层解耦"""
+
+    def __init__(self, config: StandInConfig):
+        self.config = config
+        self.latency = parse_latency(config.latency)
+        self.rng = random.Random(config.seed)
+        self.stats = StandInStats()
+        self._tokens = float(max(1, config.rate_burst))
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ #
+    # 策略
+    # ------------------------------------------------------------------ #
+    def sample_latency(self, n_items: int) -> float:
+        kind, p = self.latency
+        if kind == "const":
+            base = p[0]
+        elif kind == "uniform":
+            base = self.rng.uniform(p[0], p[1])
+        elif kind == "normal":
+            base = self.rng.gauss(p[0], p[1])
+        else:
+            base = math.exp(self.rng.gauss(p[0], p[1]))
+        return max(0.0, base) + self.config.per_item_latency * n_items
+
+    def admit(self) -> Optional[float]:
+        """令牌桶限流，返回 None 表示放行，否则返回建议的 Retry-After 秒数"""
+        with self._lock:
+            if self.config.rate_limit_prob and self.rng.random() < self.config.rate_limit_prob:
+                return 1.0
+            if self.config.rate_limit <= 0:
+                return None
+            now = time.monotonic()
+            self._tokens = min(float(max(1, self.config.rate_burst)),
+                               self._tokens + (now - self._last) * self.config.rate_limit)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            return (1 - self._tokens) / self.config.rate_limit
+
+    # ------------------------------------------------------------------ #
+    # 内容
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def parse_prompt(prompt: str) -> Tuple[str, Dict]:
+        """从提示词中取出粒子数据：单粒子返回 ("single", 模板)，批量返回 ("batch", {mcid: 模板})"""
+        for line in prompt.splitlines():
+            line = line.strip()
+            if line.startswith("{"):
+                try:
+                    data = json_codec.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(data, dict) and "mcid" in data:
+                    return "single", data
+                if isinstance(data, dict):
+                    return "batch", data
+        return "single", {}
+
+    def _item(self, template: Dict) -> Dict:
+        name = str(template.get("name") or template.get("mcid") or "x")
+        rng = random.Random(f"{self.config.seed}:{template.get('mcid')}")
+        compact = re.sub(r"[^0-9A-Za-z]+", "", name) or name
+        aliases = [f"{compact}_alt", f"{name} particle"][:rng.randint(1, 2)]
+        typo = [f"{compact}{compact[-1]}", f"{name[:-1]}"][:rng.randint(0, 2)] if len(name) > 1 else []
+        item = {field: None for field in ("programmatic_name", "latex_name", "evtgen_name",
+                                          "html_name", "unicode_name") if not template.get(field)}
+        item["aliases"] = aliases
+        item["typo"] = typo
+        return item
+
+    def completion_body(self, prompt: str) -> Tuple[str, int]:
+        """生成响应文本，返回 (content, 粒子数)；按 malformed_rate 注入常见的格式问题"""
+        mode, data = self.parse_prompt(prompt)
+        if mode == "single":
+            payload, n_items = self._item(data), 1
+        else:
+            payload = {key: self._item(value) for key, value in data.items() if isinstance(value, dict)}
+            n_items = len(payload)
+        with self._lock:
+            malformed = self.config.malformed_rate and self.rng.random() < self.config.malformed_rate
+            kind = self.rng.choice(MALFORMED_KINDS) if malformed else None
+        if kind == "missing_key" and mode == "batch" and len(payload) > 1:
+            payload.pop(next(iter(payload)))
+        content = json_codec.dumps(payload)
+        if kind == "fenced":
+            content = f"```json\n{content}\n```"
+        elif kind == "chatter":
+            content = f"好的，以下是补充的变体：\n{content}\n希望有帮助。"
+        elif kind == "trailing_comma":
+            content = content[:-1] + ",}" if content.endswith("}") else content
+        elif kind == "truncated":
+            content = content[:max(1, int(len(content) * 0.7))]
+        if kind:
+            self.stats.malformed += 1
+        return content, n_items
+
+
+def _chat_response(content: str, model: str) -> Dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": len(content), "total_tokens": len(content)},
+    }
+
+
+def _chunk(content: Optional[str], model: str, chunk_id: str, finish: Optional[str] = None) -> bytes:
+    delta = {"content": content} if content is not None else {}
+    body = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+    return b"data: " + json_codec.dumpb(body) + b"\n\n"
+
+
+def create_app(config: Optional[StandInConfig] = None):
+    """构建 FastAPI 应用，llm 对象挂在 app.state.llm 上供测试读取统计"""
+    from fastapi import FastAPI, Request
+    from starlette.responses import JSONResponse, StreamingResponse
+
+    llm = StandInLLM(config or StandInConfig())
+    app = FastAPI(title="ParSV stand-in LLM")
+    app.state.llm = llm
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        llm.stats.requests += 1
+        model = body.get("model", "stand-in")
+        retry_after = llm.admit()
+        if retry_after is not None:
+            llm.stats.rate_limited += 1
+            return JSONResponse({"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                                status_code=429, headers={"Retry-After": f"{retry_after:.3f}"})
+        with llm._lock:
+            failed = llm.config.error_rate and llm.rng.random() < llm.config.error_rate
+        if failed:
+            llm.stats.errors += 1
+            return JSONResponse({"error": {"message": "Internal error", "type": "server_error"}}, status_code=500)
+
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []) if m.get("role") == "user")
+        content, n_items = llm.completion_body(prompt)
+        latency = llm.sample_latency(n_items)
+        llm.stats.items += n_items
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            llm.stats.completed += 1
+            return JSONResponse(_chat_response(content, model))
+
+        llm.stats.streamed += 1
+        n_chunks = max(1, min(llm.config.stream_chunks, len(content)))
+        size = math.ceil(len(content) / n_chunks)
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        async def events():
+            for i in range(0, len(content), size):
+                await asyncio.sleep(latency / n_chunks)
+                yield _chunk(content[i:i + size], model, chunk_id)
+            yield _chunk(None, model, chunk_id, finish="stop")
+            yield b"data: [DONE]\n\n"
+            llm.stats.completed += 1
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def list_models():
+        return {"object": "list", "data": [{"id": "stand-in", "object": "model", "owned_by": "parsv"}]}
+
+    async def stats():
+        return llm.stats.to_dict()
+
+    for prefix in ("/v1", "/apiv2"):
+        app.post(f"{prefix}/chat/completions")(chat_completions)
+        app.get(f"{prefix}/models")(list_models)
+    app.get("/stats")(stats)
+    return app
+
+
+class StandInServer:
+    """在后台线程运行替身服务，退出上下文时关闭"""
+
+    def __init__(self, config: Optional[StandInConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        import socket
+        import uvicorn
+        if not port:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.bind((host, 0))
+                port = s.getsockname()[1]
+        self.host, self.port = host, port
+        self.app = create_app(config)
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port,
+                                                     log_level="warning", access_log=False))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    @property
+    def stats(self) -> StandInStats:
+        return self.app.state.llm.stats
+
+    def __enter__(self) -> "StandInServer":
+        self._thread.start()
+        deadline = time.time() + 30
+        while not self._server.started:
+            if time.time() > deadline or not self._thread.is_alive():
+                raise RuntimeError(f"Stand-in LLM failed to start on {self.api_url}")
+            time.sleep(0.02)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--latency', default="const:0.0",
+                        help='Response latency distribution in seconds: const:S, uniform:A,B, normal:MU,SD '
+                             'or lognormal:MU,SIGMA')
+    parser.add_argument('--per-item-latency', type=float, default=0.0,
+                        help='Extra seconds per particle in the prompt (longer outputs for larger batches)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 500')
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='Token bucket rate in requests per second, excess requests get HTTP 429 (0: unlimited)')
+    parser.add_argument('--rate-burst', type=int, default=1, help='Token bucket size')
+    parser.add_argument('--rate-limit-prob', type=float, default=0.0,
+                        help='Fraction of requests answered with HTTP 429 regardless of the rate')
+    parser.add_argument('--malformed-rate', type=float, default=0.0,
+                        help=f'Fraction of responses with broken JSON ({", ".join(MALFORMED_KINDS)})')
+    parser.add_argument('--stream-chunks', type=int, default=8, help='Number of chunks of a streamed response')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+
+def config_from_args(args) -> StandInConfig:
+    return StandInConfig(latency=args.latency, per_item_latency=args.per_item_latency, error_rate=args.error_rate,
+                         rate_limit=args.rate_limit, rate_burst=args.rate_burst,
+                         rate_limit_prob=args.rate_limit_prob, malformed_rate=args.malformed_rate,
+                         stream_chunks=args.stream_chunks, seed=args.seed)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in LLM for offline generation tests")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=42800)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    print(f"Stand-in LLM at http://{args.host}:{args.port}/v1, point PARSV_LLM_API_URL at it")
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,177 @@
+"""
+分阶段流水线
+每个阶段有自己的线程数与有界输入队列，上游产出即交给下游，阶段之间互相重叠；
+队列满时上游阻塞（背压），内存占用以 队列容量 x 阶段数 为上限。
+运行结束后给出各阶段的处理数、吞吐、忙碌/等待输入/等待下游的时间与队列深度，用于找出瓶颈阶段。
+"""
+
+import queue
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+DEFAULT_QUEUE_SIZE = 8
+
+_DONE = object()
+
+
+@dataclass
+class StageSpec:
+    """阶段定义：fn 处理一个条目并返回交给下一阶段的条目（最后一个阶段的返回值被丢弃）"""
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    workers: int
+    processed: int = 0
+    errors: int = 0
+    busy_s: float = 0.0
+    idle_s: float = 0.0       # 等待上游输入
+    blocked_s: float = 0.0    # 下游队列已满，等待放入
+    max_depth: int = 0
+    depth_sum: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def to_dict(self, elapsed: float) -> Dict:
+        elapsed = max(elapsed, 1e-9)
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "errors": self.errors,
+            "per_s": round(self.processed / elapsed, 2),
+            "utilization": round(self.busy_s / (self.workers * elapsed), 3),
+            "busy_s": round(self.busy_s, 3),
+            "idle_s": round(self.idle_s, 3),
+            "blocked_s": round(self.blocked_s, 3),
+            "queue_max": self.max_depth,
+            "queue_mean": round(self.depth_sum / self.processed, 2) if self.processed else 0.0,
+        }
+
+
+class Pipeline:
+    """由若干阶段组成的线程流水线，条目在各阶段之间经有界队列传递"""
+
+    def __init__(self, stages: Sequence[StageSpec], queue_size: int = DEFAULT_QUEUE_SIZE,
+                 on_error: Optional[Callable[[str, Any, Exception], Any]] = None):
+        """
+        Args:
+            queue_size: 每个阶段输入队列的容量
+            on_error: 阶段处理失败时调用，返回值继续交给下一阶段；未设置或其自身出错时，
+                该条目被丢弃，异常在 run 结束后抛出
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = list(stages)
+        self.queue_size = max(1, int(queue_size))
+        self.on_error = on_error
+        self.metrics: List[StageMetrics] = []
+        self.elapsed = 0.0
+        self.source_blocked = 0.0
+
+    def run(self, items: Iterable) -> Dict:
+        """依次送入 items，等待全部阶段处理完毕，返回各阶段统计"""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        self.metrics = [StageMetrics(spec.name, max(1, spec.workers)) for spec in self.stages]
+        alive = [m.workers for m in self.metrics]
+        alive_lock = threading.Lock()
+        errors: List[BaseException] = []
+
+        def put(i: int, item, metrics: Optional[StageMetrics]):
+            t0 = time.perf_counter()
+            queues[i].put(item)
+            waited = time.perf_counter() - t0
+            if metrics is None:
+                self.source_blocked += waited
+            else:
+                with metrics._lock:
+                    metrics.blocked_s += waited
+
+        def worker(i: int):
+            spec, metrics, inbox = self.stages[i], self.metrics[i], queues[i]
+            last = i == len(self.stages) - 1
+            while True:
+                depth = inbox.qsize()
+                t0 = time.perf_counter()
+                item = inbox.get()
+                t1 = time.perf_counter()
+                if item is _DONE:
+                    break
+                try:
+                    result = spec.fn(item)
+                    failed = False
+                except Exception as e:
+                    failed = True
+                    result = _DONE
+                    if self.on_error is None:
+                        errors.append(e)
+                    else:
+                        # on_error 自身出错时丢弃该条目，线程继续运行，保证下游能收到结束标记
+                        try:
+                            result = self.on_error(spec.name, item, e)
+                        except Exception as handler_error:
+                            errors.append(handler_error)
+                t2 = time.perf_counter()
+                with metrics._lock:
+                    metrics.processed += 1
+                    metrics.errors += failed
+                    metrics.idle_s += t1 - t0
+                    metrics.busy_s += t2 - t1
+                    metrics.depth_sum += depth
+                    metrics.max_depth = max(metrics.max_depth, depth)
+                if not last and result is not _DONE:
+                    put(i + 1, result, metrics)
+            # 本阶段最后一个退出的线程通知下游结束
+            with alive_lock:
+                alive[i] -= 1
+                finished = alive[i] == 0
+            if finished and not last:
+                for _ in range(self.metrics[i + 1].workers):
+                    queues[i + 1].put(_DONE)
+
+        threads = [threading.Thread(target=worker, args=(i,), name=f"pipeline-{spec.name}-{n}", daemon=True)
+                   for i, spec in enumerate(self.stages) for n in range(self.metrics[i].workers)]
+        t0 = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            for item in items:
+                put(0, item, None)
+        finally:
+            for _ in range(self.metrics[0].workers):
+                queues[0].put(_DONE)
+            for thread in threads:
+                thread.join()
+        self.elapsed = time.perf_counter() - t0
+        if errors:
+            raise errors[0]
+        return self.report()
+
+    def report(self) -> Dict:
+        return {"elapsed_s": round(self.elapsed, 3), "source_blocked_s": round(self.source_blocked, 3),
+                "stages": {m.name: m.to_dict(self.elapsed) for m in self.metrics}}
+
+
+def format_report(report: Dict) -> List[str]:
+    """每个阶段一行的可读统计"""
+    lines = [f"{'stage':<10} {'workers':>7} {'items':>6} {'items/s':>8} {'util':>6} {'busy_s':>8} "
+             f"{'idle_s':>8} {'blocked_s':>9} {'q_max':>5} {'q_mean':>6}"]
+    for name, m in report["stages"].items():
+        lines.append(f"{name:<10} {m['workers']:>7} {m['processed']:>6} {m['per_s']:>8} {m['utilization']:>6.0%} "
+                     f"{m['busy_s']:>8} {m['idle_s']:>8} {m['blocked_s']:>9} {m['queue_max']:>5} "
+                     f"{m['queue_mean']:>6}")
+    return lines
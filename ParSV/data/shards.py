@@ -0,0 +1,263 @@
+"""
+按类别分片的数据集
+数据集目录结构:
+
+    <root>/manifest.json        # 版本、各分片的文件名、记录数与 mcid 列表
+    <root>/spellings.json       # 拼写 -> 所在分片列表
+    <root>/shards/<类别>.json    # 单个类别的记录（完整或紧凑格式，可带变更日志）
+
+只需要部分类别的任务按需加载分片，启动时间与内存随实际使用的类别增长，而不是随整个目录增长。
+写入时先原子替换分片文件，最后替换 manifest，读取方以 manifest 为准。
+"""
+
+import os
+import sys
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.utils import json_codec
+from ParSV.utils.file_utils import atomic_write_json, atomic_write_text
+from ParSV.data.antiparticle import compact_records
+from ParSV.data.categories import category_of, get_categories
+from ParSV.data.change_journal import ChangeJournal
+from ParSV.Usage.spelling_index import SpellingIndex, MATCH_KINDS, KIND_TYPO, iter_spellings
+
+MANIFEST_NAME = "manifest.json"
+SPELLINGS_NAME = "spellings.json"
+SHARD_DIR = "shards"
+
+
+def manifest_path(root: str) -> str:
+    return os.path.join(str(root), MANIFEST_NAME)
+
+
+def is_sharded(path: str) -> bool:
+    """路径是否为分片数据集目录"""
+    return os.path.isdir(str(path)) and os.path.exists(manifest_path(path))
+
+
+def split_records(records: Iterable[Dict]) -> Dict[str, List[Dict]]:
+    """按类别拆分记录，类别按标准顺序，类别内保持原有顺序"""
+    shards: Dict[str, List[Dict]] = {category: [] for category in get_categories()}
+    for item in records:
+        shards[category_of(item.get('mcid', 0))].append(item)
+    return {category: items for category, items in shards.items() if items}
+
+
+def _record_spellings(item: Dict) -> Iterable[str]:
+    for spelling, _ in iter_spellings(item):
+        yield spelling
+
+
+class ShardedDataset:
+    """分片数据集，分片在首次访问时加载并缓存"""
+
+    def __init__(self, root: str):
+        self.root = str(root)
+        self.manifest = json_codec.load_file(manifest_path(self.root))
+        self._spellings: Optional[Dict[str, List[str]]] = None
+        self._mcid_shards: Optional[Dict[int, str]] = None
+        self._shards: Dict[str, List[Dict]] = {}
+        self._indexes: Dict = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ #
+    # 元数据
+    # ------------------------------------------------------------------ #
+    @property
+    def categories(self) -> List[str]:
+        return list(self.manifest.get("shards", {}))
+
+    @property
+    def loaded_categories(self) -> List[str]:
+        return list(self._shards)
+
+    def shard_file(self, category: str) -> str:
+        info = self.manifest.get("shards", {}).get(category)
+        file_name = info["file"] if info else os.path.join(SHARD_DIR, f"{category}.json")
+        return os.path.join(self.root, file_name)
+
+    def shard_of_mcid(self, mcid: int) -> Optional[str]:
+        """mcid 所在分片，数据集中不存在时返回 None（mcid -> 分片 的索引由 manifest 构建一次）"""
+        mcid_shards = self._mcid_shards
+        if mcid_shards is None:
+            mcid_shards = {m: category for category, info in self.manifest.get("shards", {}).items()
+                           for m in info.get("mcids", [])}
+            self._mcid_shards = mcid_shards
+        return mcid_shards.get(mcid)
+
+    def find_mcid(self, mcid: int) -> Dict:
+        """按 mcid 查找记录，只加载其所在分片；未找到返回空字典"""
+        category = self.shard_of_mcid(mcid)
+        if category is None:
+            return {}
+        return next((item for item in self.load_shard(category) if item.get('mcid') == mcid), {})
+
+    def shards_for_spelling(self, name: str) -> List[str]:
+        """包含该拼写的分片列表（不加载分片）"""
+        if self._spellings is None:
+            with self._lock:
+                if self._spellings is None:
+                    self._spellings = json_codec.load_file(os.path.join(self.root, SPELLINGS_NAME))
+        return self._spellings.get(name, [])
+
+    # ------------------------------------------------------------------ #
+    # 读取
+    # ------------------------------------------------------------------ #
+    def load_shard(self, category: str) -> List[Dict]:
+        """加载单个分片（展开紧凑格式并重放其变更日志），结果缓存"""
+        records = self._shards.get(category)
+        if records is None:
+            with self._lock:
+                records = self._shards.get(category)
+                if records is None:
+                    if category not in self.manifest.get("shards", {}):
+                        raise KeyError(f"Unknown shard `{category}` in {self.root}")
+                    records = ChangeJournal(self.shard_file(category)).load()
+                    self._shards[category] = records
+        return records
+
+    def load(self, categories: Optional[Sequence[str]] = None) -> List[Dict]:
+        """加载给定类别（默认全部）的记录，按类别的标准顺序拼接，与单文件数据集的顺序一致"""
+        records = []
+        for category in self.categories:
+            if categories is None or category in categories:
+                records.extend(self.load_shard(category))
+        return records
+
+    def release(self, category: str):
+        """释放已加载的分片，逐个分片处理时控制内存"""
+        with self._lock:
+            self._shards.pop(category, None)
+            self._indexes.pop(category, None)
+
+    def _shard_index(self, category: str) -> SpellingIndex:
+        index = self._indexes.get(category)
+        if index is None:
+            index = SpellingIndex.build(self.load_shard(category), source=self.shard_file(category))
+            self._indexes[category] = index
+        return index
+
+    def find_record(self, name: str, kinds: Sequence[int] = MATCH_KINDS) -> Dict:
+        """按任意拼写查找记录，只加载包含该拼写的分片；未找到返回空字典"""
+        best, best_key = {}, None
+        for order, category in enumerate(self.shards_for_spelling(name)):
+            index = self._shard_index(category)
+            for idx, kind in index.lookup_all(name):
+                if kind not in kinds:
+                    continue
+                key = (kind == KIND_TYPO, order)
+                if best_key is None or key < best_key:
+                    best, best_key = index.get_record(idx), key
+                break
+        return best
+
+    # ------------------------------------------------------------------ #
+    # 写入
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def create(cls, root: str, records: Iterable[Dict], compact: bool = False) -> "ShardedDataset":
+        """将完整数据集拆分写入目录，已存在的分片数据集会被覆盖"""
+        os.makedirs(os.path.join(str(root), SHARD_DIR), exist_ok=True)
+        shards = split_records(records)
+        manifest = {"version": 1, "compact": compact, "shards": {}}
+        for category, items in shards.items():
+            file_name = os.path.join(SHARD_DIR, f"{category}.json")
+            atomic_write_json(os.path.join(str(root), file_name), compact_records(items) if compact else items)
+            manifest["shards"][category] = cls._shard_info(file_name, items)
+        cls._write_metadata(str(root), manifest, shards)
+        return cls(root)
+
+    def save_shard(self, category: str, records: List[Dict], journal: bool = False):
+        """
+        替换单个分片并更新 manifest 与拼写索引。
+        journal=True 时只将变化的记录追加到分片的变更日志
+        """
+        file_name = os.path.join(SHARD_DIR, f"{category}.json")
+        shard_file = os.path.join(self.root, file_name)
+        shard_journal = ChangeJournal(shard_file)
+        if journal and os.path.exists(shard_file):
+            shard_journal.record_diff(shard_journal.load(), records)
+        else:
+            os.makedirs(os.path.dirname(shard_file), exist_ok=True)
+            compact = self.manifest.get("compact", False)
+            atomic_write_json(shard_file, compact_records(records) if compact else records)
+            if shard_journal.exists():
+                atomic_write_text(shard_journal.journal_file, "")
+        with self._lock:
+            self._shards[category] = list(records)
+            self._indexes.pop(category, None)
+            self.manifest["shards"][category] = self._shard_info(file_name, records)
+            self._mcid_shards = None
+            self._update_spellings(category, records)
+            self._write_metadata(self.root, self.manifest, None, self._spellings)
+
+    @staticmethod
+    def _shard_info(file_name: str, records: List[Dict]) -> Dict:
+        return {"file": file_name, "count": len(records),
+                "mcids": [item.get('mcid') for item in records]}
+
+    def _update_spellings(self, category: str, records: List[Dict]):
+        if self._spellings is None:
+            self._spellings = json_codec.load_file(os.path.join(self.root, SPELLINGS_NAME))
+        for spelling in list(self._spellings):
+            shards = [c for c in self._spellings[spelling] if c != category]
+            if shards:
+                self._spellings[spelling] = shards
+            else:
+                del self._spellings[spelling]
+        for item in records:
+            for spelling in _record_spellings(item):
+                shards = self._spellings.setdefault(spelling, [])
+                if category not in shards:
+                    shards.append(category)
+
+    @staticmethod
+    def _write_metadata(root: str, manifest: Dict, shards: Optional[Dict[str, List[Dict]]] = None,
+                        spellings: Optional[Dict[str, List[str]]] = None):
+        """写入拼写索引与 manifest，manifest 最后替换"""
+        if spellings is None:
+            spellings = {}
+            for category, items in shards.items():
+                for item in items:
+                    for spelling in _record_spellings(item):
+                        entry = spellings.setdefault(spelling, [])
+                        if category not in entry:
+                            entry.append(category)
+        categories = get_categories()
+        manifest["shards"] = dict(sorted(manifest["shards"].items(), key=lambda kv: categories.index(kv[0])))
+        atomic_write_json(os.path.join(root, SPELLINGS_NAME), spellings, pretty=False)
+        atomic_write_json(manifest_path(root), manifest)
+
+
+def load_sharded_dataset(root: str, categories: Optional[Sequence[str]] = None) -> List[Dict]:
+    """读取分片数据集（默认全部类别）"""
+    return ShardedDataset(root).load(categories)
+
+
+if __name__ == "__main__":
+    import time
+    from ParSV.data.change_journal import load_dataset
+
+    data_file = sys.argv[1] if len(sys.argv) > 1 else f"{here}/particle_variants.json"
+    root = sys.argv[2] if len(sys.argv) > 2 else f"{here}/particle_variants_shards"
+    records = load_dataset(data_file)
+    dataset = ShardedDataset.create(root, records)
+    for category, info in dataset.manifest["shards"].items():
+        print(f"{category:>18}: {info['count']} records")
+
+    t0 = time.perf_counter()
+    dataset = ShardedDataset(root)
+    record = dataset.find_record("D0")
+    t1 = time.perf_counter()
+    print(f"find_record('D0') -> mcid={record.get('mcid')} in {(t1 - t0) * 1e3:.1f} ms, "
+          f"loaded shards: {dataset.loaded_categories}")
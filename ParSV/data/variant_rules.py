@@ -0,0 +1,335 @@
+"""
+基于规则的本地拼写变体引擎
+不依赖网络，确定性地生成大部分别名与拼写错误：
+希腊字母/拉丁名互换、电荷符号写法、LaTeX/HTML/Unicode 清理、反粒子 bar/anti 写法、
+键盘相邻键与相邻字符换位错误。LLM 只需补充规则无法生成的部分。
+传入全目录的 拼写 -> mcid 映射时，与其他粒子拼写相同的变体被丢弃（如 dd_1 的误触 "sd_1" 是另一个粒子）。
+"""
+
+import html
+import re
+import sys
+import unicodedata
+from typing import Collection, Dict, Iterable, List, Mapping, Optional, Sequence, Set
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+NAME_FIELDS = ['name', 'programmatic_name', 'latex_name',
+               'evtgen_name', 'html_name', 'unicode_name']
+# 标识符形式的名称（K_minus、anti-Lambda_c-），不做 $...$ 包裹与 _ 分隔符变换
+IDENTIFIER_FIELDS = ('programmatic_name', 'evtgen_name')
+
+GREEK_LETTERS = {
+    'alpha': 'α', 'beta': 'β', 'gamma': 'γ', 'Gamma': 'Γ', 'delta': 'δ', 'Delta': 'Δ',
+    'epsilon': 'ε', 'zeta': 'ζ', 'eta': 'η', 'theta': 'θ', 'Theta': 'Θ', 'kappa': 'κ',
+    'lambda': 'λ', 'Lambda': 'Λ', 'mu': 'μ', 'nu': 'ν', 'xi': 'ξ', 'Xi': 'Ξ',
+    'pi': 'π', 'Pi': 'Π', 'rho': 'ρ', 'sigma': 'σ', 'Sigma': 'Σ', 'tau': 'τ',
+    'Upsilon': 'Υ', 'phi': 'φ', 'Phi': 'Φ', 'chi': 'χ', 'psi': 'ψ', 'Psi': 'Ψ',
+    'omega': 'ω', 'Omega': 'Ω',
+}
+GREEK_TO_LATIN = {v: k for k, v in GREEK_LETTERS.items()}
+# 兼容字符：微符号与希腊字母 mu 同形
+GREEK_TO_LATIN['µ'] = 'mu'
+
+SUPERSCRIPTS = {'⁺': '+', '⁻': '-', '⁰': '0', '¹': '1', '²': '2', '³': '3', '⁴': '4',
+                '⁵': '5', '⁶': '6', '⁷': '7', '⁸': '8', '⁹': '9', '*': '*'}
+SUBSCRIPTS = {'₀': '0', '₁': '1', '₂': '2', '₃': '3', '₄': '4', '₅': '5',
+              '₆': '6', '₇': '7', '₈': '8', '₉': '9', '₊': '+', '₋': '-'}
+CHARGE_WORDS = {'++': 'plusplus', '--': 'minusminus', '+': 'plus', '-': 'minus', '0': 'zero'}
+CHARGE_SUPERSCRIPTS = {'++': '⁺⁺', '--': '⁻⁻', '+': '⁺', '-': '⁻', '0': '⁰'}
+
+# 标准 QWERTY 键盘的相邻键
+_KEYBOARD_ROWS = ['qwertyuiop', 'asdfghjkl', 'zxcvbnm']
+KEYBOARD_NEIGHBORS: Dict[str, str] = {}
+for _r, _row in enumerate(_KEYBOARD_ROWS):
+    for _c, _ch in enumerate(_row):
+        _near = []
+        for _dr in (0, -1, 1):
+            _rr = _r + _dr
+            if not 0 <= _rr < len(_KEYBOARD_ROWS):
+                continue
+            for _dc in ((-1, 1) if _dr == 0 else (0, 1, -1)):
+                _cc = _c + _dc
+                if 0 <= _cc < len(_KEYBOARD_ROWS[_rr]):
+                    _near.append(_KEYBOARD_ROWS[_rr][_cc])
+        KEYBOARD_NEIGHBORS[_ch] = ''.join(_near)
+
+_GREEK_NAME_RE = re.compile(
+    r'(?<![A-Za-z])(' + '|'.join(sorted(GREEK_LETTERS, key=len, reverse=True)) + r')(?![a-z])')
+_GREEK_CHAR_RE = re.compile('[' + ''.join(GREEK_TO_LATIN) + ']')
+_HTML_TAG_RE = re.compile(r'<\s*/?\s*(sup|sub|SUP|SUB|i|I|b|B)\s*>')
+_LATEX_BAR_RE = re.compile(r'\\(?:bar|overline)\{\\?([A-Za-z]+)\}')
+_LATEX_CMD_RE = re.compile(r'\\([A-Za-z]+)')
+_CHARGE_SUFFIX_RE = re.compile(r'^(.*?)(?:\^\{|\^|_)?(\+\+|--|\+|-|0)\}?$')
+_BAR_SUFFIX_RE = re.compile(r'^([A-Za-z]+?)(?:_bar|-bar|bar|~)(.*)$')
+_COMBINING_BAR = ('\u0304', '\u0305')
+
+
+def _unique(values: Iterable[str], exclude: Sequence[str] = ()) -> List[str]:
+    """按出现顺序去重并排除指定值"""
+    seen = set(exclude)
+    result = []
+    for v in values:
+        if v and v not in seen:
+            seen.add(v)
+            result.append(v)
+    return result
+
+
+def greek_swaps(text: str) -> List[str]:
+    """希腊字母与拉丁名称互换，如 Lambda_c+ <-> Λ_c+"""
+    variants = []
+    if _GREEK_NAME_RE.search(text):
+        variants.append(_GREEK_NAME_RE.sub(lambda m: GREEK_LETTERS[m.group(1)], text))
+    if _GREEK_CHAR_RE.search(text):
+        variants.append(_GREEK_CHAR_RE.sub(lambda m: GREEK_TO_LATIN[m.group(0)], text))
+    return variants
+
+
+def strip_html(text: str) -> str:
+    """去除 HTML 标签与实体，上划线实体转为 bar"""
+    text = text.replace('&#773;', 'bar').replace('&#772;', 'bar')
+    text = html.unescape(text)
+    return _HTML_TAG_RE.sub('', text)
+
+
+def strip_latex(text: str) -> List[str]:
+    """LaTeX 转纯文本，返回保留 ^/_ 与完全去除两种写法"""
+    text = text.strip('$')
+    text = _LATEX_BAR_RE.sub(lambda m: f"{m.group(1)}bar", text)
+    text = _LATEX_CMD_RE.sub(lambda m: m.group(1), text)
+    with_marks = text.replace('{', '').replace('}', '')
+    bare = with_marks.replace('^', '').replace('_', '')
+    return [with_marks, bare]
+
+
+def strip_unicode(text: str) -> str:
+    """Unicode 转 ASCII：希腊字母转名称，上下标转普通字符，组合上划线转 bar"""
+    chars = []
+    for ch in text:
+        if ch in _COMBINING_BAR:
+            chars.append('bar')
+        elif ch in SUPERSCRIPTS:
+            chars.append(SUPERSCRIPTS[ch])
+        elif ch in SUBSCRIPTS:
+            chars.append(SUBSCRIPTS[ch])
+        elif ch in GREEK_TO_LATIN:
+            chars.append(GREEK_TO_LATIN[ch])
+        elif ch == '−':
+            chars.append('-')
+        else:
+            chars.append(ch)
+    text = ''.join(chars)
+    return unicodedata.normalize('NFKC', text)
+
+
+def charge_variants(text: str) -> List[str]:
+    """电荷符号的不同写法: pi+ -> pi^+, pi^{+}, pi(+), piplus, pi_plus, pi⁺"""
+    m = _CHARGE_SUFFIX_RE.match(text)
+    if not m or not m.group(1) or not m.group(1)[-1].isalnum() and m.group(1)[-1] not in ')*':
+        return []
+    base, charge = m.group(1), m.group(2)
+    if charge == '0' and base[-1].isdigit():
+        return []
+    word = CHARGE_WORDS[charge]
+    return [
+        f"{base}{charge}",
+        f"{base}^{charge}",
+        f"{base}^{{{charge}}}",
+        f"{base}({charge})",
+        f"{base}{word}",
+        f"{base}_{word}",
+        f"{base}{CHARGE_SUPERSCRIPTS[charge]}",
+    ]
+
+
+def anti_variants(text: str) -> List[str]:
+    """反粒子 bar/anti 写法互换: anti-X <-> anti_X <-> Xbar <-> X_bar <-> X~"""
+    core = None
+    if text.startswith(('anti-', 'anti_')):
+        core = text[5:]
+    elif text.startswith('anti') and len(text) > 4 and text[4].isalpha():
+        core = text[4:]
+    if core is None:
+        m = _BAR_SUFFIX_RE.match(text)
+        if not m:
+            return []
+        lead, rest = m.group(1), m.group(2)
+        core = lead + rest
+    m = re.match(r'^([A-Za-z]+)(.*)$', core)
+    if not m:
+        return []
+    lead, rest = m.group(1), m.group(2)
+    return [
+        f"anti-{core}", f"anti_{core}", f"anti{core}",
+        f"{lead}bar{rest}", f"{lead}_bar{rest}", f"{lead}~{rest}",
+    ]
+
+
+def transposition_typos(text: str) -> List[str]:
+    """相邻字母换位"""
+    typos = []
+    for i in range(len(text) - 1):
+        a, b = text[i], text[i + 1]
+        if a != b and a.isalpha() and b.isalpha():
+            typos.append(text[:i] + b + a + text[i + 2:])
+    return typos
+
+
+def keyboard_typos(text: str) -> List[str]:
+    """键盘相邻键误触（每个字母位置取第一个相邻键，保持确定性）"""
+    typos = []
+    for i, ch in enumerate(text):
+        near = KEYBOARD_NEIGHBORS.get(ch.lower())
+        if not near:
+            continue
+        sub = near[0].upper() if ch.isupper() else near[0]
+        typos.append(text[:i] + sub + text[i + 1:])
+    return typos
+
+
+def build_catalogue(records: Iterable[Dict], fields: Sequence[str] = tuple(NAME_FIELDS) + ('aliases',)
+                    ) -> Dict[str, Set[int]]:
+    """全目录的 拼写 -> mcid 集合（名称字段与别名，不含拼写错误）"""
+    catalogue: Dict[str, Set[int]] = {}
+    for record in records:
+        mcid = record.get('mcid')
+        if mcid is None:
+            continue
+        for f in fields:
+            values = record.get(f)
+            for value in (values if isinstance(values, list) else [values]):
+                if value:
+                    catalogue.setdefault(str(value), set()).add(mcid)
+    return catalogue
+
+
+def owned_by_other(spelling: str, mcid: int, catalogue: Optional[Mapping[str, Collection[int]]]) -> bool:
+    """拼写在目录中只属于其他粒子（本粒子已有的拼写即使与其他粒子重复也不在此丢弃，由碰撞检查报告）"""
+    if not catalogue:
+        return False
+    owners = catalogue.get(spelling)
+    return bool(owners) and mcid not in owners
+
+
+def _spread(values: List[str], limit: int) -> List[str]:
+    """从列表中均匀抽取 limit 个元素，保证各位置的错误都有代表"""
+    if len(values) <= limit:
+        return values
+    step = len(values) / limit
+    return [values[int(i * step)] for i in range(limit)]
+
+
+class RuleBasedVariantEngine:
+    """确定性的本地变体生成引擎"""
+
+    def __init__(self, max_aliases: int = 16, max_typos: int = 8):
+        self.max_aliases = max_aliases
+        self.max_typos = max_typos
+
+    @staticmethod
+    def plain_forms(spelling: str) -> List[str]:
+        """去除 HTML/LaTeX/Unicode 标记后的纯文本写法"""
+        if not spelling:
+            return []
+        plain = []
+        if '<' in spelling or '&' in spelling:
+            plain.append(strip_html(spelling))
+        elif '\\' in spelling or '$' in spelling or '{' in spelling:
+            plain.extend(strip_latex(spelling))
+        else:
+            plain.append(spelling)
+        plain = [strip_unicode(p) if not p.isascii() else p for p in plain] + \
+                [p for p in plain if not p.isascii()]
+        return _unique(p.strip() for p in plain)
+
+    @staticmethod
+    def _staged_variants(plain: str, display: bool = True) -> List[List[str]]:
+        """
+        按优先级分组的变体：希腊字母 -> 电荷与反粒子写法 -> 分隔符与 LaTeX 包裹；
+        分隔符与包裹只用于显示名称，标识符（display=False）中的 _ 是名称的一部分
+        """
+        separators = [plain.replace('_', ''), plain.replace('_', '-')] if display and '_' in plain else []
+        wrapped = [f"${plain}$"] if display and plain.isascii() else []
+        return [
+            greek_swaps(plain),
+            charge_variants(plain) + anti_variants(plain),
+            separators + wrapped,
+        ]
+
+    def alias_variants(self, spelling: str) -> List[str]:
+        """单个拼写的别名变体"""
+        plain = self.plain_forms(spelling)
+        variants = list(plain)
+        for p in plain:
+            for stage in self._staged_variants(p):
+                variants.extend(stage)
+        return _unique(variants)
+
+    def typo_variants(self, spelling: str) -> List[str]:
+        """单个拼写的拼写错误"""
+        if not spelling or not spelling.isascii() or len(spelling) < 3:
+            return []
+        return _unique(transposition_typos(spelling) + keyboard_typos(spelling))
+
+    def generate(self, record: Dict,
+                 catalogue: Optional[Mapping[str, Collection[int]]] = None) -> Dict[str, List[str]]:
+        """
+        为一条记录生成 aliases 与 typo，排除主字段取值并去重；
+        catalogue 为全目录的 拼写 -> mcid 集合（见 build_catalogue），属于其他粒子的变体被丢弃
+        """
+        primary = [str(record[f]) for f in NAME_FIELDS if record.get(f)]
+        mcid = record.get('mcid')
+
+        # 先收集各字段的纯文本写法，再按阶段追加变换，避免截断时只保留单一字段的变体；
+        # 同一写法既来自显示名称又来自标识符时按显示名称处理
+        display = {p for f in NAME_FIELDS if record.get(f) and f not in IDENTIFIER_FIELDS
+                   for p in self.plain_forms(str(record[f]))}
+        plains = _unique(p for value in primary for p in self.plain_forms(value))
+        stages = [self._staged_variants(p, p in display) for p in plains]
+        aliases = list(plains)
+        for level in range(3):
+            for staged in stages:
+                aliases.extend(staged[level])
+        aliases = [a for a in _unique(aliases, exclude=primary)
+                   if not owned_by_other(a, mcid, catalogue)][:self.max_aliases]
+
+        typo_sources = _unique(str(record[f]) for f in ('name', 'evtgen_name', 'programmatic_name')
+                               if record.get(f))
+        typos = []
+        for value in typo_sources:
+            typos.extend(self.typo_variants(value))
+        typos = [t for t in _unique(typos, exclude=primary + aliases) if not owned_by_other(t, mcid, catalogue)]
+        return {"aliases": aliases, "typo": _spread(typos, self.max_typos)}
+
+    def generate_all(self, records: Sequence[Dict]) -> List[Dict[str, List[str]]]:
+        """为一组记录生成变体，以这组记录本身作为目录"""
+        catalogue = build_catalogue(records, NAME_FIELDS)
+        return [self.generate(record, catalogue) for record in records]
+
+
+if __name__ == "__main__":
+    import json
+    import time
+
+    with open(f"{here}/particle_variants.json", "r", encoding="utf-8") as f:
+        records = json.load(f)
+
+    engine = RuleBasedVariantEngine()
+    t0 = time.perf_counter()
+    results = engine.generate_all(records)
+    t1 = time.perf_counter()
+    n_aliases = sum(len(r["aliases"]) for r in results)
+    n_typos = sum(len(r["typo"]) for r in results)
+    print(f"Generated {n_aliases} aliases and {n_typos} typos for {len(records)} particles "
+          f"in {(t1 - t0) * 1e3:.1f} ms")
+
+    for record, result in list(zip(records, results))[::115]:
+        print(f"{record['name']}: {json.dumps(result, ensure_ascii=False)}")
@@ -3,9 +3,18 @@
 """
 
 from .string_utils import fix_json_string, safe_json_loads, normalize_particle_name
+from .incremental_json import IncrementalJSONParser, parse_json_tolerant
+from . import json_codec
+from .file_utils import atomic_write_bytes, atomic_write_text, atomic_write_json
 
 __all__ = [
     'fix_json_string',
     'safe_json_loads', 
-    'normalize_particle_name'
+    'normalize_particle_name',
+    'IncrementalJSONParser',
+    'parse_json_tolerant',
+    'json_codec',
+    'atomic_write_bytes',
+    'atomic_write_text',
+    'atomic_write_json',
 ]
\ No newline at end of file
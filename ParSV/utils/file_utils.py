@@ -0,0 +1,59 @@
+"""
+崩溃安全的文件写入工具
+先写入同目录临时文件并 fsync，再 os.replace 原子替换目标文件并 fsync 目录，
+中途崩溃时目标文件要么是旧内容、要么是完整的新内容。
+"""
+
+import os
+import tempfile
+from typing import Any
+
+from .json_codec import dumpb
+
+
+def fsync_dir(dir_path: str):
+    """同步目录项，确保 rename 持久化（不支持目录 fsync 的平台上忽略）"""
+    try:
+        fd = os.open(dir_path or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(file_path: str, data: bytes):
+    """原子写入二进制内容"""
+    file_path = os.fspath(file_path)
+    dir_path = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(file_path)}.", suffix=".tmp", dir=dir_path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(file_path):
+            os.chmod(tmp_path, os.stat(file_path).st_mode & 0o777)
+        else:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    fsync_dir(dir_path)
+
+
+def atomic_write_text(file_path: str, text: str, encoding: str = "utf-8"):
+    """原子写入文本内容"""
+    atomic_write_bytes(file_path, text.encode(encoding))
+
+
+def atomic_write_json(file_path: str, data: Any, pretty: bool = True):
+    """原子写入 JSON 文件，pretty=False 时输出紧凑格式"""
+    atomic_write_bytes(file_path, dumpb(data, pretty=pretty))
@@ -0,0 +1,169 @@
+"""
+增量容错JSON解析模块
+随流式输出逐块扫描JSON，跟踪括号栈与字符串状态，在顶层必需键全部完成时提前结束；
+最终解析时对截断或格式不规范的内容进行修复，并记录具体的修复项。
+"""
+
+import json
+import re
+from typing import Any, List, Optional, Sequence, Tuple
+
+from .string_utils import fix_json_string
+
+_DANGLING_KEY_RE = re.compile(r',?\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+_TRAILING_COMMA_RE = re.compile(r',\s*$')
+
+
+class IncrementalJSONParser:
+    """逐块输入的JSON扫描器，扫描为线性复杂度，不重复处理已输入的字符"""
+
+    def __init__(self, required_keys: Sequence[str] = ()):
+        self.required_keys = set(required_keys)
+        self.completed_keys = set()
+        self.buffer = ""
+        self._pos = 0
+        self._root_start = -1
+        self._root_end = -1
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._expect_key = False
+        self._current_key: Optional[str] = None
+
+    @property
+    def complete(self) -> bool:
+        """顶层对象/数组已闭合"""
+        return self._root_end >= 0
+
+    @property
+    def done(self) -> bool:
+        """顶层已闭合或必需键均已完成，可提前停止读取"""
+        return self.complete or (bool(self.required_keys) and self.required_keys <= self.completed_keys)
+
+    def _complete_value(self):
+        if len(self._stack) == 1 and self._stack[0] == '{' and self._current_key is not None:
+            self.completed_keys.add(self._current_key)
+            self._current_key = None
+
+    def feed(self, chunk: str) -> bool:
+        """输入一段文本，返回是否可以提前停止"""
+        if self.complete or not chunk:
+            return self.done
+        self.buffer += chunk
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._root_start < 0:
+                # 跳过 ```json 等前缀，直到遇到顶层括号
+                if ch in '{[':
+                    self._root_start = i
+                    self._stack.append(ch)
+                    self._expect_key = ch == '{'
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._expect_key and len(self._stack) == 1:
+                        try:
+                            self._current_key = json.loads(buf[self._string_start:i + 1])
+                        except json.JSONDecodeError:
+                            self._current_key = buf[self._string_start + 1:i]
+                    elif not self._expect_key:
+                        self._complete_value()
+                    self._expect_key = False
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in '{[':
+                self._stack.append(ch)
+                self._expect_key = ch == '{'
+            elif ch in '}]':
+                if self._stack:
+                    self._stack.pop()
+                if not self._stack:
+                    self._root_end = i
+                    if self._current_key is not None:
+                        self.completed_keys.add(self._current_key)
+                    self._pos = i + 1
+                    return True
+                self._complete_value()
+                self._expect_key = False
+            elif ch == ',':
+                self._complete_value()
+                self._expect_key = self._stack[-1] == '{'
+            elif ch == ':':
+                self._expect_key = False
+        self._pos = len(buf)
+        return self.done
+
+    def result(self) -> Tuple[Any, List[str]]:
+        """返回 (解析结果, 修复项列表)，无法解析时结果为 None"""
+        value, repairs = self._parse()
+        if isinstance(value, dict) and self.required_keys:
+            missing = sorted(k for k in self.required_keys if k not in value)
+            if missing:
+                repairs.append(f"missing_keys: {missing}")
+        return value, repairs
+
+    def _parse(self) -> Tuple[Any, List[str]]:
+        repairs: List[str] = []
+        if self._root_start < 0:
+            return None, ["no_json_found"]
+
+        # 必需键完成后主动停止读取时，补全括号属于正常流程，不计为修复
+        early_stop = self.done and not self.complete
+
+        def repaired(label: str):
+            if not early_stop:
+                repairs.append(label)
+
+        if self.complete:
+            text = self.buffer[self._root_start:self._root_end + 1]
+        else:
+            text = self.buffer[self._root_start:]
+            repaired("truncated")
+        try:
+            return json.loads(text), repairs
+        except json.JSONDecodeError:
+            pass
+
+        if not self.complete:
+            if self._in_string:
+                text += '"'
+                repaired("unterminated_string")
+            # 丢弃没有值的末尾键以及末尾逗号
+            stripped = text.rstrip()
+            if stripped.endswith(':') or (self._stack and self._stack[-1] == '{' and self._expect_key):
+                stripped = _DANGLING_KEY_RE.sub('', stripped)
+                repaired("dangling_key")
+            stripped = _TRAILING_COMMA_RE.sub('', stripped)
+            closers = ''.join('}' if b == '{' else ']' for b in reversed(self._stack))
+            text = stripped + closers
+            if closers:
+                repaired("unclosed_brackets")
+            try:
+                return json.loads(text), repairs
+            except json.JSONDecodeError:
+                pass
+
+        fixed = fix_json_string(text)
+        try:
+            value = json.loads(fixed)
+            repairs.append("fix_json_string")
+            return value, repairs
+        except json.JSONDecodeError as e:
+            repairs.append(f"unparseable: {e}")
+            return None, repairs
+
+
+def parse_json_tolerant(text: str, required_keys: Sequence[str] = ()) -> Tuple[Any, List[str]]:
+    """一次性解析完整文本，返回 (结果, 修复项列表)"""
+    parser = IncrementalJSONParser(required_keys)
+    parser.feed(text or "")
+    return parser.result()
@@ -0,0 +1,95 @@
+"""
+可插拔 JSON 编解码
+依次尝试 orjson、msgspec，均未安装时回退到标准库 json；可通过环境变量 PARSV_JSON_BACKEND 指定。
+compact 模式（默认）用于机器读取的产物，pretty 模式（2 空格缩进、保留非 ASCII 字符）用于入库的数据集，
+两种后端的 pretty 输出与 json.dump(..., ensure_ascii=False, indent=2) 一致。
+"""
+
+import json
+import os
+from typing import Any, Union
+
+BACKEND_ENV = "PARSV_JSON_BACKEND"
+BACKENDS = ("orjson", "msgspec", "json")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _select_backend() -> str:
+    available = {"orjson": orjson is not None, "msgspec": msgspec is not None, "json": True}
+    requested = os.environ.get(BACKEND_ENV, "").strip().lower()
+    if requested:
+        if requested not in BACKENDS:
+            raise ValueError(f"Unknown JSON backend `{requested}`, available: {BACKENDS}")
+        if available[requested]:
+            return requested
+    return next(name for name in BACKENDS if available[name])
+
+
+BACKEND = _select_backend()
+
+if BACKEND == "msgspec":
+    _msgspec_encoder = msgspec.json.Encoder()
+    _msgspec_decoder = msgspec.json.Decoder()
+
+
+def _default(obj: Any) -> Any:
+    """后端无法直接编码的类型：numpy 标量/数组、集合等"""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumpb(obj: Any, pretty: bool = False) -> bytes:
+    """编码为 UTF-8 字节串"""
+    if BACKEND == "orjson":
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    if BACKEND == "msgspec":
+        try:
+            data = _msgspec_encoder.encode(obj)
+        except TypeError:
+            data = msgspec.json.encode(obj, enc_hook=_default)
+        return msgspec.json.format(data, indent=2) if pretty else data
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=_default).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def dumps(obj: Any, pretty: bool = False) -> str:
+    """编码为字符串"""
+    return dumpb(obj, pretty=pretty).decode("utf-8")
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """解码 JSON 文本或字节串；格式错误时统一抛出 json.JSONDecodeError"""
+    if BACKEND == "orjson":
+        return orjson.loads(data)  # orjson.JSONDecodeError 是 json.JSONDecodeError 的子类
+    if BACKEND == "msgspec":
+        try:
+            return _msgspec_decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise json.JSONDecodeError(str(e), "", 0) from None
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode("utf-8")
+    return json.loads(data)
+
+
+def load_file(file_path: str) -> Any:
+    """读取 JSON 文件"""
+    with open(file_path, "rb") as f:
+        return loads(f.read())
@@ -1,9 +1,11 @@
 
 
 
+import threading
+import time
 from dataclasses import dataclass, field
 from pydantic import BaseModel, field_validator
-from typing import Dict, Union, Literal, List, Optional, Any
+from typing import Dict, Union, Literal, List, Optional, Any, Tuple
 
 
 class BranchingFractionVO(BaseModel):
@@ -17,10 +19,87 @@ class BranchingFractionVO(BaseModel):
     is_limit: Optional[bool] = None
     confidence_level: Optional[float] = None
     decay_products: Optional[List[str]] = None
+    decay_product_mcids: Optional[List[Optional[int]]] = None  # 与 decay_products 一一对应，无法唯一确定时为 None
+
+
+# PDG 条目沿 pdgitem_map 传递解析到粒子（"phi" -> "phi(1020)" -> 333），取最少跳数处的粒子；
+# 指向多个粒子的泛称（"K"、"nu"）不收录。max_depth 防止映射成环
+_ITEM_MCID_QUERY = """
+WITH RECURSIVE reach(item_id, target_id, depth) AS (
+    SELECT id, id, 0 FROM pdgitem
+    UNION
+    SELECT r.item_id, m.target_id, r.depth + 1 FROM reach r
+    JOIN pdgitem_map m ON m.pdgitem_id = r.target_id WHERE r.depth < :max_depth
+)
+SELECT i.name, r.depth, p.mcid FROM reach r
+JOIN pdgitem i ON i.id = r.item_id
+JOIN pdgparticle p ON p.pdgitem_id = r.target_id
+WHERE p.mcid IS NOT NULL
+"""
+ITEM_MAP_MAX_DEPTH = 8
+ITEM_MCIDS_RETRY = 60.0  # 查询失败后多少秒内直接返回空映射，不再重试
+
+_item_mcids_lock = threading.Lock()
+_item_mcids_cache: Dict[str, Tuple[float, Dict[str, int]]] = {}  # 版本 -> (失效时间, 映射)，成功的结果不失效
+_item_mcids_listening = False
+
+
+def _query_item_mcids(api) -> Dict[str, int]:
+    from sqlalchemy import text
+
+    nearest: Dict[str, Tuple[int, set]] = {}
+    with api.engine.connect() as conn:
+        for name, depth, mcid in conn.execute(text(_ITEM_MCID_QUERY), {"max_depth": ITEM_MAP_MAX_DEPTH}):
+            best = nearest.get(name)
+            if best is None or depth < best[0]:
+                nearest[name] = (depth, {int(mcid)})
+            elif depth == best[0]:
+                best[1].add(int(mcid))
+    return {name: mcids.pop() for name, (_, mcids) in nearest.items() if len(mcids) == 1}
+
+
+def _drop_item_mcids(edition: str):
+    with _item_mcids_lock:
+        _item_mcids_cache.pop(edition, None)
+
+
+def get_pdg_item_mcids(edition: Optional[str] = None) -> Dict[str, int]:
+    """PDG 条目名 -> mcid 的映射，每个进程每个 PDG 版本只查询一次数据库；失败时抛出异常，ITEM_MCIDS_RETRY 秒内不再重试"""
+    global _item_mcids_listening
+    from ParSV.Usage import pdg_editions
+
+    editions = pdg_editions.get_pdg_editions()
+    key = editions.resolve(edition)
+    with _item_mcids_lock:
+        cached = _item_mcids_cache.get(key)
+        if not _item_mcids_listening:
+            editions.add_evict_listener(_drop_item_mcids)
+            _item_mcids_listening = True
+    if cached is not None and time.monotonic() < cached[0]:
+        return cached[1]
+    try:
+        item_mcids = _query_item_mcids(editions.connect(edition))
+        expires = float("inf")
+    except Exception:
+        with _item_mcids_lock:
+            _item_mcids_cache[key] = (time.monotonic() + ITEM_MCIDS_RETRY, {})
+        raise
+    with _item_mcids_lock:
+        _item_mcids_cache[key] = (expires, item_mcids)
+    return item_mcids
+
+
+def _item_mcids(edition: Optional[str] = None) -> Dict[str, int]:
+    try:
+        return get_pdg_item_mcids(edition)
+    except Exception:
+        return {}
 
 
-def convert_pdg_branching_fraction(pdg_bf):
-    """将 PdgBranchingFraction 对象转换为可序列化的字典"""
+def convert_pdg_branching_fraction(pdg_bf, edition: Optional[str] = None):
+    """将 PdgBranchingFraction 对象转换为可序列化的字典，已转换的字典原样返回；edition 为衰变产物 mcid 所用的 PDG 版本"""
+    if isinstance(pdg_bf, dict):
+        return pdg_bf
     try:
         decay_products = []
         if hasattr(pdg_bf, 'decay_products') and pdg_bf.decay_products:
@@ -35,6 +114,8 @@ def convert_pdg_branching_fraction(pdg_bf):
                         decay_products.append(item_str)
                 else:
                     decay_products.append(str(product))
+        item_mcids = _item_mcids(edition) if decay_products else {}
+        decay_product_mcids = [item_mcids.get(name) for name in decay_products]
 
         return BranchingFractionVO(
             description=getattr(pdg_bf, 'description', ''),
@@ -45,7 +126,8 @@ def convert_pdg_branching_fraction(pdg_bf):
             units=getattr(pdg_bf, 'units', None),
             is_limit=getattr(pdg_bf, 'is_limit', None),
             confidence_level=getattr(pdg_bf, 'confidence_level', None),
-            decay_products=decay_products if decay_products else None
+            decay_products=decay_products if decay_products else None,
+            decay_product_mcids=decay_product_mcids if decay_products else None,
         ).model_dump()
     except Exception as e:
         # 如果转换失败，返回一个基本的表示
@@ -66,7 +148,7 @@ def convert_generator_to_list(gen):
             return None
     return gen if isinstance(gen, list) else None
 
-def convert_branching_fractions_list(bf_list):
+def convert_branching_fractions_list(bf_list, edition: Optional[str] = None):
     """转换分支比列表，处理生成器或列表输入"""
     if bf_list is None:
         return None
@@ -78,7 +160,7 @@ def convert_branching_fractions_list(bf_list):
 
     converted_list = []
     for bf in bf_list:
-        converted = convert_pdg_branching_fraction(bf)
+        converted = convert_pdg_branching_fraction(bf, edition)
         converted_list.append(converted)
 
     return converted_list
@@ -137,6 +219,10 @@ class ParticleVO(BaseModel):
     has_lifetime_entry: Optional[bool] = None
     has_mass_entry: Optional[bool] = None
     has_width_entry: Optional[bool] = None
+
+    # PDG 超时或熔断时只含本地数据，missing_fields 列出未能获取的字段
+    partial: bool = False
+    missing_fields: List[str] = []
     
     
     # @field_validator('branching_fractions', mode='before')
@@ -0,0 +1,47 @@
+"""
+管理接口的权限校验
+管理员为 worker `permissions` 配置中的 owner 与 users；调用者身份来自 HepAI 网关转发的请求上下文。
+"""
+
+from typing import Dict, Optional, Set, Union
+
+try:
+    from hepai.tools.request_context import get_remote_call_context
+except ImportError:  # 旧版本 hepai 没有请求上下文
+    get_remote_call_context = None
+
+
+def parse_admins(permissions: Optional[Union[str, Dict]]) -> Set[str]:
+    """从 'users: a, b; groups: g; owner: c' 或对应字典中解析管理员集合"""
+    if not permissions:
+        return set()
+    if isinstance(permissions, str):
+        perms = {}
+        for part in permissions.split(';'):
+            if ':' not in part:
+                continue
+            key, names = map(str.strip, part.split(':', 1))
+            perms[key] = [name.strip() for name in names.split(',') if name.strip()]
+    else:
+        perms = permissions
+
+    admins = set()
+    for key in ('owner', 'users'):
+        value = perms.get(key) or []
+        admins.update([value] if isinstance(value, str) else value)
+    return admins
+
+
+def require_admin(admins: Set[str]):
+    """
+    非管理员调用时抛出 PermissionError。
+    进程内直接调用（没有请求上下文）视为本地管理操作，允许执行。
+    """
+    if get_remote_call_context is None:
+        raise PermissionError("Admin methods require a hepai version with remote call context")
+    context = get_remote_call_context()
+    if context is None:
+        return
+    identities = {context.user_id, context.username, context.user_email, context.api_key_owner_id}
+    if not admins & {i for i in identities if i}:
+        raise PermissionError("This method is restricted to the worker owner and admin users")
@@ -0,0 +1,32 @@
+"""
+使用 json_codec 序列化 REST 响应
+包装 worker 的统一入口，将远程方法的返回值直接编码为 JSON 响应，跳过 FastAPI 的 jsonable_encoder
+与标准库编码；MCP 工具直接调用模型方法，不受影响。
+"""
+
+from typing import Any
+
+from starlette.responses import JSONResponse, Response
+
+from ParSV.utils import json_codec
+
+
+class CodecJSONResponse(JSONResponse):
+    """由 json_codec（orjson/msgspec/json）编码的紧凑 JSON 响应"""
+
+    def render(self, content: Any) -> bytes:
+        return json_codec.dumpb(content)
+
+
+def install_codec_responses(app) -> None:
+    """让 HWorkerAPP 的统一入口返回 CodecJSONResponse，流式与已构造的响应保持不变"""
+    worker = app.worker
+    unified_gate_async = worker.unified_gate_async
+
+    async def codec_unified_gate_async(*args, **kwargs):
+        result = await unified_gate_async(*args, **kwargs)
+        if isinstance(result, Response):
+            return result
+        return CodecJSONResponse(result)
+
+    worker.unified_gate_async = codec_unified_gate_async
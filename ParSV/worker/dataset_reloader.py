@@ -0,0 +1,292 @@
+"""
+数据集热更新
+在后台线程中重新读取 particle_variants.json（含变更日志），校验后构建新的拼写索引，
+再原子替换进程内的索引、属性表与提及抽取器，并只失效记录发生变化的 mcid 的响应缓存。
+可由文件监视线程（轮询 mtime/size）自动触发，也可由管理接口手动触发。
+多进程模式下热更新归 supervisor 所有：worker 只把请求转发给 supervisor，由它在独立进程中
+把快照、属性表与衰变产物倒排索引重建到新一代路径（build_generation），切换路径后滚动重启 worker，
+各 worker 因此始终 mmap 同一份快照；新启动的 worker 发现快照落后于数据文件时同样请求热更新。
+"""
+
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.Usage import spelling_index as _spelling_index
+from ParSV.Usage.spelling_index import SpellingIndex, DEFAULT_DATA_FILE
+from ParSV.Usage.property_table import PropertyTable, reload_property_table
+from ParSV.Usage.mention_extractor import reload_mention_extractors
+from ParSV.Usage.autocomplete import reload_suggesters
+from ParSV.Usage.decay_index import DecayIndex, reload_decay_index
+from ParSV.Usage.particle_record import ParticleRecordRegistry
+from ParSV.data.change_journal import dataset_signature, load_dataset
+
+# 多进程模式下由 supervisor 设置为热更新结果文件的路径；设置时 worker 不自行热更新
+SUPERVISOR_ENV = "PARSV_SUPERVISOR_STATUS"
+RELOAD_SIGNAL = signal.SIGHUP  # 请求 supervisor 热更新（数据文件未变化时跳过）
+FORCE_RELOAD_SIGNAL = signal.SIGUSR1  # 请求 supervisor 强制热更新
+
+
+def validate_records(records, previous_count: int = 0, min_ratio: float = 0.5) -> List[str]:
+    """校验新数据集，返回错误列表；记录数骤减（低于旧数据的 min_ratio）视为错误"""
+    if not isinstance(records, list):
+        return [f"Dataset should be a list of records, got {type(records).__name__}"]
+    errors = []
+    seen = set()
+    for i, item in enumerate(records):
+        if not isinstance(item, dict):
+            errors.append(f"Record {i} is not an object")
+            continue
+        mcid = item.get('mcid')
+        if not isinstance(mcid, int) or isinstance(mcid, bool):
+            errors.append(f"Record {i} has invalid mcid: {mcid!r}")
+        elif mcid in seen:
+            errors.append(f"Duplicate mcid {mcid} at record {i}")
+        else:
+            seen.add(mcid)
+        if not isinstance(item.get('name'), str) or not item['name']:
+            errors.append(f"Record {i} (mcid={mcid}) has no name")
+        for field in ('aliases', 'typo'):
+            if item.get(field) is not None and not isinstance(item[field], list):
+                errors.append(f"Record {i} (mcid={mcid}) field `{field}` should be a list")
+    if previous_count and len(records) < previous_count * min_ratio:
+        errors.append(f"Dataset shrank from {previous_count} to {len(records)} records")
+    return errors
+
+
+def diff_records(old_index: Optional[SpellingIndex], records: Sequence[Dict]) -> Set[int]:
+    """返回新增、删除或内容变化的 mcid"""
+    old = {} if old_index is None else {item.get('mcid'): item for item in old_index.iter_records()}
+    new = {item.get('mcid'): item for item in records}
+    changed = {mcid for mcid, item in new.items() if old.get(mcid) != item}
+    changed.update(mcid for mcid in old if mcid not in new)
+    return changed
+
+
+def load_validated(data_file: str,
+                   old_index: Optional[SpellingIndex],
+                   categories: Optional[Sequence[str]] = None) -> Tuple[Optional[SpellingIndex], List[Dict], List[str]]:
+    """读取、校验新数据集并构建内存索引，返回 (新索引, 记录, 错误)；有错误时新索引为 None"""
+    signature = dataset_signature(data_file)
+    try:
+        records = load_dataset(data_file, categories)
+    except (OSError, json.JSONDecodeError) as e:
+        return None, [], [f"Failed to read {data_file}: {e}"]
+    errors = validate_records(records, previous_count=len(old_index) if old_index is not None else 0)
+    if errors:
+        return None, records, errors[:20]
+    index = SpellingIndex.build(records, source=str(data_file), signature=signature)
+    unresolved = [item['name'] for item in records if index.lookup(item['name']) < 0]
+    if unresolved:
+        return None, records, [f"Names not resolvable in new index: {unresolved[:20]}"]
+    return index, records, []
+
+
+def build_generation(data_file: str,
+                     current: Dict[str, Optional[str]],
+                     target: Dict[str, str],
+                     categories: Optional[Sequence[str]] = None) -> Dict:
+    """
+    supervisor 热更新（在独立进程中执行）：校验新数据集，把快照、属性表与衰变产物倒排索引
+    增量重建到 target 中的新路径，current 为当前各文件的路径（衰变索引尚未构建时为 None）。
+    返回结果摘要，成功时 paths 为新路径
+    """
+    t0 = time.perf_counter()
+    result = {"status": "failed", "data_file": str(data_file)}
+    old_index = SpellingIndex.open(current["snapshot"])
+    index, records, errors = load_validated(data_file, old_index, categories)
+    if errors:
+        result["errors"] = errors
+    else:
+        changed = diff_records(old_index, records)
+        index.save(target["snapshot"])
+        index = SpellingIndex.open(target["snapshot"])
+        _spelling_index.set_spelling_index(index)  # 衰变道经默认拼写索引解析
+        paths = {"snapshot": target["snapshot"], "property_table": target["property_table"]}
+        PropertyTable.load(current["property_table"], index=old_index).rebuild(index, changed).save(paths["property_table"])
+        if current.get("decay_index") and os.path.exists(current["decay_index"]):
+            DecayIndex.load(current["decay_index"]).rebuild(index, changed).save(target["decay_index"], allow_incomplete=True)
+            paths["decay_index"] = target["decay_index"]
+        result.update({
+            "status": "reloaded",
+            "records": len(records),
+            "changed_mcids": sorted(changed),
+            "signature": index.signature,
+            "paths": paths,
+        })
+    result["elapsed_ms"] = round((time.perf_counter() - t0) * 1e3, 1)
+    result["finished_at"] = time.time()
+    return result
+
+
+class DatasetReloader:
+    """监视数据文件并在后台热更新进程内索引"""
+
+    def __init__(self,
+                 data_file: str = DEFAULT_DATA_FILE,
+                 cache: Optional[ParticleRecordRegistry] = None,
+                 poll_interval: float = 0.0,
+                 categories: Optional[Sequence[str]] = None):
+        """
+        Args:
+            cache: 需要按 mcid 失效的粒子记录表
+            poll_interval: 文件监视的轮询间隔（秒），<= 0 时不启动监视线程（由 supervisor 热更新时也不启动）
+            categories: 只加载这些类别（分片数据集只读取对应分片），None 为全部
+        """
+        self.data_file = str(data_file)
+        self.categories = list(categories) if categories else None
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self.last_result: Dict = {}
+        self._reload_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.status_file = os.environ.get(SUPERVISOR_ENV)
+        self._signature = self._loaded_signature()
+
+    @property
+    def supervised(self) -> bool:
+        """多进程模式：热更新由 supervisor 执行"""
+        return bool(self.status_file)
+
+    def _file_signature(self):
+        return dataset_signature(self.data_file)
+
+    def _loaded_signature(self):
+        """已加载数据的签名：使用共享快照时为快照构建时记录的签名（旧快照没有记录时视为最新）"""
+        if os.environ.get(_spelling_index.SNAPSHOT_ENV):
+            signature = getattr(_spelling_index.get_spelling_index(), "signature", None)
+            if signature is not None:
+                return signature
+        return self._file_signature()
+
+    def is_stale(self) -> bool:
+        """已加载的数据落后于数据文件"""
+        return self._file_signature() != self._signature
+
+    def _request_supervisor(self, force: bool) -> Dict:
+        """把热更新请求转发给 supervisor（父进程），完成后各 worker 会被滚动重启"""
+        os.kill(os.getppid(), FORCE_RELOAD_SIGNAL if force else RELOAD_SIGNAL)
+        return {"status": "requested", "owner": "supervisor", "data_file": self.data_file}
+
+    def reload(self, force: bool = False) -> Dict:
+        """
+        同步执行一次热更新，返回结果摘要。
+        force=False 时文件未变化则跳过；校验失败时保留当前数据集。
+        由 supervisor 热更新时只转发请求，结果见 status()
+        """
+        if self.supervised:
+            return self._request_supervisor(force)
+        with self._reload_lock:
+            t0 = time.perf_counter()
+            if not force and not self.is_stale():
+                return {"status": "unchanged", "data_file": self.data_file}
+
+            result = {"status": "failed", "data_file": self.data_file}
+            old_index = _spelling_index._default_index
+            index, records, errors = load_validated(self.data_file, old_index, self.categories)
+            if errors:
+                result["errors"] = errors
+                return self._finish(result, t0)
+
+            changed = diff_records(old_index, records)
+            # 先构建依赖新索引的派生结构，再统一替换
+            reload_property_table(index, changed)
+            reload_mention_extractors(index)
+            reload_suggesters(index)
+            _spelling_index.set_spelling_index(index)
+            invalidated = self.cache.invalidate(changed) if self.cache is not None else 0
+            # 衰变道经粒子记录表解析，须在失效变化的记录之后重建
+            reload_decay_index(index, changed)
+            self._signature = index.signature
+
+            result.update({
+                "status": "reloaded",
+                "records": len(records),
+                "changed_mcids": sorted(changed),
+                "invalidated_responses": invalidated,
+            })
+            return self._finish(result, t0)
+
+    def _finish(self, result: Dict, t0: float) -> Dict:
+        result["elapsed_ms"] = round((time.perf_counter() - t0) * 1e3, 1)
+        result["finished_at"] = time.time()
+        if result["status"] != "unchanged":
+            self.last_result = result
+            detail = result.get("errors") or f"{len(result.get('changed_mcids', []))} changed mcids"
+            print(f"[DatasetReloader] {result['status']}: {detail}", flush=True)
+        return result
+
+    def reload_in_background(self, force: bool = False) -> Dict:
+        """在后台线程执行热更新，已有更新在进行时直接返回"""
+        if self.supervised:
+            return self._request_supervisor(force)
+        if self._thread is not None and self._thread.is_alive():
+            return {"status": "in_progress", "data_file": self.data_file}
+        self._thread = threading.Thread(target=self.reload, kwargs={"force": force},
+                                        name="psv-dataset-reload", daemon=True)
+        self._thread.start()
+        return {"status": "started", "data_file": self.data_file}
+
+    def status(self) -> Dict:
+        status = {
+            "data_file": self.data_file,
+            "categories": self.categories,
+            "in_progress": self._thread is not None and self._thread.is_alive(),
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+            "stale": self.is_stale(),
+            "last_result": self.last_result,
+        }
+        if self.supervised:
+            status["owner"] = "supervisor"
+            status["last_result"] = read_status(self.status_file)
+        return status
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            if self.is_stale():
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"[DatasetReloader] reload error: {e}", flush=True)
+
+    def start(self):
+        """启动文件监视线程；快照已落后于数据文件时先请求热更新"""
+        if self.supervised:
+            if self.is_stale():
+                print("[DatasetReloader] snapshot is older than the data file, requesting reload", flush=True)
+                self._request_supervisor(force=False)
+            return
+        if self.is_stale():
+            self.reload_in_background()
+        if self.poll_interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="psv-dataset-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def read_status(status_file: str) -> Dict:
+    """读取 supervisor 写入的热更新结果，尚未热更新时为空"""
+    try:
+        with open(status_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
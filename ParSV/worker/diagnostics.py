@@ -0,0 +1,304 @@
+"""
+在线诊断
+供管理员远程方法按需开启的性能分析（全线程调用栈采样或 cProfile）与 tracemalloc 内存快照对比。
+未开启时不安装任何钩子、不运行后台线程，没有额外开销；会话只作用于接收到调用的 worker 进程。
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+PROFILE_MODES = ("sample", "cprofile")
+SORT_KEYS = ("cumulative", "self")
+GROUP_BY = ("lineno", "filename", "traceback")
+DEFAULT_INTERVAL = 0.005
+MAX_DURATION = 600.0
+MAX_LIMIT = 200
+
+# 叶子帧为这些函数的线程处于空闲等待（事件循环 select、条件变量、队列），不计入采样
+IDLE_FRAMES = frozenset({
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("socket.py", "accept"),
+})
+
+_ROOT = str(here.parent.parent) + os.sep
+_STDLIB = sysconfig.get_paths()["stdlib"] + os.sep
+
+
+def _short_path(path: str) -> str:
+    """仓库内文件取相对路径，第三方包从 site-packages 之后截取，标准库去掉安装路径"""
+    if path.startswith(_ROOT):
+        return path[len(_ROOT):]
+    _, sep, tail = path.rpartition("site-packages" + os.sep)
+    if sep:
+        return tail
+    return path[len(_STDLIB):] if path.startswith(_STDLIB) else path
+
+
+def _location(file: str, line: int, function: str) -> str:
+    return f"{_short_path(file)}:{line}({function})"
+
+
+class StackSampler:
+    """后台线程定时采样全部线程的调用栈，统计各函数的自身样本数（位于栈顶）与累计样本数（位于栈中）"""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, max_duration: float = MAX_DURATION):
+        self.interval = max(0.001, float(interval))
+        self.max_duration = min(float(max_duration), MAX_DURATION)
+        self.samples = 0
+        self.idle = 0
+        self._self: Counter = Counter()
+        self._total: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="parsv-profiler", daemon=True)
+        self.started = 0.0
+        self.stopped: Optional[float] = None
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = self.started + self.max_duration
+        while not self._stop.wait(self.interval):
+            if time.monotonic() > deadline:
+                break
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self._sample(frame)
+        self.stopped = time.monotonic()
+
+    def _sample(self, frame):
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            self.idle += 1
+            return
+        self.samples += 1
+        self._self[code] += 1
+        seen = set()
+        while frame is not None:
+            code = frame.f_code
+            if code not in seen:  # 递归调用只计一次
+                seen.add(code)
+                self._total[code] += 1
+            frame = frame.f_back
+
+    def stop(self, limit: int = 30, sort_by: str = "cumulative") -> Dict:
+        self._stop.set()
+        self._thread.join()
+        counter = self._total if sort_by == "cumulative" else self._self
+        samples = max(self.samples, 1)
+        rows = []
+        for code, _ in counter.most_common(limit):
+            rows.append({
+                "function": _location(code.co_filename, code.co_firstlineno, code.co_name),
+                "self": self._self[code],
+                "total": self._total[code],
+                "self_pct": round(100.0 * self._self[code] / samples, 2),
+                "total_pct": round(100.0 * self._total[code] / samples, 2),
+            })
+        return {"mode": "sample", "interval": self.interval, "duration": round(self.stopped - self.started, 3),
+                "samples": self.samples, "idle_samples": self.idle, "functions": rows}
+
+
+class CallProfiler:
+    """
+    cProfile 确定性分析，开销高于采样。记录开启它的线程（事件循环线程，同步远程方法在其中执行）
+    以及会话期间新建的线程（如 PDG 阶段线程），停止时合并统计
+    """
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+        self._thread = threading.get_ident()
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._active = False
+        self.started = 0.0
+
+    def _thread_hook(self, frame, event, arg):
+        """新线程的首个事件：换成该线程自己的 cProfile"""
+        sys.setprofile(None)
+        if self._active:
+            profile = cProfile.Profile()
+            self._thread_profiles.append(profile)
+            profile.enable()
+
+    def start(self):
+        self.started = time.monotonic()
+        self._active = True
+        threading.setprofile(self._thread_hook)
+        self._profile.enable()
+
+    def stop(self, limit: int = 30, sort_by: str = "cumulative") -> Dict:
+        if threading.get_ident() != self._thread:
+            raise RuntimeError("The cProfile session must be stopped from the thread that started it")
+        self._profile.disable()
+        self._active = False
+        threading.setprofile(None)
+        duration = time.monotonic() - self.started
+        stats = pstats.Stats(self._profile)
+        for profile in list(self._thread_profiles):
+            stats.add(profile)
+        entries = sorted(stats.stats.items(), key=lambda kv: kv[1][3] if sort_by == "cumulative" else kv[1][2],
+                         reverse=True)
+        rows = []
+        for (file, line, function), (cc, nc, tt, ct, _) in entries[:limit]:
+            rows.append({
+                "function": _location(file, line, function),
+                "ncalls": nc,
+                "primitive_calls": cc,
+                "tottime": round(tt, 6),
+                "cumtime": round(ct, 6),
+            })
+        return {"mode": "cprofile", "duration": round(duration, 3), "threads": 1 + len(self._thread_profiles),
+                "total_calls": stats.total_calls, "total_time": round(stats.total_tt, 6), "functions": rows}
+
+
+class MemoryTracer:
+    """tracemalloc 基线快照与增量对比"""
+
+    def __init__(self, frames: int = 1):
+        self.frames = max(1, int(frames))
+        self._started_here = False
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self.started = 0.0
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_here = True
+        self.started = time.monotonic()
+        self._baseline = self._snapshot()
+
+    def diff(self, limit: int = 20, group_by: str = "lineno", rebase: bool = False) -> Dict:
+        """当前快照相对基线的内存增长，按增长量绝对值排序；rebase 时以当前快照作为新基线"""
+        snapshot = self._snapshot()
+        stats = snapshot.compare_to(self._baseline, group_by)
+        current, peak = tracemalloc.get_traced_memory()
+        rows = []
+        for stat in stats[:limit]:
+            frame = stat.traceback[0]
+            row = {
+                "location": _short_path(frame.filename) if group_by == "filename"
+                else f"{_short_path(frame.filename)}:{frame.lineno}",
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+                "size": stat.size,
+                "count": stat.count,
+            }
+            if group_by == "traceback":
+                row["traceback"] = [f"{_short_path(f.filename)}:{f.lineno}" for f in stat.traceback]
+            rows.append(row)
+        result = {
+            "since": round(time.monotonic() - self.started, 3),
+            "traced_current": current,
+            "traced_peak": peak,
+            "size_diff": sum(stat.size_diff for stat in stats),
+            "count_diff": sum(stat.count_diff for stat in stats),
+            "top": rows,
+        }
+        if rebase:
+            self._baseline = snapshot
+            self.started = time.monotonic()
+        return result
+
+    def stop(self):
+        self._baseline = None
+        if self._started_here:
+            tracemalloc.stop()
+
+
+class Diagnostics:
+    """每个 worker 进程至多一个性能分析会话与一个内存跟踪"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._tracer: Optional[MemoryTracer] = None
+
+    def start_profiling(self, mode: str = "sample", interval: float = DEFAULT_INTERVAL,
+                        max_duration: float = MAX_DURATION) -> Dict:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profiling mode `{mode}`, available: {PROFILE_MODES}")
+        with self._lock:
+            if self._profiler is not None:
+                raise RuntimeError("A profiling session is already running, stop it first")
+            profiler = StackSampler(interval, max_duration) if mode == "sample" else CallProfiler()
+            profiler.start()
+            self._profiler = profiler
+        return {"mode": mode, "status": "started", "pid": os.getpid()}
+
+    def stop_profiling(self, limit: int = 30, sort_by: str = "cumulative") -> Dict:
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key `{sort_by}`, available: {SORT_KEYS}")
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        with self._lock:
+            profiler = self._profiler
+            if profiler is None:
+                raise RuntimeError("No profiling session is running")
+            result = profiler.stop(limit=limit, sort_by=sort_by)
+            self._profiler = None
+        result["pid"] = os.getpid()
+        return result
+
+    def start_memory_trace(self, frames: int = 1) -> Dict:
+        with self._lock:
+            if self._tracer is not None:
+                raise RuntimeError("A memory trace is already running, stop it first")
+            tracer = MemoryTracer(frames)
+            tracer.start()
+            self._tracer = tracer
+        return {"status": "started", "frames": tracer.frames, "pid": os.getpid()}
+
+    def memory_snapshot_diff(self, limit: int = 20, group_by: str = "lineno",
+                             rebase: bool = False, stop: bool = False) -> Dict:
+        if group_by not in GROUP_BY:
+            raise ValueError(f"Unknown group_by `{group_by}`, available: {GROUP_BY}")
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        with self._lock:
+            tracer = self._tracer
+            if tracer is None:
+                raise RuntimeError("No memory trace is running, start one first")
+            result = tracer.diff(limit=limit, group_by=group_by, rebase=rebase)
+            if stop:
+                tracer.stop()
+                self._tracer = None
+        result["pid"] = os.getpid()
+        return result
+
+    def status(self) -> Dict:
+        profiler = self._profiler
+        return {
+            "profiling": None if profiler is None else {
+                "mode": "sample" if isinstance(profiler, StackSampler) else "cprofile",
+                "running_for": round(time.monotonic() - profiler.started, 3)},
+            "memory_trace": self._tracer is not None,
+        }
@@ -0,0 +1,462 @@
+"""
+离线压测工具
+在本机以 no_register=True 启动 HWorkerAPP（不连接 controller），按真实的名称分布
+（热门粒子、冷门拼写、拼写错误、查无此名、批量调用）以给定并发回放请求，
+分别统计 REST 与 MCP（sse / streamable-http）传输下的吞吐、延迟分位数与错误率。
+可选地用带延迟的 PDG 代理替代本地 PDG 数据库，模拟慢速数据源。
+
+    python -m ParSV.worker.load_test --transports rest sse streamable-http --concurrency 32 --duration 10
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+os.environ.setdefault("WORKER_ACCESS_LOG", "false")
+for _logger in ("httpx", "mcp"):
+    logging.getLogger(_logger).setLevel(logging.WARNING)
+
+import httpx
+import pdg
+
+from ParSV.utils import json_codec, atomic_write_json
+from ParSV.Usage.spelling_index import get_spelling_index
+from ParSV.Usage.particle_record import get_particle_registry
+from ParSV.Usage.pdg_editions import get_pdg_editions
+
+TRANSPORTS = ("rest", "sse", "streamable-http")
+DEFAULT_MIX = "hot=0.6,cold=0.2,typo=0.1,miss=0.05,batch=0.05"
+# 分析中最常出现的粒子
+HOT_MCIDS = [211, -211, 111, 321, -321, 310, 130, 11, -11, 13, -13, 22, 2212, -2212, 2112,
+             421, -421, 411, -411, 431, 443, 521, -521, 511, -511, 3122, 4122, 23, 24, 25]
+
+
+# ---------------------------------------------------------------------- #
+# PDG 替身
+# ---------------------------------------------------------------------- #
+class SlowPDGProxy:
+    """包装真实的 PDG API，每次方法调用前按给定分布休眠"""
+
+    def __init__(self, api, latency: float, jitter: float = 0.0, rng: Optional[random.Random] = None):
+        self._api = api
+        self._latency = latency
+        self._jitter = jitter
+        self._rng = rng or random.Random()
+        self.calls = 0
+
+    def _delay(self) -> float:
+        return max(0.0, self._rng.gauss(self._latency, self._jitter) if self._jitter else self._latency)
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self.calls += 1
+            time.sleep(self._delay())
+            return attr(*args, **kwargs)
+        return call
+
+
+@contextmanager
+def stub_pdg(latency: float, jitter: float = 0.0, seed: int = 0):
+    """在上下文内让 pdg.connect() 返回带延迟的代理；latency <= 0 时不做替换"""
+    if latency <= 0:
+        yield
+        return
+    real_connect = pdg.connect
+    rng = random.Random(seed)
+    pdg.connect = lambda *args, **kwargs: SlowPDGProxy(real_connect(*args, **kwargs), latency, jitter, rng)
+    get_pdg_editions().clear()  # 已打开的共享连接须经代理重新打开
+    try:
+        yield
+    finally:
+        pdg.connect = real_connect
+        get_pdg_editions().clear()
+
+
+# ---------------------------------------------------------------------- #
+# 请求分布
+# ---------------------------------------------------------------------- #
+def parse_mix(mix: str) -> Dict[str, float]:
+    """解析 'hot=0.6,cold=0.2,...'，权重归一化"""
+    weights = {}
+    for part in mix.split(","):
+        if not part.strip():
+            continue
+        key, _, value = part.partition("=")
+        key = key.strip()
+        if key not in NameMix.KINDS:
+            raise ValueError(f"Unknown request kind `{key}`, available: {NameMix.KINDS}")
+        weights[key] = float(value)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError(f"Invalid request mix `{mix}`")
+    return {key: value / total for key, value in weights.items()}
+
+
+class NameMix:
+    """按权重生成请求：(kind, 远程方法名, kwargs)"""
+
+    KINDS = ("hot", "cold", "typo", "miss", "batch")
+
+    def __init__(self, mix: str = DEFAULT_MIX, seed: int = 0, batch_size: int = 8):
+        self.weights = parse_mix(mix)
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        index = get_spelling_index()
+        records = list(index.iter_records())
+        by_mcid = {item.get('mcid'): item for item in records}
+        self.hot = [by_mcid[mcid]['name'] for mcid in HOT_MCIDS if mcid in by_mcid]
+        self.cold = [s for item in records for s in self._spellings(item, ('name', 'programmatic_name', 'latex_name',
+                                                                           'evtgen_name', 'html_name', 'unicode_name', 'aliases'))]
+        # 只保留能解析到记录的拼写错误（与名称/别名不冲突的 typo 在查询时不会命中）
+        self.typo = [s for item in records for s in item.get('typo') or [] if index.find_record(s)]
+        self.names = [item['name'] for item in records]
+        self._kinds = list(self.weights)
+        self._cum = list(self.weights.values())
+
+    @staticmethod
+    def _spellings(item: Dict, fields) -> List[str]:
+        values = []
+        for f in fields:
+            value = item.get(f)
+            if isinstance(value, list):
+                values.extend(v for v in value if v)
+            elif value:
+                values.append(value)
+        return values
+
+    def _miss(self) -> str:
+        letters = "abcdefghijklmnopqrstuvwxyz"
+        return "zz" + "".join(self.rng.choice(letters) for _ in range(8))
+
+    def next(self) -> Tuple[str, str, Dict]:
+        kind = self.rng.choices(self._kinds, weights=self._cum)[0]
+        if kind == "batch":
+            texts = [" -> ".join(self.rng.sample(self.names, 3)) for _ in range(self.batch_size)]
+            return kind, "extract_particle_mentions", {"texts": texts}
+        pool = {"hot": self.hot, "cold": self.cold, "typo": self.typo}.get(kind)
+        name = self.rng.choice(pool) if pool else self._miss()
+        return kind, "particle_name_to_properties", {"name": name}
+
+
+# ---------------------------------------------------------------------- #
+# 统计
+# ---------------------------------------------------------------------- #
+@dataclass
+class Sample:
+    kind: str
+    latency: float
+    ok: bool
+
+
+@dataclass
+class RunStats:
+    transport: str
+    samples: List[Sample] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @staticmethod
+    def _percentile(values: List[float], q: float) -> float:
+        if not values:
+            return 0.0
+        values = sorted(values)
+        pos = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+        return values[pos]
+
+    def summary(self) -> Dict:
+        latencies = [s.latency for s in self.samples]
+        # 查无此名的请求预期返回错误，单独统计
+        errors = [s for s in self.samples if not s.ok and s.kind != "miss"]
+        by_kind = {}
+        for kind in NameMix.KINDS:
+            items = [s for s in self.samples if s.kind == kind]
+            if items:
+                by_kind[kind] = {
+                    "requests": len(items),
+                    "errors": sum(1 for s in items if not s.ok),
+                    "p50_ms": self._percentile([s.latency for s in items], 50) * 1e3,
+                    "p99_ms": self._percentile([s.latency for s in items], 99) * 1e3,
+                }
+        return {
+            "transport": self.transport,
+            "requests": len(self.samples),
+            "elapsed_s": self.elapsed,
+            "throughput_rps": len(self.samples) / self.elapsed if self.elapsed > 0 else 0.0,
+            "p50_ms": self._percentile(latencies, 50) * 1e3,
+            "p90_ms": self._percentile(latencies, 90) * 1e3,
+            "p99_ms": self._percentile(latencies, 99) * 1e3,
+            "max_ms": max(latencies, default=0.0) * 1e3,
+            "error_rate": len(errors) / len(self.samples) if self.samples else 0.0,
+            "by_kind": by_kind,
+        }
+
+
+# ---------------------------------------------------------------------- #
+# 本地 worker
+# ---------------------------------------------------------------------- #
+def free_port(host: str = "127.0.0.1") -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+class LocalWorker:
+    """在后台线程中运行不注册的 worker，退出上下文时关闭"""
+
+    def __init__(self, mcp_transport: str = "sse", host: str = "127.0.0.1", port: Optional[int] = None):
+        import uvicorn
+        from ParSV.worker.psv_remote_model import build_app, CustomModelConfig, CustomWorkerConfig
+        self.host = host
+        self.port = port or free_port(host)
+        model_config = CustomModelConfig(mcp_transport=mcp_transport)
+        worker_config = CustomWorkerConfig(host=host, port=self.port, no_register=True)
+        self.app = build_app(model_config, worker_config)
+        self.model_name = model_config.name
+        self.mcp_path = next((route.path for route in self.app.routes
+                              if getattr(route, "path", "").startswith("/apiv2/mcp/")), None)
+        self.api_key = getattr(self.app, "worker_secret_key", None)
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=self.port,
+                                                     log_level="warning", access_log=False))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+    def __enter__(self) -> "LocalWorker":
+        self._thread.start()
+        deadline = time.time() + 30
+        while not self._server.started:
+            if time.time() > deadline or not self._thread.is_alive():
+                raise RuntimeError(f"Worker failed to start on {self.base_url}")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+class RemoteWorker:
+    """已在其他进程中运行的 worker（客户端与服务端不共享解释器，结果更接近线上）"""
+
+    def __init__(self, base_url: str, model_name: str, mcp_path: Optional[str] = None,
+                 api_key: Optional[str] = None):
+        self.base_url = base_url.rstrip("/")
+        self.model_name = model_name
+        self.mcp_path = mcp_path
+        self.api_key = api_key
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+    def __enter__(self) -> "RemoteWorker":
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+# ---------------------------------------------------------------------- #
+# 客户端
+# ---------------------------------------------------------------------- #
+async def _run_clients(make_caller, mix: NameMix, concurrency: int, duration: float,
+                       max_requests: int, warmup: float, stats: RunStats):
+    """每个客户端串行发送请求；warmup 期间的样本不计入统计"""
+    t_start = time.perf_counter()
+    t_measure = t_start + warmup
+    t_stop = t_measure + duration
+    sent = 0
+
+    async def client():
+        nonlocal sent
+        async with make_caller() as call:
+            while time.perf_counter() < t_stop and (not max_requests or sent < max_requests):
+                kind, function, kwargs = mix.next()
+                t0 = time.perf_counter()
+                try:
+                    ok = await call(function, kwargs)
+                except Exception:
+                    ok = False
+                t1 = time.perf_counter()
+                if t0 >= t_measure:
+                    sent += 1
+                    stats.samples.append(Sample(kind, t1 - t0, ok))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    stats.elapsed = min(time.perf_counter(), t_stop) - t_measure
+
+
+def _rest_caller(worker: LocalWorker):
+    class Caller:
+        async def __aenter__(self):
+            self.client = httpx.AsyncClient(base_url=worker.base_url, headers=worker.headers, timeout=60)
+            return self.call
+
+        async def __aexit__(self, *exc):
+            await self.client.aclose()
+
+        async def call(self, function: str, kwargs: Dict) -> bool:
+            resp = await self.client.post(
+                "/apiv2/worker/unified_gate/", params={"function": function},
+                content=json_codec.dumpb({"model": worker.model_name, "args": [], "kwargs": kwargs}),
+                headers={"Content-Type": "application/json"})
+            return resp.status_code == 200
+    return Caller
+
+
+def _mcp_caller(worker: LocalWorker, transport: str):
+    from contextlib import AsyncExitStack
+    from mcp import ClientSession
+
+    class Caller:
+        async def __aenter__(self):
+            self.stack = AsyncExitStack()
+            if transport == "sse":
+                from mcp.client.sse import sse_client
+                streams = await self.stack.enter_async_context(
+                    sse_client(f"{worker.base_url}{worker.mcp_path}/sse", headers=worker.headers))
+            else:
+                from mcp.client.streamable_http import streamablehttp_client
+                streams = await self.stack.enter_async_context(
+                    streamablehttp_client(f"{worker.base_url}{worker.mcp_path}/mcp", headers=worker.headers))
+            self.session = await self.stack.enter_async_context(ClientSession(streams[0], streams[1]))
+            await self.session.initialize()
+            return self.call
+
+        async def __aexit__(self, *exc):
+            await self.stack.aclose()
+
+        async def call(self, function: str, kwargs: Dict) -> bool:
+            result = await self.session.call_tool(function, arguments=kwargs)
+            return not result.isError
+    return Caller
+
+
+@dataclass
+class LoadTestConfig:
+    transports: List[str] = field(default_factory=lambda: ["rest"])
+    concurrency: int = 16
+    duration: float = 10.0
+    requests: int = 0
+    warmup: float = 1.0
+    mix: str = DEFAULT_MIX
+    batch_size: int = 8
+    pdg_latency: float = 0.0
+    pdg_jitter: float = 0.0
+    cold_records: bool = False
+    seed: int = 0
+    url: Optional[str] = None
+    mcp_path: Optional[str] = None
+    api_key: Optional[str] = None
+    model_name: str = "hepai/particle-spelling-variants"
+
+
+def run_load_test(config: LoadTestConfig) -> List[Dict]:
+    """
+    依次对每种传输方式启动本地 worker 并压测，返回各传输的统计摘要；
+    设置 url 时压测已运行的 worker，PDG 替身与记录预热只作用于本地 worker
+    """
+    summaries = []
+    with stub_pdg(config.pdg_latency, config.pdg_jitter, config.seed):
+        for transport in config.transports:
+            if transport not in TRANSPORTS:
+                raise ValueError(f"Unknown transport `{transport}`, available: {TRANSPORTS}")
+            mix = NameMix(config.mix, seed=config.seed, batch_size=config.batch_size)
+            stats = RunStats(transport)
+            if config.url:
+                worker = RemoteWorker(config.url, config.model_name, config.mcp_path, config.api_key)
+                if transport != "rest" and not config.mcp_path:
+                    raise ValueError("--mcp-path is required to test MCP transports of a remote worker")
+            else:
+                registry = get_particle_registry()
+                if config.cold_records:
+                    registry.clear()  # 每轮从空的记录表开始，命中 PDG 替身
+                else:
+                    for name in mix.hot:
+                        registry.get(name)  # 预先构建热门粒子的记录，与长期运行的 worker 一致
+                worker = LocalWorker(mcp_transport=transport if transport != "rest" else "sse")
+            with worker:
+                caller = _rest_caller(worker) if transport == "rest" else _mcp_caller(worker, transport)
+                asyncio.run(_run_clients(caller, mix, config.concurrency, config.duration,
+                                         config.requests, config.warmup, stats))
+            summaries.append(stats.summary())
+    return summaries
+
+
+def print_report(summaries: List[Dict]):
+    print(f"{'transport':>16} {'requests':>9} {'rps':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8} {'errors':>7}")
+    for s in summaries:
+        print(f"{s['transport']:>16} {s['requests']:>9} {s['throughput_rps']:>9.1f} {s['p50_ms']:>8.2f} "
+              f"{s['p90_ms']:>8.2f} {s['p99_ms']:>8.2f} {s['max_ms']:>8.2f} {s['error_rate']:>7.2%}")
+        for kind, k in s["by_kind"].items():
+            print(f"{'- ' + kind:>16} {k['requests']:>9} {'':>9} {k['p50_ms']:>8.2f} {'':>8} "
+                  f"{k['p99_ms']:>8.2f} {'':>8} {k['errors']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the particle spelling variants worker")
+    parser.add_argument('--transports', nargs='+', choices=TRANSPORTS, default=['rest'],
+                        help='Transports to test, each against a fresh local worker')
+    parser.add_argument('--concurrency', type=int, default=16, help='Number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='Measured seconds per transport')
+    parser.add_argument('--requests', type=int, default=0, help='Stop after N measured requests (0: no limit)')
+    parser.add_argument('--warmup', type=float, default=1.0, help='Seconds of unmeasured warm-up traffic')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help='Request mix weights over hot, cold, typo, miss and batch requests')
+    parser.add_argument('--batch-size', type=int, default=8, help='Documents per batch mention extraction call')
+    parser.add_argument('--pdg-latency', type=float, default=0.0,
+                        help="Replace PDG API calls by a proxy sleeping this many seconds per call (in-process worker only)")
+    parser.add_argument('--pdg-jitter', type=float, default=0.0, help='Standard deviation of the PDG latency')
+    parser.add_argument('--cold-records', action='store_true',
+                        help='Clear the cached particle records before each transport run')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the request mix')
+    parser.add_argument('--url', help='Test an already running worker (e.g. started with --no_register True) '
+                                      'instead of an in-process one, e.g. http://localhost:42600')
+    parser.add_argument('--mcp-path', help='MCP mount of the running worker, e.g. /apiv2/mcp/md-648de797-3c7')
+    parser.add_argument('--api-key', default=os.environ.get("HEPAI_API_KEY"),
+                        help='API key sent to the running worker')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    args = parser.parse_args()
+
+    config = LoadTestConfig(
+        transports=args.transports, concurrency=args.concurrency, duration=args.duration,
+        requests=args.requests, warmup=args.warmup, mix=args.mix, batch_size=args.batch_size,
+        pdg_latency=args.pdg_latency, pdg_jitter=args.pdg_jitter, cold_records=args.cold_records,
+        seed=args.seed, url=args.url, mcp_path=args.mcp_path, api_key=args.api_key)
+    summaries = run_load_test(config)
+    print_report(summaries)
+    if args.output:
+        atomic_write_json(args.output, {"config": config.__dict__, "results": summaries})
+        print(f"Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
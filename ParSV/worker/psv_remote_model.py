@@ -1,6 +1,6 @@
-from typing import Dict, Union, Literal
+from typing import Any, Dict, List, Union, Literal
 from dataclasses import dataclass, field
-import json, sys
+import json, os, sys
 import hepai
 from hepai import HRModel, HModelConfig, HWorkerConfig, HWorkerAPP
 
@@ -13,8 +13,21 @@ except ImportError:
     sys.path.append(str(here.parent.parent))
     from ParSV import __version__
     
-from ParSV.Usage.Particle import Particle
-from ParSV.worker._response_value_object import ParticleVO
+from ParSV.Usage.particle_record import get_particle_registry
+from ParSV.Usage.pdg_editions import EDITIONS_ENV, MAX_EDITIONS_ENV
+from ParSV.Usage.pdg_guard import (STAGE_TIMEOUT_ENV, BUDGET_ENV, CONCURRENCY_ENV, BREAKER_FAILURES_ENV,
+                                   BREAKER_RESET_ENV, BREAKER_SLOW_CALL_ENV)
+from ParSV.Usage.property_table import get_property_table
+from ParSV.Usage.mention_extractor import get_mention_extractor
+from ParSV.Usage.autocomplete import get_suggester
+from ParSV.Usage.decay_tree import get_decay_tree_expander
+from ParSV.Usage.decay_index import get_decay_index, decay_index_status
+from ParSV.Usage.spelling_index import DEFAULT_DATA_FILE, SNAPSHOT_ENV, CATEGORIES_ENV
+from ParSV.data.categories import parse_categories
+from ParSV.worker.dataset_reloader import DatasetReloader
+from ParSV.worker.admin import parse_admins, require_admin
+from ParSV.worker.diagnostics import Diagnostics
+from ParSV.worker.codec_response import install_codec_responses
 
 @dataclass  # (1) model config
 class CustomModelConfig(HModelConfig):
@@ -43,10 +56,57 @@ class CustomWorkerConfig(HWorkerConfig):
     # controller_address: str = field(default="http://localhost:42601", metadata={"help": "Controller's address"})
     no_register: bool = field(default=False, metadata={"help": "Do not register to controller"})
 
+    # config for multi-process serving
+    num_workers: int = field(default=1, metadata={"help": "Number of worker processes sharing the port and a read-only spelling index snapshot, supervised and restarted on crash when > 1"})
+    snapshot_dir: str = field(default=None, metadata={"help": "Directory for the shared index snapshot in multi-process mode, a temporary directory is used if not set"})
+    property_table: str = field(default=None, metadata={"help": "Path of a prebuilt .npy property table shared via mmap, built from PDG if not set"})
+    pdg_editions: str = field(default=None, metadata={"help": "Additional PDG editions served next to the default one, e.g. '2024=/data/pdg-2024.sqlite,2022=/data/pdg-2022.sqlite'"})
+    max_pdg_editions: int = field(default=3, metadata={"help": "Max PDG editions kept open (including the default), least recently used editions and their cached records are evicted"})
+    pdg_stage_timeout: float = field(default=2.0, metadata={"help": "Timeout in seconds of each PDG stage (properties and each kind of branching fractions) when building a particle record"})
+    pdg_budget: float = field(default=5.0, metadata={"help": "Total latency budget in seconds of the PDG stages of one particle record, fields not fetched in time are reported in `missing_fields`"})
+    pdg_concurrency: int = field(default=1, metadata={"help": "Max PDG stages running at once in a worker process; the stage timeout starts when a stage runs, time spent waiting only counts against the budget"})
+    pdg_breaker_failures: int = field(default=5, metadata={"help": "Consecutive PDG timeouts or database errors that open the circuit breaker, after which records are served from local data only"})
+    pdg_breaker_reset: float = field(default=30.0, metadata={"help": "Seconds the PDG circuit breaker stays open before a single probe call is let through"})
+    pdg_breaker_slow_call: float = field(default=0.0, metadata={"help": "Also count successful PDG stages running longer than this many seconds as breaker failures, 0 to disable"})
+    decay_index: str = field(default=None, metadata={"help": "Path of a prebuilt decay product index (python -m ParSV.Usage.decay_index <path>), built from PDG in the background at startup if not set (saved to this path, or to snapshot_dir in multi-process mode)"})
+    spelling_db: str = field(default=None, metadata={"help": "Path of a SQLite export (python -m ParSV.Usage.sqlite_export <path>) backing name lookups in single-process mode, instead of building the index from data_file"})
+
+    # config for dataset hot reload
+    data_file: str = field(default=DEFAULT_DATA_FILE, metadata={"help": "Path of particle_variants.json served by the worker"})
+    categories: str = field(default=None, metadata={"help": "Comma separated particle categories to serve, e.g. 'leptons,charmed_mesons'; only their shards are loaded from a sharded data_file, all categories if not set"})
+    reload_interval: float = field(default=0.0, metadata={"help": "Poll the data file every N seconds and hot reload it on change, 0 to disable (use the admin method `reload_dataset` instead)"})
+
 
 class CustomWorkerModel(HRModel):  # Define a custom worker model inheriting from HRModel.
-    def __init__(self, config: HModelConfig):
+    def __init__(self, config: HModelConfig, worker_config: CustomWorkerConfig = None):
         super().__init__(config=config)
+        worker_config = worker_config or CustomWorkerConfig()
+        self.admins = parse_admins(worker_config.permissions)
+        categories = parse_categories(worker_config.categories)  # 未知类别直接抛出 ValueError
+        if categories:  # 须在首次构建拼写索引之前设置
+            os.environ[CATEGORIES_ENV] = ",".join(categories)
+        if worker_config.pdg_editions:  # 须在首次使用 PDG 连接池之前设置
+            os.environ[EDITIONS_ENV] = worker_config.pdg_editions
+        os.environ[MAX_EDITIONS_ENV] = str(worker_config.max_pdg_editions)
+        os.environ[STAGE_TIMEOUT_ENV] = str(worker_config.pdg_stage_timeout)
+        os.environ[BUDGET_ENV] = str(worker_config.pdg_budget)
+        os.environ[CONCURRENCY_ENV] = str(worker_config.pdg_concurrency)
+        os.environ[BREAKER_FAILURES_ENV] = str(worker_config.pdg_breaker_failures)
+        os.environ[BREAKER_RESET_ENV] = str(worker_config.pdg_breaker_reset)
+        os.environ[BREAKER_SLOW_CALL_ENV] = str(worker_config.pdg_breaker_slow_call)
+        self.records = get_particle_registry()  # 每个 mcid 只构建一次的只读粒子记录
+        self.diagnostics = Diagnostics()  # 按需开启的性能分析与内存跟踪
+        self.reloader = DatasetReloader(
+            data_file=worker_config.data_file,
+            cache=self.records,
+            poll_interval=worker_config.reload_interval,
+            categories=categories,
+        )
+        self.reloader.start()
+        if (os.path.abspath(worker_config.data_file) != os.path.abspath(DEFAULT_DATA_FILE)
+                and not os.environ.get(SNAPSHOT_ENV)):
+            self.reloader.reload(force=True)  # 单进程模式下直接加载自定义数据文件
+        get_decay_index(wait=False)  # 在后台构建或加载衰变产物倒排索引，不阻塞启动
 
     @HRModel.remote_callable  # Decorate the function to enable remote call.
     def add(self, a: int = 1, b: int = 2) -> int:
@@ -65,75 +125,266 @@ class CustomWorkerModel(HRModel):  # Define a custom worker model inheriting fro
         mother: str = None, 
         children: str = None, 
         id: int = 0,
+        edition: str = None,
         # **kwargs
         ):
         """ 
         A method to get particle properties by name, the name could be any of the spelling variants.
+        Properties come from the default PDG edition, or from `edition` (e.g. "2024") if the worker serves it.
+        If PDG is slow or unavailable, the local data is returned with `partial: true` and the fields
+        that could not be fetched in `missing_fields`.
         For example:
         - name: "pi+"
         - name: "pi_plus"
-        - name: "π+"
+        - name: "π+", edition: "2024"
         """
         assert isinstance(name, str) and len(name) > 0, "name should be a non-empty string."
-        particle = Particle(name, mother=mother, children=children, id=id)
-        
-        resp_vo = ParticleVO(
-            # 基本标识信息
-            name=particle.name,
-            mcid=particle.mcid,
-            # 不同格式的名称
-            programmatic_name=particle.programmatic_name,
-            latex_name=particle.latex_name,
-            evtgen_name=particle.evtgen_name,
-            html_name=particle.html_name,
-            unicode_name=particle.unicode_name,
-            # 层次结构
-            mother=particle.mother,
-            children=particle.children,
-            # aliases=particle.aliases,
-            # typo=particle.typo,
-            # 物理属性
-            charge=particle.charge,
-            mass=particle.mass,
-            mass_err=particle.mass_err,
-            lifetime=particle.lifetime,
-            lifetime_err=particle.lifetime_err,
-            width=particle.width,
-            width_err=particle.width_err,
-            # 量子数
-            quantum_C=particle.quantum_C,
-            quantum_G=particle.quantum_G,
-            quantum_I=particle.quantum_I,
-            quantum_J=particle.quantum_J,
-            quantum_P=particle.quantum_P,
-            # 粒子类型标识
-            is_baryon=particle.is_baryon,
-            is_boson=particle.is_boson,
-            is_lepton=particle.is_lepton,
-            is_meson=particle.is_meson,
-            is_quark=particle.is_quark,
-            # 衰变分支比
-            branching_fractions=
-            particle.branching_fractions,
-            exclusive_branching_fractions=particle.exclusive_branching_fractions,
-            inclusive_branching_fractions=particle.inclusive_branching_fractions,
-            # 其他标识
-            has_lifetime_entry=particle.has_lifetime_entry,
-            has_mass_entry=particle.has_mass_entry,
-            has_width_entry=particle.has_width_entry, 
-        )
-        resp = resp_vo.model_dump()
-        return resp
-            
+        return self.records.get(name, edition=edition).to_response(mother=mother, children=children)
+
+    @HRModel.remote_callable
+    def suggest(
+        self,
+        prefix: str = None,
+        limit: int = 10,
+        include_typos: bool = True,
+        ):
+        """
+        Autocomplete particle names as you type. The prefix is matched case- and notation-insensitively
+        against every spelling variant (Greek letters, LaTeX, HTML and Unicode forms are normalized),
+        and up to `limit` (at most 50) particles are returned with `mcid`, `name`, the matched spelling
+        and its `kind` (name/alias/typo), names and exact matches first.
+        For example:
+        - prefix: "lamb"
+        - prefix: "Λc"
+        """
+        assert isinstance(prefix, str), "prefix should be a string."
+        return get_suggester(include_typos).suggest(prefix, limit=limit)
+
+    @HRModel.remote_callable
+    def expand_decay_tree(
+        self,
+        name: str = None,
+        max_depth: int = 2,
+        min_bf: float = 0.01,
+        max_modes: int = None,
+        include_limits: bool = False,
+        expand_stable: bool = False,
+        ):
+        """
+        Expand the decay chain of a particle server-side by following the `decay_products` of its
+        exclusive branching fractions, breadth first, down to `max_depth` (at most 6). Modes below
+        `min_bf`, upper limits (unless `include_limits`) and modes beyond the `max_modes` largest are skipped.
+        Long-lived final states (e, mu, nu, gamma, pi+-, K+-, K_L, p, n) are not expanded unless `expand_stable`.
+        Returns a compact graph: `nodes` (name, mcid, depth, stop reason) and `edges` (parent node,
+        bf, is_limit, description, product nodes); every particle appears once, so shared daughters are reused.
+        `dropped_modes` counts antiparticle modes left out because a product could not be charge conjugated;
+        when it is non-zero the tree is incomplete.
+        For example:
+        - name: "B+", max_depth: 3, min_bf: 0.005
+        """
+        assert isinstance(name, str) and len(name) > 0, "name should be a non-empty string."
+        return get_decay_tree_expander().expand(
+            name, max_depth=max_depth, min_bf=min_bf, max_modes=max_modes,
+            include_limits=include_limits, expand_stable=expand_stable)
+
+    @HRModel.remote_callable
+    def find_decays(
+        self,
+        products: List[str] = None,
+        exact: bool = False,
+        min_bf: float = 0.0,
+        include_limits: bool = True,
+        limit: int = 50,
+        ):
+        """
+        Reverse decay lookup over the whole catalogue: find the decay modes (parent particle, bf,
+        description, products) whose final state contains all of `products`, or is exactly `products`
+        when `exact` is true. Products can be any spelling variant or mcid; repeated products
+        (e.g. pi0, pi0) must appear at least that often. Results are sorted by branching fraction.
+        For example:
+        - products: ["J/psi", "K+"], exact: true
+        - products: ["tau-"]
+        While the index is still being built in the background, returns `status: "building"` and no modes.
+        """
+        assert isinstance(products, list) and len(products) > 0, "products should be a non-empty list."
+        decay_index = get_decay_index(wait=False)
+        if decay_index is None:
+            return {**decay_index_status(), "query": products, "exact": exact, "total": 0, "modes": [], "partial": True}
+        return {"status": "ready", **decay_index.find(
+            products, exact=exact, min_bf=min_bf, include_limits=include_limits, limit=limit)}
+
+    @HRModel.remote_callable
+    def query_particles(
+        self,
+        filters: Dict[str, Any] = None,
+        sort_by: str = None,
+        descending: bool = False,
+        limit: int = 50,
+        fields: List[str] = None,
+        ):
+        """
+        Query the whole particle catalogue with vectorized predicates over the property table.
+        Each filter maps a column to a value (equality), a [low, high] range, or a dict of
+        operators among eq, ne, gt, ge, lt, le, between, in, is_null. Masses and widths are in GeV,
+        lifetimes in seconds, quantum numbers are numeric (J="1/2" -> 0.5, P="-" -> -1).
+        For example:
+        - filters: {"is_meson": true, "mass": [1.8, 2.0], "width": {"lt": 0.01}}
+        - filters: {"is_baryon": true, "charge": {"ne": 0}, "quantum_J": "1/2"}
+        """
+        return get_property_table().query(
+            filters=filters, sort_by=sort_by, descending=descending, limit=limit, fields=fields)
+
+    @HRModel.remote_callable
+    def extract_particle_mentions(
+        self,
+        text: str = None,
+        texts: List[str] = None,
+        include_typos: bool = True,
+        ):
+        """
+        Find all particle mentions in free text (analysis notes, abstracts, decay descriptors)
+        in a single pass. Returns a list of mentions with `text`, `start`, `end`, `mcid`, `name`
+        and `kind` (name/alias/typo) for `text`, or one such list per document for `texts`.
+        For example:
+        - text: "B+ -> J/psi K+ with J/psi -> mu+ mu-"
+        """
+        assert text is not None or texts is not None, "text or texts should be provided."
+        extractor = get_mention_extractor(include_typos)
+        if texts is not None:
+            return extractor.extract_batch(texts)
+        return extractor.extract(text)
+
+    @HRModel.remote_callable
+    def reload_dataset(
+        self,
+        force: bool = False,
+        wait: bool = False,
+        ):
+        """
+        Admin only. Hot reload particle_variants.json: the new dataset is validated and indexed in the
+        background, then swapped in atomically; only cached particle records of changed mcids are invalidated.
+        Returns the reload status, or the reload result when `wait` is true.
+        With several workers the reload is run by the supervisor, which rebuilds the shared snapshot and
+        restarts the workers one by one; the request returns `status: "requested"` and `wait` has no effect.
+        """
+        require_admin(self.admins)
+        if wait:
+            return self.reloader.reload(force=force)
+        status = self.reloader.reload_in_background(force=force)
+        status["particle_records"] = self.records.stats()
+        return status
+
+    @HRModel.remote_callable
+    def reload_status(self):
+        """Admin only. Report the last dataset reload result and particle record cache statistics."""
+        require_admin(self.admins)
+        status = self.reloader.status()
+        status["particle_records"] = self.records.stats()
+        status["decay_modes"] = get_decay_tree_expander().stats()
+        status["decay_index"] = decay_index_status()
+        status["diagnostics"] = self.diagnostics.status()
+        return status
+
+    @HRModel.remote_callable
+    def start_profiling(
+        self,
+        mode: Literal["sample", "cprofile"] = "sample",
+        interval: float = 0.005,
+        max_duration: float = 600.0,
+        ):
+        """
+        Admin only. Start profiling live traffic in this worker process.
+        `sample` samples the call stacks of all threads every `interval` seconds (low overhead, wall time,
+        stops by itself after `max_duration`); `cprofile` traces every call in the thread serving remote methods.
+        """
+        require_admin(self.admins)
+        return self.diagnostics.start_profiling(mode=mode, interval=interval, max_duration=max_duration)
+
+    @HRModel.remote_callable
+    def stop_profiling(
+        self,
+        limit: int = 30,
+        sort_by: Literal["cumulative", "self"] = "cumulative",
+        ):
+        """
+        Admin only. Stop the profiling session and return the `limit` hottest functions, by cumulative
+        or self time (cprofile) or samples (sample).
+        """
+        require_admin(self.admins)
+        return self.diagnostics.stop_profiling(limit=limit, sort_by=sort_by)
+
+    @HRModel.remote_callable
+    def start_memory_trace(self, frames: int = 1):
+        """
+        Admin only. Start tracemalloc (keeping `frames` frames per allocation) and take a baseline snapshot.
+        """
+        require_admin(self.admins)
+        return self.diagnostics.start_memory_trace(frames=frames)
+
+    @HRModel.remote_callable
+    def memory_snapshot_diff(
+        self,
+        limit: int = 20,
+        group_by: Literal["lineno", "filename", "traceback"] = "lineno",
+        rebase: bool = False,
+        stop: bool = False,
+        ):
+        """
+        Admin only. Compare a new tracemalloc snapshot with the baseline and return the `limit` largest
+        changes (size_diff, count_diff) by source line, file or traceback, next to the cache sizes.
+        `rebase` makes the new snapshot the baseline, `stop` ends the trace.
+        """
+        require_admin(self.admins)
+        result = self.diagnostics.memory_snapshot_diff(limit=limit, group_by=group_by, rebase=rebase, stop=stop)
+        result["particle_records"] = len(self.records)
+        result["decay_modes"] = get_decay_tree_expander().stats()["particles"]
+        return result
+
+def build_app(model_config: CustomModelConfig, worker_config: CustomWorkerConfig, worker_index: int = 0):
+    """构建 worker 应用，多进程模式下仅第 0 号进程向 controller 注册"""
+    from dataclasses import replace
+    if worker_index > 0:
+        worker_config = replace(worker_config, no_register=True)
+    model = CustomWorkerModel(model_config, worker_config)  # Instantiate the custom worker model.
+    app = HWorkerAPP(models=[model], worker_config=worker_config)  # Instantiate the APP, which is a FastAPI application.
+    install_codec_responses(app)  # 远程方法的返回值由 json_codec 编码
+    return app
+
+
 if __name__ == "__main__":
 
     import uvicorn
     from fastapi import FastAPI
     model_config, worker_config = hepai.parse_args((CustomModelConfig, CustomWorkerConfig))
-    model = CustomWorkerModel(model_config)  # Instantiate the custom worker model.
-    
-    app: FastAPI = HWorkerAPP(models=[model], worker_config=worker_config)  # Instantiate the APP, which is a FastAPI application.
-    
-    print(app.worker.get_worker_info(), flush=True)
-    # 启动服务  
-    uvicorn.run(app, host=app.host, port=app.port)
\ No newline at end of file
+
+    if worker_config.num_workers > 1:
+        from ParSV.worker.supervisor import WorkerSupervisor, resolve_port
+        worker_config.port = resolve_port(worker_config.host, worker_config.port, worker_config.auto_start_port)
+        supervisor = WorkerSupervisor(
+            app_factory=lambda i: build_app(model_config, worker_config, worker_index=i),
+            host=worker_config.host,
+            port=worker_config.port,
+            num_workers=worker_config.num_workers,
+            snapshot_dir=worker_config.snapshot_dir,
+            data_file=worker_config.data_file,
+            property_table=worker_config.property_table,
+            decay_index=worker_config.decay_index,
+            categories=parse_categories(worker_config.categories),
+            reload_interval=worker_config.reload_interval,
+        )
+        supervisor.run()
+    else:
+        if worker_config.property_table:
+            from ParSV.Usage.property_table import TABLE_ENV
+            os.environ[TABLE_ENV] = worker_config.property_table
+        if worker_config.decay_index:
+            from ParSV.Usage.decay_index import DECAY_INDEX_ENV
+            os.environ[DECAY_INDEX_ENV] = worker_config.decay_index
+        if worker_config.spelling_db:
+            from ParSV.Usage.spelling_index import SPELLING_DB_ENV
+            os.environ[SPELLING_DB_ENV] = worker_config.spelling_db
+        app: FastAPI = build_app(model_config, worker_config)
+
+        print(app.worker.get_worker_info(), flush=True)
+        # 启动服务  
+        uvicorn.run(app, host=app.host, port=app.port)
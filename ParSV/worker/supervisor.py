@@ -0,0 +1,382 @@
+"""
+多进程 worker 监管器
+父进程预先构建只读拼写索引快照并绑定监听端口，随后 fork 出 N 个 uvicorn 子进程
+共享同一个 socket 与 mmap 快照；子进程异常退出时按指数退避自动重启。
+衰变产物倒排索引由独立的构建进程写入快照目录，worker 在文件就绪前返回 "building" 状态。
+数据集热更新由监管器负责：在独立进程中把快照与属性表重建到新一代路径，切换路径后滚动重启 worker。
+"""
+
+import multiprocessing as mp
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from pathlib import Path
+here = Path(__file__).parent.resolve()
+
+try:
+    from ParSV import __version__
+except ImportError:
+    sys.path.append(str(here.parent.parent))
+    from ParSV import __version__
+
+from ParSV.Usage.spelling_index import SNAPSHOT_ENV, DEFAULT_DATA_FILE, build_snapshot
+from ParSV.Usage.property_table import TABLE_ENV, PropertyTable
+from ParSV.Usage.decay_index import DECAY_INDEX_ENV, DECAY_INDEX_SHARED_ENV, build_index_file
+from ParSV.worker.dataset_reloader import SUPERVISOR_ENV, RELOAD_SIGNAL, FORCE_RELOAD_SIGNAL, build_generation, read_status
+from ParSV.data.change_journal import dataset_signature
+from ParSV.utils.file_utils import atomic_write_json
+
+
+def resolve_port(host: str, port, auto_start_port: int) -> int:
+    """解析端口，port 为 None 时从 auto_start_port 起寻找空闲端口"""
+    if port not in (None, "None", "none", ""):
+        return int(port)
+    candidate = int(auto_start_port)
+    while True:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            try:
+                s.bind((host, candidate))
+                return candidate
+            except OSError:
+                candidate += 1
+
+
+def _restore_signals():
+    """辅助进程恢复默认信号处理（fork 时继承了监管器的处理函数，否则 terminate() 无法终止）"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+
+def _build_decay_index(index_path: str):
+    """构建进程入口：构建衰变产物倒排索引并保存到共享路径"""
+    _restore_signals()
+    build_index_file(index_path)
+
+
+def _reload_dataset(data_file: str, current: Dict, target: Dict, categories: Optional[List[str]],
+                    generation: int, status_file: str):
+    """热更新进程入口：把新一代快照与属性表重建到 target 路径，结果写入状态文件"""
+    _restore_signals()
+    try:
+        result = build_generation(data_file, current, target, categories)
+    except Exception as e:
+        result = {"status": "failed", "data_file": data_file, "errors": [f"{type(e).__name__}: {e}"],
+                  "finished_at": time.time()}
+    result["generation"] = generation
+    atomic_write_json(status_file, result)
+
+
+def _serve_worker(worker_index: int, app_factory: Callable, sock: socket.socket):
+    """子进程入口：构建应用并在共享 socket 上运行 uvicorn"""
+    import uvicorn
+
+    app = app_factory(worker_index)
+    config = uvicorn.Config(app, host=app.host, port=app.port)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+class WorkerSupervisor:
+    """监管 N 个共享端口与索引快照的 worker 进程"""
+
+    def __init__(self,
+                 app_factory: Callable,
+                 host: str,
+                 port: int,
+                 num_workers: int = 2,
+                 snapshot_dir: Optional[str] = None,
+                 data_file: str = DEFAULT_DATA_FILE,
+                 property_table: Optional[str] = None,
+                 decay_index: Optional[str] = None,
+                 categories: Optional[Sequence[str]] = None,
+                 reload_interval: float = 0.0,
+                 restart_delay: float = 1.0,
+                 max_restart_delay: float = 30.0,
+                 min_uptime: float = 10.0):
+        self.app_factory = app_factory
+        self.host = host
+        self.port = port
+        self.num_workers = max(1, int(num_workers))
+        self.snapshot_dir = snapshot_dir
+        self.data_file = data_file
+        self.property_table = property_table
+        self.decay_index = decay_index
+        self.categories = list(categories) if categories else None
+        self.reload_interval = reload_interval
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.min_uptime = min_uptime
+
+        self._ctx = mp.get_context("fork")
+        self._processes: Dict[int, mp.Process] = {}
+        self._started_at: Dict[int, float] = {}
+        self._delays: Dict[int, float] = {}
+        self._restart_at: Dict[int, float] = {}
+        self._stopping = False
+        self._owns_snapshot_dir = False
+        self._sock: Optional[socket.socket] = None
+        self._decay_builder: Optional[mp.Process] = None
+        self._decay_index_path: Optional[str] = None
+        self._decay_restart_at: Optional[float] = None
+        # 数据集热更新：当前一代各文件的路径、快照构建时数据文件的签名与进行中的热更新进程
+        self._paths: Dict[str, Optional[str]] = {}
+        self._generation = 0
+        self._signature: Optional[List] = None
+        self._failed_signature: Optional[List] = None
+        self._reload_request: Optional[bool] = None  # None 无请求，True 为强制热更新
+        self._reloader: Optional[mp.Process] = None
+        self._status_file: Optional[str] = None
+        self._last_poll = 0.0
+
+    def _prepare_snapshot(self):
+        """构建共享拼写索引快照与属性表，子进程通过环境变量 mmap 打开"""
+        if self.snapshot_dir is None:
+            self.snapshot_dir = tempfile.mkdtemp(prefix="parsv-")
+            self._owns_snapshot_dir = True
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        snapshot_path = os.path.join(self.snapshot_dir, "spelling_index.bin")
+        index = build_snapshot(snapshot_path, self.data_file, self.categories)
+        os.environ[SNAPSHOT_ENV] = snapshot_path
+        self._signature = index.signature
+        print(f"[Supervisor] Spelling index snapshot: {snapshot_path}", flush=True)
+
+        table_path = self.property_table
+        if not table_path or not os.path.exists(table_path):
+            table_path = os.path.join(self.snapshot_dir, "property_table.npy")
+            print("[Supervisor] Building property table from PDG...", flush=True)
+            PropertyTable.build(index).save(table_path)
+        os.environ[TABLE_ENV] = table_path
+        print(f"[Supervisor] Property table: {table_path}", flush=True)
+
+        # worker 据此把热更新请求转发给监管器并读取结果
+        self._status_file = os.path.join(self.snapshot_dir, "reload_status.json")
+        os.environ[SUPERVISOR_ENV] = self._status_file
+
+        # 衰变产物倒排索引只构建一次：未预构建时由构建进程写入，worker 等待该文件而不各自构建
+        index_path = self.decay_index or os.path.join(self.snapshot_dir, "decay_index.json")
+        os.environ[DECAY_INDEX_ENV] = index_path
+        os.environ[DECAY_INDEX_SHARED_ENV] = "1"
+        self._decay_index_path = index_path
+        print(f"[Supervisor] Decay index: {index_path}", flush=True)
+        self._paths = {"snapshot": snapshot_path, "property_table": table_path, "decay_index": index_path}
+
+    def _start_decay_builder(self):
+        """在独立进程中构建衰变产物倒排索引（父进程不起线程，避免 fork 时持有锁）"""
+        self._decay_restart_at = None
+        if os.path.exists(self._decay_index_path):
+            return
+        self._decay_builder = self._ctx.Process(
+            target=_build_decay_index,
+            args=(self._decay_index_path,),
+            name="psv-decay-index",
+            daemon=True,
+        )
+        self._decay_builder.start()
+        print(f"[Supervisor] Building decay index (pid={self._decay_builder.pid})", flush=True)
+
+    def _check_decay_builder(self):
+        """构建进程退出后检查结果，失败时按最大退避重试"""
+        builder = self._decay_builder
+        if builder is not None and not builder.is_alive():
+            builder.join()
+            self._decay_builder = None
+            if os.path.exists(self._decay_index_path):
+                print("[Supervisor] Decay index ready", flush=True)
+            else:
+                self._decay_restart_at = time.monotonic() + self.max_restart_delay
+                print(f"[Supervisor] Decay index build failed (exit code {builder.exitcode}), "
+                      f"retrying in {self.max_restart_delay:.1f}s", flush=True)
+        if self._decay_restart_at is not None and time.monotonic() >= self._decay_restart_at:
+            self._start_decay_builder()
+
+    def _request_reload(self, signum, frame):
+        """worker 转发的热更新请求（SIGHUP，SIGUSR1 为强制），在监管循环中处理"""
+        self._reload_request = bool(self._reload_request) or signum == FORCE_RELOAD_SIGNAL
+
+    def _start_reload(self, force: bool):
+        """在独立进程中把快照与属性表重建到新一代路径；数据文件未变化（或上次校验失败后未再修改）时跳过"""
+        signature = dataset_signature(self.data_file)
+        if not force and signature in (self._signature, self._failed_signature):
+            return
+        generation = self._generation + 1
+        target = {
+            "snapshot": os.path.join(self.snapshot_dir, f"spelling_index.{generation}.bin"),
+            "property_table": os.path.join(self.snapshot_dir, f"property_table.{generation}.npy"),
+            "decay_index": os.path.join(self.snapshot_dir, f"decay_index.{generation}.json"),
+        }
+        self._reloader = self._ctx.Process(
+            target=_reload_dataset,
+            args=(self.data_file, dict(self._paths), target, self.categories, generation, self._status_file),
+            name="psv-dataset-reload",
+            daemon=True,
+        )
+        self._reloader.start()
+        print(f"[Supervisor] Reloading dataset into generation {generation} (pid={self._reloader.pid})", flush=True)
+
+    def _check_reload(self):
+        """处理热更新请求与轮询，热更新进程完成后切换到新一代并滚动重启 worker"""
+        now = time.monotonic()
+        if self.reload_interval > 0 and now - self._last_poll >= self.reload_interval:
+            self._last_poll = now
+            if self._reload_request is None:
+                self._reload_request = False
+        reloader = self._reloader
+        if reloader is None:
+            if self._reload_request is not None:
+                force, self._reload_request = self._reload_request, None
+                self._start_reload(force)
+            return
+        if reloader.is_alive():
+            return
+        reloader.join()
+        self._reloader = None
+        result = read_status(self._status_file)
+        if result.get("generation") != self._generation + 1 or result.get("status") != "reloaded":
+            self._failed_signature = dataset_signature(self.data_file)
+            print(f"[Supervisor] Dataset reload failed: {result.get('errors') or reloader.exitcode}", flush=True)
+            return
+        self._apply_generation(result)
+
+    def _apply_generation(self, result: Dict):
+        """切换环境变量中的共享文件路径（之后启动的 worker 打开新一代），再逐个重启 worker"""
+        previous = self._paths
+        paths = {**previous, **result["paths"]}
+        self._generation = result["generation"]
+        self._signature = result["signature"]
+        self._failed_signature = None
+        self._paths = paths
+        os.environ[SNAPSHOT_ENV] = paths["snapshot"]
+        os.environ[TABLE_ENV] = paths["property_table"]
+        if "decay_index" in result["paths"]:
+            os.environ[DECAY_INDEX_ENV] = self._decay_index_path = paths["decay_index"]
+        elif self._decay_builder is not None:
+            # 构建中的倒排索引基于旧数据集，按新快照重新构建
+            self._decay_builder.terminate()
+            self._decay_builder.join()
+            self._decay_builder = None
+            self._start_decay_builder()
+        print(f"[Supervisor] Dataset generation {self._generation}: {result['records']} records, "
+              f"{len(result['changed_mcids'])} changed mcids, restarting workers", flush=True)
+        self._roll_workers()
+        # 旧一代文件已无进程映射，删除快照目录中由监管器生成的旧文件
+        for key, path in previous.items():
+            if (path and path != paths[key] and path not in (self.property_table, self.decay_index)
+                    and os.path.dirname(path) == os.path.normpath(self.snapshot_dir)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _roll_workers(self, timeout: float = 10.0):
+        """逐个重启 worker，其余 worker 继续在共享 socket 上服务"""
+        for i in sorted(self._processes):
+            if self._stopping:
+                break
+            process = self._processes.pop(i)
+            process.terminate()
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            self._spawn(i)
+            time.sleep(self.restart_delay)
+
+    def _bind_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self, worker_index: int):
+        process = self._ctx.Process(
+            target=_serve_worker,
+            args=(worker_index, self.app_factory, self._sock),
+            name=f"psv-worker-{worker_index}",
+            daemon=False,
+        )
+        process.start()
+        self._processes[worker_index] = process
+        self._started_at[worker_index] = time.monotonic()
+        print(f"[Supervisor] Started worker {worker_index} (pid={process.pid})", flush=True)
+
+    def _handle_exit(self, worker_index: int, process: mp.Process):
+        """记录退出并安排带退避的重启"""
+        uptime = time.monotonic() - self._started_at.get(worker_index, 0.0)
+        if uptime >= self.min_uptime:
+            self._delays[worker_index] = self.restart_delay
+        else:
+            self._delays[worker_index] = min(
+                self._delays.get(worker_index, self.restart_delay / 2) * 2, self.max_restart_delay)
+        delay = self._delays[worker_index]
+        self._restart_at[worker_index] = time.monotonic() + delay
+        del self._processes[worker_index]
+        print(f"[Supervisor] Worker {worker_index} (pid={process.pid}) exited with code "
+              f"{process.exitcode}, restarting in {delay:.1f}s", flush=True)
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def run(self):
+        """启动全部 worker 并阻塞监管，直到收到 SIGINT/SIGTERM"""
+        self._prepare_snapshot()
+        self._sock = self._bind_socket()
+        print(f"[Supervisor] Serving on {self.host}:{self.port} with {self.num_workers} workers", flush=True)
+
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(RELOAD_SIGNAL, self._request_reload)
+        signal.signal(FORCE_RELOAD_SIGNAL, self._request_reload)
+        try:
+            self._start_decay_builder()
+            for i in range(self.num_workers):
+                self._spawn(i)
+            while not self._stopping:
+                self._check_decay_builder()
+                self._check_reload()
+                for i, process in list(self._processes.items()):
+                    if not process.is_alive():
+                        process.join()
+                        self._handle_exit(i, process)
+                now = time.monotonic()
+                for i, restart_at in list(self._restart_at.items()):
+                    if now >= restart_at and not self._stopping:
+                        del self._restart_at[i]
+                        self._spawn(i)
+                time.sleep(0.2)
+        finally:
+            self.shutdown()
+
+    def shutdown(self, timeout: float = 10.0):
+        """终止全部子进程并清理快照"""
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self._processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+                process.join()
+        self._processes.clear()
+        if self._decay_builder is not None and self._decay_builder.is_alive():
+            self._decay_builder.terminate()
+            self._decay_builder.join()
+        self._decay_builder = None
+        if self._reloader is not None and self._reloader.is_alive():
+            self._reloader.terminate()
+            self._reloader.join()
+        self._reloader = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self._owns_snapshot_dir and self.snapshot_dir:
+            shutil.rmtree(self.snapshot_dir, ignore_errors=True)
+        print("[Supervisor] All workers stopped", flush=True)
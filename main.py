@@ -5,45 +5,136 @@ Integrates particle variant generation and data merging functionality
 
 import argparse
 import os
+import shutil
 import sys
 from typing import List, Optional
 
 from ParSV.data.generator import ParticleVariantGenerator, get_standard_mcids
+from ParSV.data.categories import category_of, get_categories
+from ParSV.data.shards import ShardedDataset
 from ParSV.data.data_merger import ParticleDataMerger
+from ParSV.data.change_journal import ChangeJournal
+from ParSV.Usage.bulk_lookup import run_lookup
+from ParSV.utils import atomic_write_json
 
 
 def main():
     parser = argparse.ArgumentParser(description="Particle spelling variants generator")
-    parser.add_argument('--mode', choices=['generate', 'merge', 'both'], 
-                       default='both', help='Operation mode')
+    parser.add_argument('--mode', choices=['generate', 'merge', 'both', 'compact', 'shard', 'lookup'], 
+                       default='both', help='Operation mode, `compact` folds the change journal of --output into the file, '
+                                            '`shard` splits the --input file into a category-sharded directory at --output, '
+                                            '`lookup` resolves the names in --input files (or stdin) to properties')
     parser.add_argument('--mcids', nargs='+', type=int, 
                        help='Specify mcid list (uses standard list by default)')
+    parser.add_argument('--categories', nargs='+', choices=get_categories(),
+                       help='Only process particles of these categories')
     parser.add_argument('--input', nargs='+', help='Input file paths (merge mode)')
     parser.add_argument('--new-data', help='New data file path (merge mode)')
-    parser.add_argument('--output', default='particle_variants_final.json',
-                       help='Output file path')
+    parser.add_argument('--output',
+                       help='Output file path (default: particle_variants_final.json, stdout in lookup mode)')
     parser.add_argument('--temp-file', default='temp_generated.json',
                        help='Temporary generated file path')
+    parser.add_argument('--sharded', action='store_true',
+                       help='Write generated data and the merged output as category-sharded directories, '
+                            'processed shard by shard')
+    parser.add_argument('--journal', action='store_true',
+                       help='Append only changed records to the change journal of --output instead of rewriting it')
+    parser.add_argument('--derive-antiparticles', action='store_true',
+                       help='Generate only particles and derive their antiparticles by rule, halving LLM calls')
+    parser.add_argument('--compact-antiparticles', action='store_true',
+                       help='Store each antiparticle as exceptions to its derived form in the merged output')
+    parser.add_argument('--no-llm', action='store_true',
+                       help='Only use the local rule-based variant engine, no LLM calls')
+    parser.add_argument('--llm-url',
+                       help='OpenAI-compatible LLM endpoint, e.g. a local stand-in (default: $PARSV_LLM_API_URL or aiapi.ihep.ac.cn)')
+    parser.add_argument('--max-retries', type=int, default=0,
+                       help='Retries of rate-limited (429) or failed LLM calls, with exponential backoff')
+    parser.add_argument('--stream', action='store_true',
+                       help='Stream LLM responses and parse them incrementally, stopping once complete')
+    parser.add_argument('--batch-size', type=int, default=1,
+                       help='Number of particles packed into one LLM prompt (grouped by category, '
+                            'particle next to antiparticle)')
+    parser.add_argument('--metadata-workers', type=int, default=2,
+                       help='Threads prefetching PDG/Particle metadata ahead of the LLM calls')
+    parser.add_argument('--rules-workers', type=int, default=1,
+                       help='Threads generating rule-based variants in the generation pipeline')
+    parser.add_argument('--llm-workers', type=int, default=1,
+                       help='Concurrent LLM calls of the generation pipeline')
+    parser.add_argument('--post-workers', type=int, default=1,
+                       help='Threads deduplicating records and deriving antiparticles in the generation pipeline')
+    parser.add_argument('--queue-size', type=int, default=8,
+                       help='Capacity (in batches) of each generation pipeline queue')
+    parser.add_argument('--format', choices=['text', 'csv', 'jsonl'],
+                       help='Lookup input format (default: by file extension, text for stdin)')
+    parser.add_argument('--output-format', choices=['jsonl', 'csv'],
+                       help='Lookup output format (default: by --output extension, jsonl for stdout)')
+    parser.add_argument('--column', help='CSV column or JSONL field holding the names (default: name)')
+    parser.add_argument('--fields', nargs='+',
+                       help='Lookup fields to output (default: all; only name/mcid avoids PDG entirely)')
+    parser.add_argument('--edition', help='PDG edition for lookup properties')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                       help='Lookup worker processes building particle properties')
+    parser.add_argument('--gate', action='store_true',
+                       help='Refuse to write the merge output if it adds spelling collisions or charge sign errors')
+    parser.add_argument('--unique', action='store_true',
+                       help='Output one lookup row per distinct name instead of one per input line')
     
     args = parser.parse_args()
     
+    if args.mode == 'lookup':
+        stats = run_lookup(args.input or [], output=args.output, input_format=args.format,
+                           output_format=args.output_format, column=args.column, fields=args.fields,
+                           edition=args.edition, processes=args.processes, unique=args.unique,
+                           categories=args.categories)
+        print(f"Looked up {stats['names']} names ({stats['unique_names']} distinct, {stats['unresolved']} not found, "
+              f"{stats['particles']} particles): resolve {stats['resolve_s']}s, properties {stats['properties_s']}s, "
+              f"write {stats['write_s']}s", file=sys.stderr)
+        return
+    
+    args.output = args.output or 'particle_variants_final.json'
+    
+    if args.mode == 'compact':
+        journal = ChangeJournal(args.output)
+        n_entries = journal.compact()
+        print(f"Compacted {n_entries} journal entries into {args.output}")
+        return
+    
+    if args.mode == 'shard':
+        input_file = args.input[0] if args.input else "particle_variants.json"
+        merger = ParticleDataMerger()
+        dataset = ShardedDataset.create(args.output, merger.load_json(input_file),
+                                        compact=args.compact_antiparticles)
+        for category, info in dataset.manifest["shards"].items():
+            print(f"  {category}: {info['count']} records")
+        print(f"Sharded {input_file} into {len(dataset.categories)} shards at {args.output}")
+        return
+    
     if args.mode in ['generate', 'both']:
         print("=" * 50)
         print("Starting particle variant data generation...")
         
         # 获取MCID列表
         mcid_list = args.mcids if args.mcids else get_standard_mcids()
+        if args.categories:
+            mcid_list = [mcid for mcid in mcid_list if category_of(mcid) in args.categories]
         print(f"Will process {len(mcid_list)} particles")
         
         # 生成数据
-        generator = ParticleVariantGenerator()
-        results = generator.batch_generate(mcid_list)
-        
-        # 保存临时文件
+        generator = ParticleVariantGenerator(use_llm=not args.no_llm, stream=args.stream,
+                                             derive_antiparticles=args.derive_antiparticles,
+                                             api_url=args.llm_url, max_retries=args.max_retries,
+                                             metadata_workers=args.metadata_workers,
+                                             rules_workers=args.rules_workers, llm_workers=args.llm_workers,
+                                             post_workers=args.post_workers, queue_size=args.queue_size)
         temp_output = args.temp_file if args.mode == 'both' else args.output
-        with open(temp_output, "w", encoding="utf-8") as f:
-            import json
-            json.dump(results, f, ensure_ascii=False, indent=2)
+        if args.sharded:
+            # 逐个类别生成并写入分片目录
+            generator.generate_shards(mcid_list, temp_output, batch_size=args.batch_size)
+        else:
+            results = generator.batch_generate(mcid_list, batch_size=args.batch_size)
+            
+            # 保存临时文件
+            atomic_write_json(temp_output, results)
         
         print(f"Generation complete! Saved to {temp_output}")
         
@@ -77,7 +168,8 @@ def main():
         
         # 执行合并
         merger = ParticleDataMerger()
-        success = merger.merge_files(old_file, new_file, args.output)
+        success = merger.merge_files(old_file, new_file, args.output, journal=args.journal,
+                                     compact=args.compact_antiparticles, sharded=args.sharded, gate=args.gate)
         
         if success:
             # 验证结果
@@ -94,9 +186,16 @@ def main():
             
             if stats['duplicate_mcids']:
                 print(f"  Duplicate MCIDs: {stats['duplicate_mcids']}")
+            report = stats['collisions']
+            print(f"  Spelling issues: {report['errors']} errors, {report['warnings']} warnings {report['counts']}")
+        elif args.gate:
+            sys.exit(1)
         
         # 清理临时文件
-        if args.mode == 'both' and os.path.exists(args.temp_file):
+        if args.mode == 'both' and os.path.isdir(args.temp_file):
+            shutil.rmtree(args.temp_file)
+            print(f"Cleaned temporary directory: {args.temp_file}")
+        elif args.mode == 'both' and os.path.exists(args.temp_file):
             os.remove(args.temp_file)
             print(f"Cleaned temporary file: {args.temp_file}")
     